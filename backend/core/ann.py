@@ -0,0 +1,275 @@
+from __future__ import annotations
+
+import fcntl
+import json
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+from django.conf import settings
+
+NO_COMMITTEE = -1
+
+
+def record_dtype(dimension: int) -> np.dtype:
+	# Eine Zeile je Dokument; nach Liste (IVF-Zelle) sortiert, damit jede Zelle ein zusammenhängender Block ist
+	return np.dtype([
+		("id", "<i8"),
+		("committee", "<i8"),
+		("day", "<i4"),
+		("list", "<i4"),
+		("vector", "<f4", (dimension,)),
+	])
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+	norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+	return vectors / np.where(norms == 0, 1, norms)
+
+
+def day_number(value: Optional[str]) -> int:
+	"""Tagesnummer (date.toordinal) aus einem ISO-Zeitstempel; 0 = unbekannt."""
+	try:
+		return date.fromisoformat((value or "")[:10]).toordinal()
+	except ValueError:
+		return 0
+
+
+def default_nlist(n: int) -> int:
+	return int(min(max(1, round(np.sqrt(n))), 1024))
+
+
+def train(vectors: np.ndarray, nlist: int, iterations: int = 10, seed: int = 0) -> np.ndarray:
+	"""Sphärisches k-means: Zentroide sind normierte Mittelwerte, Zuordnung über das Skalarprodukt."""
+	rng = np.random.default_rng(seed)
+	nlist = min(nlist, len(vectors))
+	centroids = vectors[rng.choice(len(vectors), size=nlist, replace=False)].copy()
+	for _ in range(iterations):
+		assign = assign_lists(vectors, centroids)
+		sums = np.zeros_like(centroids)
+		np.add.at(sums, assign, vectors)
+		counts = np.bincount(assign, minlength=nlist)
+		# Leere Zellen behalten ihren bisherigen Zentroid
+		filled = counts > 0
+		centroids[filled] = normalize(sums[filled])
+	return centroids
+
+
+def assign_lists(vectors: np.ndarray, centroids: np.ndarray, batch: int = 65536) -> np.ndarray:
+	out = np.empty(len(vectors), dtype=np.int32)
+	for i in range(0, len(vectors), batch):
+		out[i:i + batch] = np.argmax(vectors[i:i + batch] @ centroids.T, axis=1)
+	return out
+
+
+class AnnIndex:
+	"""IVF-Index eines Mandanten über normierte Embeddings (Kosinus = Skalarprodukt).
+
+	`records` ist ein per mmap geladenes .npy; gesucht wird in den `nprobe` Zellen mit
+	den ähnlichsten Zentroiden. Reichen die Treffer nach Filtern nicht, werden weitere
+	Zellen geprüft, bis alle durchsucht sind.
+	"""
+
+	def __init__(self, records: np.ndarray, centroids: np.ndarray, meta: Dict[str, Any]):
+		self.records = records
+		self.centroids = centroids
+		self.meta = meta
+		self.offsets = np.searchsorted(records["list"], np.arange(len(centroids) + 1))
+
+	def __len__(self) -> int:
+		return len(self.records)
+
+	@classmethod
+	def load(cls, path: Path) -> "AnnIndex":
+		meta = json.loads((path / "meta.json").read_text())
+		return cls(np.load(path / "records.npy", mmap_mode="r"), np.load(path / "centroids.npy"), meta)
+
+	def rows(self, lists: Iterable[int]) -> np.ndarray:
+		ranges = [np.arange(self.offsets[i], self.offsets[i + 1]) for i in lists]
+		return np.concatenate(ranges) if ranges else np.empty(0, dtype=np.int64)
+
+	def mask(self, rows: np.ndarray, committee_id: Optional[int], day_from: int, day_to: int) -> np.ndarray:
+		keep = np.ones(len(rows), dtype=bool)
+		if committee_id is not None:
+			keep &= self.records["committee"][rows] == committee_id
+		if day_from or day_to:
+			days = self.records["day"][rows]
+			if day_from:
+				keep &= days >= day_from
+			if day_to:
+				keep &= (days <= day_to) & (days > 0)
+		return keep
+
+	def search(
+		self,
+		vector: List[float],
+		k: int,
+		nprobe: Optional[int] = None,
+		committee_id: Optional[int] = None,
+		day_from: int = 0,
+		day_to: int = 0,
+	) -> List[Tuple[int, float]]:
+		if not len(self.records):
+			return []
+		q = normalize(np.asarray(vector, dtype=np.float32))
+		order = np.argsort(-(self.centroids @ q))
+		probe = min(nprobe or settings.ANN_NPROBE, len(order))
+		while True:
+			rows = self.rows(order[:probe])
+			rows = rows[self.mask(rows, committee_id, day_from, day_to)]
+			if len(rows) >= k or probe >= len(order):
+				break
+			probe = min(probe * 2, len(order))
+		if not len(rows):
+			return []
+		scores = self.records["vector"][rows] @ q
+		top = np.argpartition(-scores, k - 1)[:k] if len(rows) > k else np.arange(len(rows))
+		top = top[np.argsort(-scores[top])]
+		return [(int(self.records["id"][rows[i]]), float(scores[i])) for i in top]
+
+	def exact(self, vector: List[float], k: int) -> List[int]:
+		"""Exakte Suche über alle Zeilen (Referenz für Recall-Messungen)."""
+		q = normalize(np.asarray(vector, dtype=np.float32))
+		scores = self.records["vector"] @ q
+		top = np.argsort(-scores)[:k]
+		return [int(self.records["id"][i]) for i in top]
+
+
+class AnnStore:
+	"""Persistenz je Mandant unter ANN_INDEX_DIR/<tenant>/.
+
+	Jeder Stand liegt in einem eigenen Unterverzeichnis; der Symlink `current` wird atomar
+	umgebogen, Leser behalten ihre mmap auf den alten Stand. Der vorige Stand wird erst beim
+	nächsten Schreiben gelöscht, damit ein Leser, der den Link gerade aufgelöst hat, ihn noch
+	laden kann. Schreiber serialisieren über ein flock, geladene Indizes werden je Prozess
+	gecacht und bei neuem Stand nachgeladen.
+	"""
+
+	def __init__(self, root: Optional[Path] = None):
+		self.root = Path(root or settings.ANN_INDEX_DIR)
+		self._loaded: Dict[int, Tuple[str, AnnIndex]] = {}
+		self._mutex = threading.Lock()
+
+	def path(self, tenant_id: int) -> Path:
+		return self.root / str(tenant_id)
+
+	def tenants(self) -> List[int]:
+		if not self.root.exists():
+			return []
+		return sorted(int(p.name) for p in self.root.iterdir() if p.name.isdigit() and (p / "current").exists())
+
+	def get(self, tenant_id: int, retry: bool = True) -> Optional[AnnIndex]:
+		current = self.path(tenant_id) / "current"
+		try:
+			target = os.readlink(current)
+		except OSError:
+			return None
+		with self._mutex:
+			cached = self._loaded.get(tenant_id)
+			if cached is None or cached[0] != target:
+				try:
+					cached = self._loaded[tenant_id] = (target, AnnIndex.load(current.parent / target))
+				except FileNotFoundError:
+					# Zwei Schreibvorgänge seit readlink: Stand schon gelöscht, Link neu lesen
+					if not retry:
+						raise
+					cached = None
+		return cached[1] if cached is not None else self.get(tenant_id, retry=False)
+
+	@contextmanager
+	def locked(self, tenant_id: int) -> Iterator[None]:
+		path = self.path(tenant_id)
+		path.mkdir(parents=True, exist_ok=True)
+		with open(path / ".lock", "w") as lock:
+			fcntl.flock(lock, fcntl.LOCK_EX)
+			try:
+				yield
+			finally:
+				fcntl.flock(lock, fcntl.LOCK_UN)
+
+	def write(self, tenant_id: int, records: np.ndarray, centroids: np.ndarray, meta: Dict[str, Any]) -> None:
+		path = self.path(tenant_id)
+		build = f"{time.time_ns()}"
+		(path / build).mkdir(parents=True)
+		np.save(path / build / "records.npy", records)
+		np.save(path / build / "centroids.npy", centroids)
+		(path / build / "meta.json").write_text(json.dumps(meta))
+		try:
+			previous = os.readlink(path / "current")
+		except OSError:
+			previous = ""
+		link = path / f".current-{build}"
+		os.symlink(build, link)
+		os.replace(link, path / "current")
+		for old in path.iterdir():
+			if old.is_dir() and not old.is_symlink() and old.name not in (build, previous):
+				shutil.rmtree(old, ignore_errors=True)
+
+	def update(
+		self,
+		tenant_id: int,
+		rows: List[Dict[str, Any]],
+		deleted: Iterable[int] = (),
+		rebuild: bool = False,
+	) -> int:
+		"""Ersetzt bzw. ergänzt Zeilen ({id, committee_id, created_at, embedding}) und entfernt `deleted`.
+
+		Die Zentroide werden neu trainiert, wenn sich die Größe seit dem Training mehr als
+		verdoppelt oder halbiert hat; sonst werden neue Zeilen nur ihrer Zelle zugeordnet.
+		`rebuild` verwirft den bisherigen Stand und trainiert neu.
+		"""
+		with self.locked(tenant_id):
+			index = self.get(tenant_id)
+			dimension = len(rows[0]["embedding"]) if rows else (index.meta["dimension"] if index else 0)
+			if not dimension:
+				return 0
+			dtype = record_dtype(dimension)
+			drop = {int(r["id"]) for r in rows} | {int(pk) for pk in deleted}
+			kept = np.empty(0, dtype=dtype)
+			if index is not None and index.meta["dimension"] == dimension and not rebuild:
+				kept = np.array(index.records[~np.isin(index.records["id"], list(drop))])
+				if not rows and len(kept) == len(index):
+					return len(kept)
+			added = np.zeros(len(rows), dtype=dtype)
+			for i, row in enumerate(rows):
+				committee = row.get("committee_id")
+				added[i] = (
+					int(row["id"]),
+					NO_COMMITTEE if committee is None else int(committee),
+					day_number(row.get("created_at")),
+					0,
+					row["embedding"],
+				)
+			added["vector"] = normalize(added["vector"])
+			records = np.concatenate([kept, added])
+			if not len(records):
+				# Alter Stand wird beim nächsten write() aufgeräumt
+				(self.path(tenant_id) / "current").unlink(missing_ok=True)
+				return 0
+			trained = index.meta.get("trained", 0) if index is not None and len(kept) else 0
+			if not trained or len(records) > 2 * trained or 2 * len(records) < trained:
+				centroids = train(records["vector"], default_nlist(len(records)))
+				records["list"] = assign_lists(records["vector"], centroids)
+				trained = len(records)
+			else:
+				centroids = index.centroids
+				records["list"][len(kept):] = assign_lists(records["vector"][len(kept):], centroids)
+			records = records[np.argsort(records["list"], kind="stable")]
+			self.write(tenant_id, records, centroids, {"dimension": dimension, "trained": trained})
+			return len(records)
+
+
+_store: Optional[AnnStore] = None
+
+
+def get_store() -> AnnStore:
+	global _store
+	if _store is None or _store.root != Path(settings.ANN_INDEX_DIR):
+		_store = AnnStore()
+	return _store
@@ -1,4 +1,8 @@
+import hmac
+
+from django.conf import settings
 from rest_framework.authentication import SessionAuthentication
+from rest_framework.permissions import BasePermission
 
 
 class CsrfExemptSessionAuthentication(SessionAuthentication):
@@ -6,3 +10,10 @@ class CsrfExemptSessionAuthentication(SessionAuthentication):
 		return
 
 
+class IsIngestService(BasePermission):
+	"""Nur der Ingest-Service: Bearer-Token aus settings.INGEST_SERVICE_TOKEN."""
+
+	def has_permission(self, request, view):
+		token = settings.INGEST_SERVICE_TOKEN
+		scheme, _, presented = request.headers.get("Authorization", "").partition(" ")
+		return bool(token) and scheme == "Bearer" and hmac.compare_digest(presented.encode(), token.encode())
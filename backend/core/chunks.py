@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+import os
+from typing import Dict, Iterable, List, Tuple
+
+from .models import DocumentChunk
+
+# Länge des Textanfangs, der direkt am Dokument (content_text) liegt
+PREVIEW_CHARS = 10000
+
+
+def chunk_size() -> int:
+	return int(os.getenv("DOCUMENT_CHUNK_SIZE", "2000"))
+
+
+def chunk_overlap() -> int:
+	return int(os.getenv("DOCUMENT_CHUNK_OVERLAP", "200"))
+
+
+def split_text(text: str, size: int | None = None, overlap: int | None = None) -> List[Tuple[int, int]]:
+	"""Zerlegt `text` in (start, end)-Abschnitte von höchstens `size` Zeichen.
+
+	Geschnitten wird bevorzugt an Absatz- oder Wortgrenzen in der hinteren Hälfte
+	des Abschnitts; benachbarte Abschnitte überlappen um `overlap` Zeichen, damit
+	Treffer über eine Grenze hinweg nicht verloren gehen.
+	"""
+	size = size or chunk_size()
+	overlap = min(overlap if overlap is not None else chunk_overlap(), size // 2)
+	spans: List[Tuple[int, int]] = []
+	start = 0
+	length = len(text)
+	while start < length:
+		end = min(start + size, length)
+		if end < length:
+			window = text[start + size // 2:end]
+			cut = max(window.rfind("\n\n"), window.rfind("\f"))
+			if cut < 0:
+				cut = window.rfind(" ")
+			if cut >= 0:
+				end = start + size // 2 + cut + 1
+		spans.append((start, end))
+		if end >= length:
+			break
+		start = max(end - overlap, start + 1)
+	return spans
+
+
+def build_chunks(tenant_id: int, document_id: int, text: str) -> List[DocumentChunk]:
+	return [
+		DocumentChunk(tenant_id=tenant_id, document_id=document_id, ordinal=ordinal, text=text[start:end], start=start, end=end)
+		for ordinal, (start, end) in enumerate(split_text(text))
+	]
+
+
+def replace_chunks(tenant_id: int, texts: Dict[int, str]) -> int:
+	"""Ersetzt die Abschnitte der Dokumente (id -> Volltext) mit einem DELETE und einem bulk_create."""
+	if not texts:
+		return 0
+	DocumentChunk.objects.filter(document_id__in=list(texts)).delete()
+	chunks = [chunk for document_id, text in texts.items() for chunk in build_chunks(tenant_id, document_id, text)]
+	DocumentChunk.objects.bulk_create(chunks, batch_size=1000)
+	return len(chunks)
+
+
+def join_chunks(chunks: Iterable[DocumentChunk]) -> str:
+	"""Setzt den Volltext aus geordneten Abschnitten wieder zusammen (Überlappung über Offsets)."""
+	parts: List[str] = []
+	position = 0
+	for chunk in chunks:
+		if chunk.end <= position:
+			continue
+		parts.append(chunk.text[max(position - chunk.start, 0):])
+		position = chunk.end
+	return "".join(parts)
+
+
+def document_text(document) -> str:
+	"""Volltext eines Dokuments; ältere Dokumente ohne Abschnitte liefern `content_text`."""
+	# .all() statt order_by, damit prefetch_related("chunks") greift (Meta.ordering sortiert)
+	chunks = list(document.chunks.all())
+	return join_chunks(chunks) if chunks else document.content_text
+
+
+def sync_chunks(document) -> None:
+	"""Einzelspeicherungen (REST, Admin): `content_text` ist die Quelle, wenn es sich geändert hat.
+
+	Danach liegt der Volltext in den Abschnitten und am Dokument nur noch der Anfang.
+	"""
+	text = document.content_text
+	chunks = list(document.chunks.all())
+	if chunks and len(text) <= PREVIEW_CHARS and join_chunks(chunks)[:PREVIEW_CHARS] == text:
+		return
+	replace_chunks(document.tenant_id, {document.pk: text})
+	if len(text) > PREVIEW_CHARS:
+		document.content_text = text[:PREVIEW_CHARS]
+		type(document).objects.filter(pk=document.pk).update(content_text=document.content_text)
@@ -0,0 +1,105 @@
+from __future__ import annotations
+
+import hashlib
+import math
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+from django.conf import settings
+
+from .chunks import split_text
+
+
+class EmbeddingError(Exception):
+	pass
+
+
+def enabled() -> bool:
+	return bool(settings.EMBEDDING_SERVICE_URL)
+
+
+def embed_texts(texts: List[str]) -> List[List[float]]:
+	"""Embeddings über den AI-Service (`POST /embed`), in Batches von EMBEDDING_BATCH_SIZE."""
+	vectors: List[List[float]] = []
+	size = settings.EMBEDDING_BATCH_SIZE
+	try:
+		with httpx.Client(base_url=settings.EMBEDDING_SERVICE_URL, timeout=settings.EMBEDDING_TIMEOUT) as client:
+			for i in range(0, len(texts), size):
+				res = client.post("/embed", json={"texts": texts[i:i + size]})
+				res.raise_for_status()
+				vectors.extend(res.json()["vectors"])
+	except (httpx.HTTPError, KeyError, ValueError) as e:
+		raise EmbeddingError(str(e)) from e
+	if any(len(v) != settings.EMBEDDING_DIMENSION for v in vectors):
+		raise EmbeddingError(f"Embedding-Dimension passt nicht zu EMBEDDING_DIMENSION={settings.EMBEDDING_DIMENSION}")
+	return vectors
+
+
+def embed_query(text: str) -> List[float]:
+	return embed_texts([text])[0]
+
+
+def passages(doc: Dict[str, Any]) -> List[str]:
+	"""Titel und die ersten EMBEDDING_MAX_CHUNKS Abschnitte des Volltexts."""
+	text = doc.get("content_text") or ""
+	spans = split_text(text)[:settings.EMBEDDING_MAX_CHUNKS]
+	return [doc.get("title") or ""] + [text[start:end] for start, end in spans]
+
+
+def mean_vector(vectors: List[List[float]]) -> Optional[List[float]]:
+	if not vectors:
+		return None
+	mean = [sum(values) / len(vectors) for values in zip(*vectors)]
+	norm = math.sqrt(sum(x * x for x in mean))
+	return [round(x / norm, 6) for x in mean] if norm else None
+
+
+def embedding_key(parts: List[str]) -> str:
+	"""Fingerabdruck der eingebetteten Texte (und der Dimension); ändert er sich, wird neu gerechnet."""
+	digest = hashlib.sha1(str(settings.EMBEDDING_DIMENSION).encode("utf-8"))
+	for part in parts:
+		digest.update(b"\0" + part.encode("utf-8"))
+	return digest.hexdigest()
+
+
+def attach_embeddings(docs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+	"""Ergänzt Such-Payloads um `embedding`: Mittel der Abschnitts-Embeddings, normalisiert.
+
+	Am Dokument gespeicherte Embeddings werden wiederverwendet, solange Titel und
+	Abschnitte gleich sind (`embedding_key`); nur geänderte Dokumente gehen – je Batch
+	gesammelt – an den AI-Service und werden danach gespeichert. Ohne
+	EMBEDDING_SERVICE_URL bleiben die Payloads unverändert (nur BM25).
+	"""
+	from .models import Document
+
+	if not enabled() or not docs:
+		return docs
+	stored = {
+		pk: (key, vector)
+		for pk, key, vector in Document.objects.filter(pk__in=[doc["id"] for doc in docs]).values_list(
+			"id", "embedding_key", "embedding"
+		)
+	}
+	texts: List[str] = []
+	pending: List[Tuple[Dict[str, Any], str, range]] = []
+	for doc in docs:
+		parts = [p for p in passages(doc) if p.strip()]
+		key = embedding_key(parts)
+		found_key, found = stored.get(doc["id"], ("", None))
+		if found and found_key == key:
+			doc["embedding"] = found
+			continue
+		pending.append((doc, key, range(len(texts), len(texts) + len(parts))))
+		texts.extend(parts)
+	vectors = embed_texts(texts) if texts else []
+	changed = []
+	for doc, key, span in pending:
+		embedding = mean_vector([vectors[i] for i in span])
+		if embedding is None:
+			continue
+		doc["embedding"] = embedding
+		if doc["id"] in stored:
+			changed.append(Document(pk=doc["id"], embedding=embedding, embedding_key=key))
+	# bulk_update löst kein post_save aus, also auch keinen neuen Outbox-Eintrag
+	Document.objects.bulk_update(changed, ["embedding", "embedding_key"], batch_size=200)
+	return docs
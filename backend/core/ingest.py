@@ -0,0 +1,356 @@
+from __future__ import annotations
+
+import json
+from typing import Any, Dict, List, Tuple
+
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+from .chunks import PREVIEW_CHARS, replace_chunks
+from .models import AgendaItem, Committee, Document, Meeting, Organization, Person
+from .outbox import enqueue_documents
+
+
+class NDJSONParser(BaseParser):
+	"""Eine JSON-Entität pro Zeile (application/x-ndjson)."""
+	media_type = "application/x-ndjson"
+
+	def parse(self, stream, media_type=None, parser_context=None):
+		items = []
+		for lineno, line in enumerate(stream, start=1):
+			line = line.strip()
+			if not line:
+				continue
+			try:
+				items.append(json.loads(line))
+			except ValueError as e:
+				raise ParseError(f"NDJSON Zeile {lineno}: {e}")
+		return items
+
+
+def _text(value: Any) -> str:
+	return "" if value is None else str(value)
+
+
+def _int(value: Any) -> int:
+	return int(value)
+
+
+def _datetime(value: Any):
+	if value in (None, ""):
+		return None
+	ts = parse_datetime(str(value))
+	if ts is None:
+		raise ValueError(f"ungültiges Datum: {value}")
+	if timezone.is_naive(ts):
+		ts = timezone.make_aware(ts)
+	return ts
+
+
+def _json(value: Any) -> Any:
+	return {} if value is None else value
+
+
+# Reihenfolge = Eltern vor Kindern. `refs` verweisen auf einen anderen Typ, entweder
+# per Primärschlüssel (int) oder per OParl-ID (str, aus demselben Batch oder der DB).
+ENTITIES: Dict[str, Dict[str, Any]] = {
+	"organization": {
+		"model": Organization,
+		"fields": {"name": _text},
+		"required": ["name"],
+		"refs": {},
+	},
+	"committee": {
+		"model": Committee,
+		"fields": {"name": _text},
+		"required": ["name"],
+		"refs": {"organization": "organization"},
+	},
+	"person": {
+		"model": Person,
+		"fields": {"name": _text, "party": _text},
+		"required": ["name"],
+		"refs": {},
+	},
+	"meeting": {
+		"model": Meeting,
+		"fields": {"start": _datetime, "end": _datetime},
+		"required": ["start", "committee"],
+		"refs": {"committee": "committee"},
+	},
+	"agenda_item": {
+		"model": AgendaItem,
+		"fields": {"position": _int, "title": _text, "category": _text},
+		"required": ["position", "title", "meeting"],
+		"refs": {"meeting": "meeting"},
+	},
+	"document": {
+		"model": Document,
+		"fields": {
+			"title": _text,
+			"raw": _json,
+			"normalized": _json,
+			"content_text": _text,
+			"content_hash": _text,
+		},
+		"required": ["title", "content_hash"],
+		"refs": {"agenda_item": "agenda_item"},
+	},
+}
+
+
+# Namensraum für pg_advisory_xact_lock(namespace, tenant_id)
+UPSERT_LOCK_NAMESPACE = 4711
+
+
+class BulkItemError(ValueError):
+	pass
+
+
+def _coerce(spec: Dict[str, Any], item: Dict[str, Any]) -> Dict[str, Any]:
+	if not item.get("oparl_id"):
+		raise BulkItemError("oparl_id fehlt")
+	values: Dict[str, Any] = {"oparl_id": str(item["oparl_id"])}
+	for name, conv in spec["fields"].items():
+		if name in item:
+			try:
+				values[name] = conv(item[name])
+			except (TypeError, ValueError) as e:
+				raise BulkItemError(f"{name}: {e}")
+	for name in spec["required"]:
+		if values.get(name) in (None, "") and item.get(name) in (None, ""):
+			raise BulkItemError(f"{name} fehlt")
+	return values
+
+
+def _resolve_refs(
+	tenant_id: int,
+	entity: str,
+	rows: List[Tuple[int, Dict[str, Any], Dict[str, Any]]],
+	id_map: Dict[Tuple[str, str], int],
+	errors: List[Dict[str, Any]],
+) -> List[Tuple[int, Dict[str, Any]]]:
+	"""Setzt `<ref>_id` je Zeile; OParl-IDs werden gesammelt mit einer Query je Referenztyp aufgelöst."""
+	refs: Dict[str, str] = ENTITIES[entity]["refs"]
+	for field, target in refs.items():
+		missing = {
+			str(item[field])
+			for _, item, _ in rows
+			if isinstance(item.get(field), str) and (target, item[field]) not in id_map
+		}
+		if missing:
+			model = ENTITIES[target]["model"]
+			for pk, oparl_id in (
+				model.objects.filter(tenant_id=tenant_id, oparl_id__in=missing).order_by("id").values_list("id", "oparl_id")
+			):
+				id_map.setdefault((target, oparl_id), pk)
+
+	resolved = []
+	for index, item, values in rows:
+		try:
+			for field, target in refs.items():
+				if field not in item:
+					continue
+				ref = item[field]
+				if ref in (None, ""):
+					values[f"{field}_id"] = None
+				elif isinstance(ref, int):
+					values[f"{field}_id"] = ref
+				elif (target, str(ref)) in id_map:
+					values[f"{field}_id"] = id_map[(target, str(ref))]
+				else:
+					raise BulkItemError(f"{field}: unbekannte Referenz {ref}")
+			for name in ENTITIES[entity]["required"]:
+				if name in refs and values.get(f"{name}_id") is None:
+					raise BulkItemError(f"{name} fehlt")
+		except BulkItemError as e:
+			errors.append({"index": index, "type": entity, "oparl_id": values.get("oparl_id"), "error": str(e)})
+			continue
+		resolved.append((index, values))
+	return resolved
+
+
+def _free_agenda_positions(
+	tenant_id: int,
+	rows: List[Tuple[int, Dict[str, Any]]],
+	errors: List[Dict[str, Any]],
+) -> List[Tuple[int, Dict[str, Any]]]:
+	"""Macht die Zielpositionen eingehender TOPs frei (unique_together meeting/position).
+
+	Getauschte oder umnummerierte TOPs kollidieren sonst beim bulk_update/bulk_create.
+	Jeder TOP, der eine Zielposition belegt, aber nicht dorthin gehört, wandert zuerst hinter
+	das Ende der Tagesordnung; die eingehenden erhalten ihre Position danach im Upsert.
+	Verdrängte TOPs außerhalb des Batches bleiben am Ende, bis ein späterer Abgleich sie
+	einsortiert. Zwei TOPs mit derselben Zielposition im Batch: der spätere ist ein Fehler.
+	"""
+	# Letzte Zeile je OParl-ID gewinnt (wie in _upsert)
+	latest: Dict[str, Tuple[int, Dict[str, Any]]] = {}
+	for index, values in rows:
+		latest[values["oparl_id"]] = (index, values)
+	slots: Dict[Tuple[int, int], str] = {}
+	rejected = set()
+	for oparl_id, (index, values) in sorted(latest.items(), key=lambda kv: kv[1][0]):
+		slot = (values["meeting_id"], values["position"])
+		if slot in slots:
+			errors.append({"index": index, "type": "agenda_item", "oparl_id": oparl_id, "error": f"position {slot[1]} doppelt"})
+			rejected.add(oparl_id)
+			continue
+		slots[slot] = oparl_id
+	if not slots:
+		return []
+
+	meetings = {meeting_id for meeting_id, _ in slots}
+	current = list(
+		AgendaItem.objects.filter(tenant_id=tenant_id, meeting_id__in=meetings)
+		.order_by("meeting_id", "position")
+		.values_list("id", "meeting_id", "position", "oparl_id")
+	)
+	incoming = set(slots.values())
+	# Verdrängte TOPs zuerst, damit sie direkt hinter der Tagesordnung landen; eingehende nur vorübergehend
+	blocking = [
+		pk
+		for pk, meeting_id, position, oparl_id in sorted(current, key=lambda row: row[3] in incoming)
+		if slots.get((meeting_id, position), oparl_id) != oparl_id
+	]
+	if blocking:
+		free = max([position for _, _, position, _ in current] + [position for _, position in slots]) + 1
+		AgendaItem.objects.bulk_update(
+			[AgendaItem(pk=pk, position=free + offset) for offset, pk in enumerate(blocking)], ["position"], batch_size=500
+		)
+	return [(index, values) for index, values in rows if values["oparl_id"] not in rejected]
+
+
+def _take_full_text(rows: List[Tuple[int, Dict[str, Any]]]) -> Dict[str, str]:
+	"""Volltext je OParl-ID für die Abschnitte; am Dokument bleibt nur der Anfang (content_text)."""
+	texts: Dict[str, str] = {}
+	for _, values in rows:
+		if "content_text" in values:
+			texts[values["oparl_id"]] = values["content_text"]
+			values["content_text"] = values["content_text"][:PREVIEW_CHARS]
+	return texts
+
+
+def _upsert(
+	tenant_id: int,
+	entity: str,
+	rows: List[Tuple[int, Dict[str, Any]]],
+) -> List[Tuple[int, Any, bool]]:
+	"""Set-basiertes Upsert über (tenant, oparl_id): eine Lookup-Query, ein bulk_create, ein bulk_update."""
+	spec = ENTITIES[entity]
+	model = spec["model"]
+	# Letzte Zeile je OParl-ID gewinnt
+	by_oparl_id: Dict[str, Tuple[int, Dict[str, Any]]] = {}
+	indexes: Dict[str, List[int]] = {}
+	for index, values in rows:
+		by_oparl_id[values["oparl_id"]] = (index, values)
+		indexes.setdefault(values["oparl_id"], []).append(index)
+
+	existing: Dict[str, int] = {}
+	for pk, oparl_id in (
+		model.objects.filter(tenant_id=tenant_id, oparl_id__in=list(by_oparl_id)).order_by("id").values_list("id", "oparl_id")
+	):
+		existing.setdefault(oparl_id, pk)
+
+	# Wie DocumentViewSet.create: gleicher Inhalt (content_hash) -> bestehendes Dokument, unverändert
+	known_content: Dict[str, int] = {}
+	if model is Document:
+		hashes = {v["content_hash"]: oid for oid, (_, v) in by_oparl_id.items() if oid not in existing}
+		if hashes:
+			for pk, content_hash in (
+				Document.objects.filter(tenant_id=tenant_id, content_hash__in=list(hashes)).order_by("id").values_list("id", "content_hash")
+			):
+				known_content.setdefault(hashes[content_hash], pk)
+
+	now = timezone.now()
+	to_create, unchanged = [], []
+	# bulk_update je Feldmenge, damit nicht übermittelte Felder nicht überschrieben werden
+	to_update: Dict[Tuple[str, ...], List[Any]] = {}
+	for oparl_id, (_, values) in by_oparl_id.items():
+		obj = model(tenant_id=tenant_id, **values)
+		if oparl_id in existing:
+			obj.pk = existing[oparl_id]
+			fields = [k for k in values if k != "oparl_id"]
+			if model is Document:
+				obj.updated_at = now
+				fields.append("updated_at")
+			to_update.setdefault(tuple(sorted(fields)), []).append(obj)
+		elif oparl_id in known_content:
+			obj.pk = known_content[oparl_id]
+			unchanged.append(obj)
+		else:
+			to_create.append(obj)
+
+	model.objects.bulk_create(to_create, batch_size=500)
+	for fields, objs in to_update.items():
+		if fields:
+			model.objects.bulk_update(objs, list(fields), batch_size=500)
+
+	results = []
+	updated = [obj for objs in to_update.values() for obj in objs]
+	for obj in to_create + updated + unchanged:
+		created = obj.oparl_id not in existing and obj.oparl_id not in known_content
+		for index in indexes[obj.oparl_id]:
+			results.append((index, obj, created))
+	return results
+
+
+def bulk_upsert(tenant_id: int, items: List[Any]) -> Dict[str, Any]:
+	"""Upsert gemischter OParl-Entitäten eines Mandanten in einer Transaktion.
+
+	Jedes Element ist ein Dict mit `type` (siehe ENTITIES), `oparl_id` und den Feldern
+	des Modells. Liefert je Element die Backend-ID bzw. einen Fehler mit Index.
+	Geschriebene Dokumente landen in der Such-Outbox.
+	"""
+	errors: List[Dict[str, Any]] = []
+	grouped: Dict[str, List[Tuple[int, Dict[str, Any], Dict[str, Any]]]] = {name: [] for name in ENTITIES}
+	for index, item in enumerate(items):
+		if not isinstance(item, dict) or item.get("type") not in ENTITIES:
+			errors.append({"index": index, "error": "unbekannter type"})
+			continue
+		try:
+			values = _coerce(ENTITIES[item["type"]], item)
+		except BulkItemError as e:
+			errors.append({"index": index, "type": item["type"], "oparl_id": item.get("oparl_id"), "error": str(e)})
+			continue
+		grouped[item["type"]].append((index, item, values))
+
+	results: List[Dict[str, Any]] = []
+	counts: Dict[str, Dict[str, int]] = {}
+	id_map: Dict[Tuple[str, str], int] = {}
+	documents: List[int] = []
+	with transaction.atomic():
+		# Schreiber eines Mandanten nacheinander: sonst legen zwei Batches dieselbe OParl-ID an.
+		# Der Unique-Index ist partiell (oparl_id <> ''), ON CONFLICT kann ihn über bulk_create
+		# nicht adressieren – er fängt nur ab, was am Lock vorbei geschrieben wird.
+		with connection.cursor() as cursor:
+			cursor.execute("SELECT pg_advisory_xact_lock(%s, %s)", [UPSERT_LOCK_NAMESPACE, tenant_id])
+		for entity in ENTITIES:
+			if not grouped[entity]:
+				continue
+			rows = _resolve_refs(tenant_id, entity, grouped[entity], id_map, errors)
+			if entity == "agenda_item":
+				rows = _free_agenda_positions(tenant_id, rows, errors)
+			texts = _take_full_text(rows) if entity == "document" else {}
+			chunk_texts: Dict[int, str] = {}
+			stats = counts.setdefault(entity, {"created": 0, "updated": 0})
+			seen = set()
+			for index, obj, created in _upsert(tenant_id, entity, rows):
+				id_map[(entity, obj.oparl_id)] = obj.pk
+				results.append({"index": index, "type": entity, "oparl_id": obj.oparl_id, "id": obj.pk, "created": created})
+				if obj.pk not in seen:
+					seen.add(obj.pk)
+					stats["created" if created else "updated"] += 1
+					if entity == "document":
+						documents.append(obj.pk)
+						if obj.oparl_id in texts:
+							chunk_texts[obj.pk] = texts[obj.oparl_id]
+			replace_chunks(tenant_id, chunk_texts)
+		# Bulk-Upserts lösen kein post_save aus; Outbox-Einträge im selben Commit
+		enqueue_documents(documents)
+
+	results.sort(key=lambda r: r["index"])
+	errors.sort(key=lambda e: e["index"])
+	return {"results": results, "errors": errors, "counts": counts}
@@ -0,0 +1,85 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+	help = "Build the local ANN index (core.ann) from PostgreSQL or benchmark its recall against exact search"
+
+	def add_arguments(self, parser):
+		parser.add_argument("action", choices=["build", "bench"])
+		parser.add_argument("--tenant", type=int, action="append", help="Only these tenants")
+		parser.add_argument("--batch-size", type=int, default=200)
+		parser.add_argument("--queries", type=int, default=100, help="bench: number of sampled query vectors")
+		parser.add_argument("-k", type=int, default=10, help="bench: neighbours per query")
+		parser.add_argument("--nprobe", type=int, action="append", help="bench: nprobe values to compare")
+
+	def handle(self, *args, **options):
+		if options["action"] == "build":
+			self.build(options)
+		else:
+			self.bench(options)
+
+	def build(self, options):
+		from core.ann import get_store
+		from core.embeddings import EmbeddingError, attach_embeddings, enabled
+		from core.models import Document
+		from core.search import document_payload
+		from core.search_cache import invalidate_tenants
+
+		if not enabled():
+			raise CommandError("EMBEDDING_SERVICE_URL ist nicht gesetzt")
+		qs = Document.objects.all()
+		if options["tenant"]:
+			qs = qs.filter(tenant_id__in=options["tenant"])
+		store = get_store()
+		for tenant_id in qs.order_by().values_list("tenant_id", flat=True).distinct():
+			rows = []
+			batch = []
+			docs = (
+				qs.filter(tenant_id=tenant_id)
+				.order_by("id")
+				.select_related("agenda_item__meeting")
+				.prefetch_related("chunks")
+			)
+			try:
+				for doc in docs.iterator(chunk_size=options["batch_size"]):
+					batch.append(document_payload(doc))
+					if len(batch) >= options["batch_size"]:
+						rows += [d for d in attach_embeddings(batch) if d.get("embedding")]
+						batch = []
+				rows += [d for d in attach_embeddings(batch) if d.get("embedding")]
+			except EmbeddingError as e:
+				raise CommandError(f"AI-Service nicht erreichbar: {e}")
+			# Nur die Felder, die der Index speichert; Volltexte nicht im Speicher halten
+			rows = [{k: d.get(k) for k in ("id", "committee_id", "created_at", "embedding")} for d in rows]
+			total = store.update(tenant_id, rows, rebuild=True)
+			invalidate_tenants([tenant_id])
+			self.stdout.write(self.style.SUCCESS(f"Mandant {tenant_id}: {total} Dokumente im ANN-Index"))
+
+	def bench(self, options):
+		import numpy as np
+		from core.ann import get_store
+
+		store = get_store()
+		k = options["k"]
+		for tenant_id in options["tenant"] or store.tenants():
+			index = store.get(tenant_id)
+			if index is None or not len(index):
+				self.stdout.write(f"Mandant {tenant_id}: kein ANN-Index")
+				continue
+			rng = np.random.default_rng(0)
+			sample = rng.choice(len(index), size=min(options["queries"], len(index)), replace=False)
+			queries = np.array(index.records["vector"][np.sort(sample)])
+			started = time.perf_counter()
+			truth = [set(index.exact(q, k)) for q in queries]
+			exact_ms = (time.perf_counter() - started) * 1000 / len(queries)
+			self.stdout.write(
+				f"Mandant {tenant_id}: {len(index)} Dokumente, {len(index.centroids)} Zellen, exakt {exact_ms:.2f} ms/Anfrage"
+			)
+			for nprobe in options["nprobe"] or [1, 4, 8, 16]:
+				started = time.perf_counter()
+				found = [{pk for pk, _ in index.search(q, k, nprobe=nprobe)} for q in queries]
+				ms = (time.perf_counter() - started) * 1000 / len(queries)
+				recall = sum(len(f & t) / len(t) for f, t in zip(found, truth)) / len(queries)
+				self.stdout.write(f"  nprobe={nprobe}: recall@{k}={recall:.3f}, {ms:.2f} ms/Anfrage")
@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.outbox import drain, lag
+
+
+class Command(BaseCommand):
+	help = "Index pending documents from the search outbox"
+
+	def add_arguments(self, parser):
+		parser.add_argument("--batch-size", type=int, default=500)
+		parser.add_argument("--loop", action="store_true", help="Keep draining; sleep --interval seconds when idle")
+		parser.add_argument("--interval", type=float, default=2.0)
+		parser.add_argument("--stats", action="store_true", help="Only print the outbox lag")
+
+	def handle(self, *args, **options):
+		if options["stats"]:
+			self.stdout.write(str(lag()))
+			return
+		from core.search_backends import get_backend
+		try:
+			get_backend().ensure()
+		except Exception as e:
+			# Nicht erreichbar: Einträge bleiben in der Outbox und werden später erneut versucht
+			self.stderr.write(f"Index nicht geprüft: {e}")
+		while True:
+			result = drain(options["batch_size"])
+			busy = any(result.values())
+			if busy:
+				self.stdout.write(f"{result} {lag()}")
+			if not options["loop"]:
+				if not busy:
+					return
+				continue
+			if not busy:
+				time.sleep(options["interval"])
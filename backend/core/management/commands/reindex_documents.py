@@ -0,0 +1,132 @@
+import threading
+import time
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils.dateparse import parse_datetime
+
+
+class Command(BaseCommand):
+	help = "Rebuild the document search index from PostgreSQL (new index + alias swap) or refresh a subset in place"
+
+	def add_arguments(self, parser):
+		parser.add_argument("--tenant", type=int, action="append", help="Only these tenants (in place, no swap)")
+		parser.add_argument("--since", help="Only documents updated at/after this ISO timestamp (in place, no swap)")
+		parser.add_argument("--batch-size", type=int, default=1000)
+		parser.add_argument("--threads", type=int, default=4, help="Parallel id-range slices")
+		parser.add_argument("--keep-old", action="store_true", help="Keep the previous indices after the swap")
+
+	def handle(self, *args, **options):
+		from core.models import Document
+		from core.search import get_client, index_name, put_template, versioned_index
+		from core.search_cache import invalidate_all
+
+		since = None
+		if options["since"]:
+			since = parse_datetime(options["since"])
+			if since is None:
+				raise CommandError("--since: ISO-Zeitstempel erwartet")
+		qs = Document.objects.all()
+		if options["tenant"]:
+			qs = qs.filter(tenant_id__in=options["tenant"])
+		if since is not None:
+			qs = qs.filter(updated_at__gte=since)
+
+		client = get_client()
+		alias = index_name()
+		if options["tenant"] or since is not None:
+			# Teilmenge: direkt in den Live-Index, kein neuer Index
+			total = self._load(qs, alias, options)
+			client.indices.refresh(index=alias)
+			invalidate_all()
+			self.stdout.write(self.style.SUCCESS(f"{total} Dokumente in {alias} aktualisiert"))
+			return
+
+		started = datetime.now().astimezone()
+		target = f"{versioned_index()}-{started:%Y%m%d%H%M%S}"
+		# Während des Ladens ohne Refresh und Replikas; danach auf die Template-Werte zurück
+		put_template(client)
+		client.indices.create(index=target, body={"settings": {"index": {"refresh_interval": "-1", "number_of_replicas": 0}}})
+		try:
+			total = self._load(qs, target, options)
+		except BaseException:
+			# Der Live-Alias bleibt unberührt; halbfertigen Index verwerfen
+			client.indices.delete(index=target, ignore=[404])
+			raise
+		client.indices.put_settings(index=target, body={"index": {"refresh_interval": None, "number_of_replicas": None}})
+		client.indices.refresh(index=target)
+
+		previous = sorted(client.indices.get_alias(name=alias)) if client.indices.exists_alias(name=alias) else []
+		actions = [{"remove": {"index": name, "alias": alias}} for name in previous]
+		if not previous and client.indices.exists(index=alias):
+			# Altbestand ohne Alias: Index entfernen und Alias im selben Schritt setzen
+			actions.append({"remove_index": {"index": alias}})
+		actions.append({"add": {"index": target, "alias": alias, "is_write_index": True}})
+		client.indices.update_aliases(body={"actions": actions})
+		invalidate_all()
+		self.stdout.write(self.style.SUCCESS(f"{alias} -> {target} ({total} Dokumente)"))
+
+		# Während des Aufbaus geänderte Dokumente gingen in den alten Index: nachziehen
+		caught_up = self._load(Document.objects.filter(updated_at__gte=started), alias, options)
+		if caught_up:
+			client.indices.refresh(index=alias)
+			invalidate_all()
+			self.stdout.write(f"{caught_up} zwischenzeitlich geänderte Dokumente nachindexiert")
+		if not options["keep_old"]:
+			for name in previous:
+				client.indices.delete(index=name, ignore=[404])
+
+	def _load(self, qs, index, options):
+		"""Streamt `qs` in `--threads` ID-Bereichen parallel in den Index `index`."""
+		from django.db.models import Max, Min
+
+		bounds = qs.aggregate(lo=Min("id"), hi=Max("id"))
+		if bounds["lo"] is None:
+			return 0
+		threads = max(1, options["threads"])
+		step = (bounds["hi"] - bounds["lo"]) // threads + 1
+		slices = [(bounds["lo"] + i * step, bounds["lo"] + (i + 1) * step) for i in range(threads)]
+		counts = [0] * threads
+		failures = [0] * threads
+		errors = []
+		started = time.monotonic()
+
+		def run(slot, lo, hi):
+			from core.search import bulk_index, document_payload, get_client
+
+			client = get_client()
+			try:
+				batch = []
+				rows = (
+					qs.filter(id__gte=lo, id__lt=hi)
+					.order_by("id")
+					.select_related("agenda_item__meeting")
+					.prefetch_related("chunks")
+				)
+				# iterator() nutzt unter PostgreSQL einen serverseitigen Cursor
+				for doc in rows.iterator(chunk_size=options["batch_size"]):
+					batch.append(document_payload(doc))
+					if len(batch) >= options["batch_size"]:
+						failures[slot] += len(bulk_index(batch, client=client, index=index))
+						counts[slot] += len(batch)
+						batch = []
+				if batch:
+					failures[slot] += len(bulk_index(batch, client=client, index=index))
+					counts[slot] += len(batch)
+			except Exception as e:
+				errors.append(e)
+			finally:
+				connection.close()
+
+		workers = [threading.Thread(target=run, args=(slot, lo, hi)) for slot, (lo, hi) in enumerate(slices)]
+		for worker in workers:
+			worker.start()
+		for worker in workers:
+			worker.join()
+		if errors:
+			raise CommandError(f"Reindex abgebrochen: {errors[0]}")
+		total = sum(counts)
+		seconds = max(time.monotonic() - started, 1e-6)
+		self.stdout.write(f"{index}: {total} Dokumente in {seconds:.1f}s ({total / seconds:.0f}/s), {sum(failures)} Fehler")
+		return total
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+	help = "Show search result cache statistics, reset them or invalidate all cached results"
+
+	def add_arguments(self, parser):
+		parser.add_argument("action", choices=["stats", "reset-stats", "clear"])
+
+	def handle(self, *args, **options):
+		from core.search_cache import invalidate_all, reset_stats, stats
+
+		if options["action"] == "clear":
+			invalidate_all()
+			self.stdout.write("Suchcache-Epoche erhöht; alle gecachten Ergebnisse verfallen")
+		elif options["action"] == "reset-stats":
+			reset_stats()
+		else:
+			self.stdout.write(str(stats()))
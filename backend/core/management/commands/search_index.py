@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+	help = "Manage the document search index (template, versioned index, alias)"
+
+	def add_arguments(self, parser):
+		parser.add_argument("action", choices=["ensure", "status"])
+
+	def handle(self, *args, **options):
+		from core.search import INDEX_VERSION, ensure_index, get_client, index_name
+
+		client = get_client()
+		try:
+			if options["action"] == "ensure":
+				result = ensure_index(client)
+				self.stdout.write(str(result))
+				if result.get("legacy"):
+					self.stdout.write(self.style.WARNING(
+						f"{index_name()} ist ein Index ohne Alias; 'manage.py reindex_documents' stellt auf v{INDEX_VERSION} um."
+					))
+				return
+			alias = index_name()
+			indices = client.indices.get_alias(name=alias) if client.indices.exists_alias(name=alias) else {}
+			for name in sorted(indices):
+				count = client.count(index=name)["count"]
+				self.stdout.write(f"{alias} -> {name}: {count} Dokumente")
+			if not indices:
+				self.stdout.write(f"{alias}: kein Alias (ensure ausführen)")
+		except Exception as e:
+			raise CommandError(f"OpenSearch nicht erreichbar: {e}")
@@ -0,0 +1,49 @@
+# Generated by Django 5.0.7 on 2026-10-18 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0009_offerdraft_staffprofile"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="organization",
+            index=models.Index(
+                fields=["tenant", "oparl_id"], name="core_org_tenant_oparl_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="committee",
+            index=models.Index(
+                fields=["tenant", "oparl_id"], name="core_cmte_tenant_oparl_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="person",
+            index=models.Index(
+                fields=["tenant", "oparl_id"], name="core_person_tenant_oparl_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="meeting",
+            index=models.Index(
+                fields=["tenant", "oparl_id"], name="core_meeting_tenant_oparl_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="agendaitem",
+            index=models.Index(
+                fields=["tenant", "oparl_id"], name="core_agenda_tenant_oparl_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="document",
+            index=models.Index(
+                fields=["tenant", "oparl_id"], name="core_doc_tenant_oparl_idx"
+            ),
+        ),
+    ]
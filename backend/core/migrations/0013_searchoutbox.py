@@ -0,0 +1,52 @@
+# Generated by Django 5.0.7 on 2026-10-18 13:48
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0012_documentchunk"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SearchOutbox",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("document_id", models.BigIntegerField()),
+                (
+                    "action",
+                    models.CharField(
+                        choices=[("index", "Index"), ("delete", "Delete")],
+                        default="index",
+                        max_length=10,
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "available_at",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+                ("attempts", models.PositiveIntegerField(default=0)),
+                ("last_error", models.TextField(blank=True, default="")),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["available_at", "id"],
+                        name="core_outbox_available_idx",
+                    )
+                ],
+            },
+        ),
+    ]
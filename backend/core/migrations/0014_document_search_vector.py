@@ -0,0 +1,106 @@
+# Generated by Django 5.0.7 on 2026-10-18 14:31
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+from core import trigram
+
+# tsvector-Spalten werden per Trigger gepflegt, damit auch bulk_create/bulk_update/update() sie aktualisieren
+DOCUMENT_TRIGGER = """
+CREATE FUNCTION core_document_search_vector() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('german', coalesce(NEW.title, '')), 'A') ||
+        setweight(to_tsvector('german', coalesce(NEW.content_text, '')), 'B');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER core_document_search_vector_trg
+BEFORE INSERT OR UPDATE OF title, content_text, search_vector ON core_document
+FOR EACH ROW EXECUTE FUNCTION core_document_search_vector();
+
+UPDATE core_document SET title = title;
+"""
+
+DOCUMENT_TRIGGER_REVERSE = """
+DROP TRIGGER IF EXISTS core_document_search_vector_trg ON core_document;
+DROP FUNCTION IF EXISTS core_document_search_vector();
+"""
+
+CHUNK_TRIGGER = """
+CREATE FUNCTION core_documentchunk_search_vector() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector := to_tsvector('german', coalesce(NEW.text, ''));
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER core_documentchunk_search_vector_trg
+BEFORE INSERT OR UPDATE OF text, search_vector ON core_documentchunk
+FOR EACH ROW EXECUTE FUNCTION core_documentchunk_search_vector();
+
+UPDATE core_documentchunk SET text = text;
+"""
+
+CHUNK_TRIGGER_REVERSE = """
+DROP TRIGGER IF EXISTS core_documentchunk_search_vector_trg ON core_documentchunk;
+DROP FUNCTION IF EXISTS core_documentchunk_search_vector();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0013_searchoutbox"),
+    ]
+
+    operations = [
+        # pg_trgm optional (core.trigram): ohne Extension fehlen nur Index und Titel-Ähnlichkeit
+        migrations.RunSQL(trigram.CREATE_EXTENSION, trigram.DROP_EXTENSION),
+        migrations.AddField(
+            model_name="document",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="documentchunk",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, null=True
+            ),
+        ),
+        migrations.RunSQL(DOCUMENT_TRIGGER, DOCUMENT_TRIGGER_REVERSE),
+        migrations.RunSQL(CHUNK_TRIGGER, CHUNK_TRIGGER_REVERSE),
+        migrations.AddIndex(
+            model_name="document",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["search_vector"], name="core_doc_search_gin"
+            ),
+        ),
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddIndex(
+                    model_name="document",
+                    index=django.contrib.postgres.indexes.GinIndex(
+                        fields=["title"], name="core_doc_title_trgm", opclasses=["gin_trgm_ops"]
+                    ),
+                ),
+            ],
+            database_operations=[
+                migrations.RunSQL(
+                    trigram.index_sql("core_doc_title_trgm", "core_document", "title"),
+                    "DROP INDEX IF EXISTS core_doc_title_trgm;",
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="documentchunk",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["search_vector"], name="core_chunk_search_gin"
+            ),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.0.7 on 2026-10-18 16:05
+
+import django.contrib.postgres.indexes
+from django.db import migrations
+
+from core import trigram
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0014_document_search_vector"),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddIndex(
+                    model_name="committee",
+                    index=django.contrib.postgres.indexes.GinIndex(
+                        fields=["name"], name="core_cmte_name_trgm", opclasses=["gin_trgm_ops"]
+                    ),
+                ),
+                migrations.AddIndex(
+                    model_name="person",
+                    index=django.contrib.postgres.indexes.GinIndex(
+                        fields=["name"], name="core_person_name_trgm", opclasses=["gin_trgm_ops"]
+                    ),
+                ),
+            ],
+            database_operations=[
+                migrations.RunSQL(
+                    trigram.index_sql("core_cmte_name_trgm", "core_committee", "name"),
+                    "DROP INDEX IF EXISTS core_cmte_name_trgm;",
+                ),
+                migrations.RunSQL(
+                    trigram.index_sql("core_person_name_trgm", "core_person", "name"),
+                    "DROP INDEX IF EXISTS core_person_name_trgm;",
+                ),
+            ],
+        ),
+    ]
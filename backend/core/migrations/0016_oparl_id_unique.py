@@ -0,0 +1,94 @@
+# Generated by Django 5.0.7 on 2026-10-18 16:05
+
+from django.db import migrations, models
+from django.db.models import Count, Min, Q
+
+
+# Eltern vor Kindern; je Kind: (Modell, FK-Feld, Felder, mit denen das FK eindeutig ist)
+ENTITIES = [
+    ("organization", [("committee", "organization", ())]),
+    ("committee", [("meeting", "committee", ()), ("roleassignment", "committee", ("tenant_id", "user_id", "role"))]),
+    ("person", [("position", "person", ())]),
+    ("meeting", [("agendaitem", "meeting", ("position",))]),
+    ("agendaitem", [("document", "agenda_item", ())]),
+    ("document", []),
+]
+
+
+def dedupe(apps, schema_editor):
+    """Doppelte (tenant, oparl_id) zusammenführen: älteste Zeile bleibt, Kinder wandern dorthin."""
+    SearchOutbox = apps.get_model("core", "SearchOutbox")
+    for name, children in ENTITIES:
+        model = apps.get_model("core", name)
+        groups = (
+            model.objects.exclude(oparl_id="")
+            .values("tenant_id", "oparl_id")
+            .annotate(n=Count("id"), keep=Min("id"))
+            .filter(n__gt=1)
+            .order_by()
+        )
+        for group in groups:
+            dupes = list(
+                model.objects.filter(tenant_id=group["tenant_id"], oparl_id=group["oparl_id"])
+                .exclude(pk=group["keep"])
+                .values_list("id", flat=True)
+            )
+            for child_name, fk, unique_with in children:
+                child = apps.get_model("core", child_name)
+                for obj in child.objects.filter(**{f"{fk}_id__in": dupes}).order_by("id"):
+                    # Hat die behaltene Zeile schon ein gleiches Kind, bleibt dieses am Duplikat und geht mit ihm
+                    clash = {f: getattr(obj, f) for f in unique_with}
+                    if unique_with and child.objects.filter(**{f"{fk}_id": group["keep"]}, **clash).exists():
+                        continue
+                    setattr(obj, f"{fk}_id", group["keep"])
+                    obj.save(update_fields=[fk])
+            model.objects.filter(pk__in=dupes).delete()
+            if name == "document":
+                SearchOutbox.objects.bulk_create([SearchOutbox(document_id=pk, action="delete") for pk in dupes])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0015_suggest_trigram_indexes"),
+    ]
+
+    operations = [
+        migrations.RunPython(dedupe, migrations.RunPython.noop, elidable=True),
+        migrations.AddConstraint(
+            model_name="organization",
+            constraint=models.UniqueConstraint(
+                condition=~Q(oparl_id=""), fields=("tenant", "oparl_id"), name="core_org_tenant_oparl_uniq"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="committee",
+            constraint=models.UniqueConstraint(
+                condition=~Q(oparl_id=""), fields=("tenant", "oparl_id"), name="core_cmte_tenant_oparl_uniq"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="person",
+            constraint=models.UniqueConstraint(
+                condition=~Q(oparl_id=""), fields=("tenant", "oparl_id"), name="core_person_tenant_oparl_uniq"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="meeting",
+            constraint=models.UniqueConstraint(
+                condition=~Q(oparl_id=""), fields=("tenant", "oparl_id"), name="core_meeting_tenant_oparl_uniq"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="agendaitem",
+            constraint=models.UniqueConstraint(
+                condition=~Q(oparl_id=""), fields=("tenant", "oparl_id"), name="core_agenda_tenant_oparl_uniq"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="document",
+            constraint=models.UniqueConstraint(
+                condition=~Q(oparl_id=""), fields=("tenant", "oparl_id"), name="core_doc_tenant_oparl_uniq"
+            ),
+        ),
+    ]
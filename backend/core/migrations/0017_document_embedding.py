@@ -0,0 +1,23 @@
+# Generated by Django 5.0.7 on 2026-10-18 16:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0016_oparl_id_unique"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="document",
+            name="embedding",
+            field=models.JSONField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="document",
+            name="embedding_key",
+            field=models.CharField(blank=True, default="", editable=False, max_length=40),
+        ),
+    ]
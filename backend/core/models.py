@@ -2,6 +2,8 @@ from __future__ import annotations
 
 from django.conf import settings
 from django.contrib.auth.models import AbstractUser
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 from django.utils import timezone
 import uuid
@@ -70,6 +72,11 @@ class Organization(models.Model):
 	name = models.CharField(max_length=255)
 	oparl_id = models.CharField(max_length=255, blank=True, default="")
 
+	class Meta:
+		indexes = [models.Index(fields=["tenant", "oparl_id"], name="core_org_tenant_oparl_idx")]
+		# Ingest schreibt keyed by (tenant, oparl_id); leere OParl-ID = nicht importiert
+		constraints = [models.UniqueConstraint(fields=["tenant", "oparl_id"], condition=~models.Q(oparl_id=""), name="core_org_tenant_oparl_uniq")]
+
 	def __str__(self) -> str:
 		return self.name
 
@@ -80,6 +87,14 @@ class Committee(models.Model):
 	oparl_id = models.CharField(max_length=255, blank=True, default="")
 	organization = models.ForeignKey(Organization, on_delete=models.CASCADE, null=True, blank=True)
 
+	class Meta:
+		indexes = [
+			models.Index(fields=["tenant", "oparl_id"], name="core_cmte_tenant_oparl_idx"),
+			# Vorschläge (core.suggest): Wortanfänge per Trigramm-Index
+			GinIndex(fields=["name"], name="core_cmte_name_trgm", opclasses=["gin_trgm_ops"]),
+		]
+		constraints = [models.UniqueConstraint(fields=["tenant", "oparl_id"], condition=~models.Q(oparl_id=""), name="core_cmte_tenant_oparl_uniq")]
+
 	def __str__(self) -> str:
 		return self.name
 
@@ -90,6 +105,13 @@ class Person(models.Model):
 	party = models.CharField(max_length=255, blank=True, default="")
 	oparl_id = models.CharField(max_length=255, blank=True, default="")
 
+	class Meta:
+		indexes = [
+			models.Index(fields=["tenant", "oparl_id"], name="core_person_tenant_oparl_idx"),
+			GinIndex(fields=["name"], name="core_person_name_trgm", opclasses=["gin_trgm_ops"]),
+		]
+		constraints = [models.UniqueConstraint(fields=["tenant", "oparl_id"], condition=~models.Q(oparl_id=""), name="core_person_tenant_oparl_uniq")]
+
 	def __str__(self) -> str:
 		return self.name
 
@@ -101,6 +123,10 @@ class Meeting(models.Model):
 	end = models.DateTimeField(null=True, blank=True)
 	oparl_id = models.CharField(max_length=255, blank=True, default="")
 
+	class Meta:
+		indexes = [models.Index(fields=["tenant", "oparl_id"], name="core_meeting_tenant_oparl_idx")]
+		constraints = [models.UniqueConstraint(fields=["tenant", "oparl_id"], condition=~models.Q(oparl_id=""), name="core_meeting_tenant_oparl_uniq")]
+
 
 class AgendaItem(models.Model):
 	tenant = models.ForeignKey(Tenant, on_delete=models.CASCADE)
@@ -113,6 +139,8 @@ class AgendaItem(models.Model):
 	class Meta:
 		unique_together = ("meeting", "position")
 		ordering = ["position"]
+		indexes = [models.Index(fields=["tenant", "oparl_id"], name="core_agenda_tenant_oparl_idx")]
+		constraints = [models.UniqueConstraint(fields=["tenant", "oparl_id"], condition=~models.Q(oparl_id=""), name="core_agenda_tenant_oparl_uniq")]
 
 
 class Document(models.Model):
@@ -127,6 +155,53 @@ class Document(models.Model):
 	oparl_id = models.CharField(max_length=255, blank=True, default="")
 	created_at = models.DateTimeField(auto_now_add=True)
 	updated_at = models.DateTimeField(auto_now=True)
+	# Gepflegt per DB-Trigger (Migration 0014): title (A) + content_text (B), Konfiguration german
+	search_vector = SearchVectorField(null=True, editable=False)
+	# Dokument-Embedding (core.embeddings) samt Schlüssel der eingebetteten Texte; neu nur bei Änderung
+	embedding = models.JSONField(null=True, blank=True, editable=False)
+	embedding_key = models.CharField(max_length=40, blank=True, default="", editable=False)
+
+	class Meta:
+		indexes = [
+			models.Index(fields=["tenant", "oparl_id"], name="core_doc_tenant_oparl_idx"),
+			GinIndex(fields=["search_vector"], name="core_doc_search_gin"),
+			GinIndex(fields=["title"], name="core_doc_title_trgm", opclasses=["gin_trgm_ops"]),
+		]
+		constraints = [models.UniqueConstraint(fields=["tenant", "oparl_id"], condition=~models.Q(oparl_id=""), name="core_doc_tenant_oparl_uniq")]
+
+
+class DocumentChunk(models.Model):
+	"""Volltext eines Dokuments in Abschnitten; `content_text` am Dokument ist nur der Anfang."""
+	tenant = models.ForeignKey(Tenant, on_delete=models.CASCADE)
+	document = models.ForeignKey(Document, on_delete=models.CASCADE, related_name="chunks")
+	ordinal = models.PositiveIntegerField()
+	text = models.TextField()
+	start = models.PositiveIntegerField()  # Zeichen-Offsets im Volltext
+	end = models.PositiveIntegerField()
+	search_vector = SearchVectorField(null=True, editable=False)  # per DB-Trigger aus text
+
+	class Meta:
+		ordering = ["document", "ordinal"]
+		constraints = [models.UniqueConstraint(fields=["document", "ordinal"], name="core_chunk_doc_ordinal_uniq")]
+		indexes = [GinIndex(fields=["search_vector"], name="core_chunk_search_gin")]
+
+
+class SearchOutbox(models.Model):
+	"""Ausstehende Index-Änderungen, in derselben Transaktion wie die Dokumentänderung geschrieben.
+
+	Abgearbeitet von `manage.py drain_search_outbox`; erledigte Zeilen werden gelöscht,
+	fehlgeschlagene mit Backoff (`available_at`) erneut versucht.
+	"""
+	# Keine FK: Löschungen müssen den Dokument-Datensatz überleben
+	document_id = models.BigIntegerField()
+	action = models.CharField(max_length=10, choices=[("index", "Index"), ("delete", "Delete")], default="index")
+	created_at = models.DateTimeField(auto_now_add=True)
+	available_at = models.DateTimeField(default=timezone.now)
+	attempts = models.PositiveIntegerField(default=0)
+	last_error = models.TextField(blank=True, default="")
+
+	class Meta:
+		indexes = [models.Index(fields=["available_at", "id"], name="core_outbox_available_idx")]
 
 
 class Motion(models.Model):
@@ -183,6 +258,48 @@ class OParlSource(models.Model):
 		unique_together = ("tenant", "root_url")
 
 
+class IngestJob(models.Model):
+	"""Ein Importlauf einer OParl-Quelle; `cursor` ist der Checkpoint zum Fortsetzen nach Abbruch."""
+	tenant = models.ForeignKey(Tenant, on_delete=models.CASCADE)
+	source = models.ForeignKey(OParlSource, on_delete=models.CASCADE, related_name="jobs")
+	status = models.CharField(
+		max_length=20,
+		choices=[
+			("queued", "Queued"),
+			("running", "Running"),
+			("succeeded", "Succeeded"),
+			("failed", "Failed"),
+		],
+		default="queued",
+	)
+	params = models.JSONField(default=dict, blank=True)  # etag, last_modified, modified_since des Laufs
+	cursor = models.JSONField(default=dict, blank=True)
+	stats = models.JSONField(default=dict, blank=True)
+	result = models.JSONField(default=dict, blank=True)
+	error = models.TextField(blank=True, default="")
+	attempts = models.PositiveIntegerField(default=0)
+	created_at = models.DateTimeField(auto_now_add=True)
+	updated_at = models.DateTimeField(auto_now=True)
+	finished_at = models.DateTimeField(null=True, blank=True)
+
+	class Meta:
+		ordering = ["-created_at"]
+
+	@property
+	def is_active(self) -> bool:
+		return self.status in ("queued", "running")
+
+	def apply_result_to_source(self) -> None:
+		"""Validatoren eines erfolgreichen Laufs auf die Quelle übernehmen (Basis für den nächsten Delta-Sync)."""
+		validators = (self.result or {}).get("validators") or {}
+		source = self.source
+		source.etag = (validators.get("etag") or "")[:128]
+		source.last_modified = (validators.get("last_modified") or "")[:128]
+		# Startzeitpunkt des Jobs: Änderungen während des Laufs fallen in den nächsten Delta
+		source.last_synced_at = self.created_at
+		source.save(update_fields=["etag", "last_modified", "last_synced_at"])
+
+
 class Lead(models.Model):
 	"""Lead-Eintrag für Website-Kontakt mit Double-Opt-In."""
 	tenant = models.ForeignKey(Tenant, on_delete=models.SET_NULL, null=True, blank=True)
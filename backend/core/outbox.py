@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+import logging
+from datetime import timedelta
+from typing import Any, Dict, Iterable, List
+
+from django.db import transaction
+from django.db.models import Count, Min
+from django.utils import timezone
+
+from .models import Document, SearchOutbox
+
+logger = logging.getLogger(__name__)
+
+# Obergrenze für das Backoff zwischen zwei Versuchen
+MAX_BACKOFF_SECONDS = 3600
+# So lange gehören beanspruchte Einträge einem Worker; länger als ein Batch indexiert
+LEASE_SECONDS = 300
+
+
+def enqueue_documents(ids: Iterable[int], action: str = "index") -> None:
+	"""Vermerkt Dokumente zur (Neu-)Indexierung; im Transaktionskontext des Aufrufers schreiben."""
+	SearchOutbox.objects.bulk_create([SearchOutbox(document_id=pk, action=action) for pk in ids])
+
+
+def drain(batch_size: int = 500) -> Dict[str, int]:
+	"""Arbeitet einen Batch fälliger Outbox-Einträge ab.
+
+	Die Zeilen werden mit SKIP LOCKED beansprucht und per Lease (`available_at` um
+	LEASE_SECONDS vorgeschoben) sofort wieder freigegeben; indexiert wird außerhalb
+	jeder Transaktion. Je Dokument zählt nur der neueste Eintrag; Erfolge werden
+	danach gelöscht, Fehler mit exponentiellem Backoff neu terminiert. Stirbt der
+	Worker, werden die Einträge nach Ablauf der Lease erneut abgearbeitet.
+	"""
+	from .search import document_payload
+	from .search_backends import get_backend
+	from .search_cache import invalidate_all, invalidate_tenants
+
+	now = timezone.now()
+	lease = now + timedelta(seconds=LEASE_SECONDS)
+	with transaction.atomic():
+		rows = list(
+			SearchOutbox.objects.select_for_update(skip_locked=True)
+			.filter(available_at__lte=now)
+			.order_by("id")[:batch_size]
+		)
+		if not rows:
+			return {"indexed": 0, "deleted": 0, "failed": 0}
+		SearchOutbox.objects.filter(pk__in=[row.pk for row in rows]).update(available_at=lease)
+
+	latest: Dict[int, SearchOutbox] = {}
+	for row in rows:
+		latest[row.document_id] = row
+	wanted = [pk for pk, row in latest.items() if row.action == "index"]
+	loaded = Document.objects.filter(pk__in=wanted).select_related("agenda_item__meeting").prefetch_related("chunks")
+	documents = {doc.pk: doc for doc in loaded}
+	# Inzwischen gelöschte Dokumente werden auch aus dem Index entfernt
+	deleted = [pk for pk in latest if pk not in documents]
+	try:
+		failed = get_backend().index([document_payload(doc) for doc in documents.values()], deleted)
+	except Exception as e:
+		logger.warning("Indexierung fehlgeschlagen: %s", e)
+		failed = {pk: str(e) for pk in latest}
+
+	with transaction.atomic():
+		# Nur Zeilen, deren Lease noch uns gehört; Änderungen während des Indexierens sind eigene Zeilen
+		owned = set(
+			SearchOutbox.objects.select_for_update()
+			.filter(pk__in=[row.pk for row in rows], available_at=lease)
+			.values_list("pk", flat=True)
+		)
+		done: List[int] = [row.pk for row in rows if row.pk in owned and row.document_id not in failed]
+		retry = [row for row in rows if row.pk in owned and row.document_id in failed]
+		SearchOutbox.objects.filter(pk__in=done).delete()
+		retried_at = timezone.now()
+		for row in retry:
+			row.attempts += 1
+			row.last_error = failed[row.document_id][:2000]
+			row.available_at = retried_at + timedelta(seconds=min(2 ** row.attempts, MAX_BACKOFF_SECONDS))
+		SearchOutbox.objects.bulk_update(retry, ["attempts", "last_error", "available_at"])
+	# Gecachte Suchergebnisse der betroffenen Mandanten verfallen; Löschungen kennen keinen Mandanten mehr
+	invalidate_tenants(doc.tenant_id for pk, doc in documents.items() if pk not in failed)
+	if any(pk not in failed for pk in deleted):
+		invalidate_all()
+	return {
+		"indexed": len([pk for pk in documents if pk not in failed]),
+		"deleted": len([pk for pk in deleted if pk not in failed]),
+		"failed": len(failed),
+	}
+
+
+def lag() -> Dict[str, Any]:
+	"""Rückstand der Outbox: offene Einträge, Alter des ältesten, Einträge mit Fehlversuchen."""
+	stats = SearchOutbox.objects.aggregate(pending=Count("id"), oldest=Min("created_at"))
+	oldest = stats["oldest"]
+	return {
+		"pending": stats["pending"],
+		"lag_seconds": round((timezone.now() - oldest).total_seconds(), 1) if oldest else 0.0,
+		"retrying": SearchOutbox.objects.filter(attempts__gt=0).count(),
+	}
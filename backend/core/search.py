@@ -1,10 +1,14 @@
 from __future__ import annotations
 
+import logging
+import mimetypes
 import os
-from typing import Any, Dict
+from typing import Any, Dict, Iterable, List, Optional
 
 from opensearchpy import OpenSearch
 
+logger = logging.getLogger(__name__)
+
 
 def get_client() -> OpenSearch:
 	host = os.getenv("OPENSEARCH_HOST", "opensearch")
@@ -16,22 +20,138 @@ def get_client() -> OpenSearch:
 	)
 
 
-def index_document(doc: Dict[str, Any]) -> None:
-	client = get_client()
-	index_name = os.getenv("OPENSEARCH_INDEX", "mandari-documents")
-	client.indices.create(index=index_name, ignore=400, body={
-		"settings": {
-			"index": {
-				"knn": True
-			}
+def document_type(instance: Any) -> str:
+	"""Dateityp als Endung ("pdf", "docx"); aus dem MIME-Typ der Quelle, sonst aus dem Dateinamen."""
+	mime = ((instance.normalized or {}).get("mime_type") or "").split(";")[0].strip().lower()
+	if not mime:
+		mime = mimetypes.guess_type(instance.file.name if instance.file else instance.oparl_id)[0] or ""
+	extension = mimetypes.guess_extension(mime) if mime else None
+	return extension.lstrip(".") if extension else ""
+
+
+def document_payload(instance: Any) -> Dict[str, Any]:
+	from .chunks import document_text
+
+	# select_related("agenda_item__meeting") beim Laden vermeidet Einzelabfragen
+	agenda_item = instance.agenda_item if instance.agenda_item_id else None
+	meeting = agenda_item.meeting if agenda_item else None
+	return {
+		"id": instance.id,
+		"tenant_id": instance.tenant_id,
+		"title": instance.title,
+		"content_text": document_text(instance),
+		"agenda_item_id": instance.agenda_item_id,
+		"committee_id": meeting.committee_id if meeting else None,
+		"meeting_date": meeting.start.isoformat() if meeting else None,
+		"category": agenda_item.category if agenda_item and agenda_item.category else None,
+		"document_type": document_type(instance) or None,
+		"created_at": instance.created_at.isoformat() if instance.created_at else None,
+	}
+
+
+# Bei Mapping-Änderungen erhöhen und per `manage.py reindex_documents` neu aufbauen
+INDEX_VERSION = 4
+
+INDEX_SETTINGS: Dict[str, Any] = {
+	"index": {
+		"knn": True,
+	},
+}
+
+INDEX_MAPPINGS: Dict[str, Any] = {
+	"properties": {
+		"tenant_id": {"type": "keyword"},
+		"title": {"type": "text", "analyzer": "german"},
+		"content_text": {"type": "text", "analyzer": "german"},
+		"agenda_item_id": {"type": "long"},
+		"committee_id": {"type": "long"},
+		"meeting_date": {"type": "date"},
+		"category": {"type": "keyword"},
+		"document_type": {"type": "keyword"},
+		"created_at": {"type": "date"},
+		# Lucene-HNSW unterstützt Filter innerhalb der kNN-Suche (Mandant, Gremium, Zeitraum)
+		"embedding": {
+			"type": "knn_vector",
+			"dimension": int(os.getenv("EMBEDDING_DIMENSION", "384")),
+			"method": {"name": "hnsw", "space_type": "cosinesimil", "engine": "lucene"},
 		},
-		"mappings": {
-			"properties": {
-				"tenant_id": {"type": "keyword"},
-				"title": {"type": "text"},
-				"content_text": {"type": "text"},
-			}
-		}
+	},
+}
+
+
+def index_name() -> str:
+	"""Alias, über den gelesen und geschrieben wird; zeigt auf den versionierten Index."""
+	return os.getenv("OPENSEARCH_INDEX", "mandari-documents")
+
+
+def versioned_index(version: int = INDEX_VERSION) -> str:
+	return f"{index_name()}-v{version}"
+
+
+def put_template(client: OpenSearch) -> None:
+	"""Versioniertes Index-Template für alle `<alias>-v*`-Indizes."""
+	client.indices.put_index_template(name=index_name(), body={
+		"index_patterns": [f"{index_name()}-v*"],
+		"version": INDEX_VERSION,
+		"template": {"settings": INDEX_SETTINGS, "mappings": INDEX_MAPPINGS},
 	})
-	client.index(index=index_name, id=doc["id"], body=doc, refresh=True)
 
+
+def ensure_index(client: Optional[OpenSearch] = None) -> Dict[str, Any]:
+	"""Legt Template, versionierten Index und Alias an, sofern sie fehlen (idempotent).
+
+	Läuft einmal beim Start bzw. per `manage.py search_index ensure` – nicht je Schreibvorgang.
+	"""
+	client = client or get_client()
+	alias = index_name()
+	put_template(client)
+	if client.indices.exists_alias(name=alias):
+		return {"alias": alias, "indices": sorted(client.indices.get_alias(name=alias)), "created": False}
+	if client.indices.exists(index=alias):
+		# Altbestand: konkreter Index unter dem Alias-Namen; reindex_documents stellt um
+		return {"alias": alias, "indices": [alias], "created": False, "legacy": True}
+	target = versioned_index()
+	if not client.indices.exists(index=target):
+		client.indices.create(index=target)
+	client.indices.put_alias(index=target, name=alias, body={"is_write_index": True})
+	return {"alias": alias, "indices": [target], "created": True}
+
+
+def bulk_index(
+	docs: List[Dict[str, Any]],
+	deleted: Iterable[int] = (),
+	client: Optional[OpenSearch] = None,
+	refresh: Optional[str] = None,
+	index: Optional[str] = None,
+) -> Dict[int, str]:
+	"""Indexiert und löscht in einem _bulk-Request; liefert die Fehler je Dokument-ID.
+
+	Ohne `refresh` gilt das Refresh-Intervall des Index; "wait_for" nur für Read-your-writes.
+	Embeddings werden vorher ergänzt (gespeicherte wiederverwendet); ist der AI-Service nicht
+	erreichbar, gehen Dokumente ohne gespeichertes Embedding nur für BM25 in den Index.
+	"""
+	from opensearchpy import helpers
+	from .embeddings import EmbeddingError, attach_embeddings
+
+	try:
+		docs = attach_embeddings(docs)
+	except EmbeddingError:
+		# Embeddings sind optional: BM25 darf nicht am AI-Service hängen. Gespeicherte Vektoren
+		# sind schon gesetzt; der Rest kommt beim nächsten Indexieren bzw. reindex_documents.
+		logger.warning("Embeddings nicht verfügbar, indexiere ohne Vektor", exc_info=True)
+	client = client or get_client()
+	name = index or index_name()
+	actions = [{"_op_type": "index", "_index": name, "_id": doc["id"], "_source": doc} for doc in docs]
+	actions += [{"_op_type": "delete", "_index": name, "_id": pk} for pk in deleted]
+	if not actions:
+		return {}
+	kwargs = {"refresh": refresh} if refresh else {}
+	_, errors = helpers.bulk(client, actions, raise_on_error=False, raise_on_exception=False, **kwargs)
+	failed: Dict[int, str] = {}
+	for error in errors:
+		(op, info), = error.items()
+		# Löschen eines nie indexierten Dokuments ist kein Fehler
+		if op == "delete" and info.get("status") == 404:
+			continue
+		failed[int(info["_id"])] = str(info.get("error") or info.get("status"))
+	return failed
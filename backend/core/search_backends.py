@@ -0,0 +1,516 @@
+from __future__ import annotations
+
+import logging
+import mimetypes
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Any, Dict, Iterable, List, Optional
+
+from django.conf import settings
+from django.utils.dateparse import parse_date
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+_backends: Dict[str, "SearchBackend"] = {}
+
+SEARCH_MODES = ("text", "semantic", "hybrid")
+
+# Konstante der Reciprocal Rank Fusion: dämpft den Einfluss der vordersten Plätze
+RRF_K = 60
+
+# Facetten der Trefferliste (Filter-Sidebar); Zeitachsen neueste zuerst
+FACET_SIZE = 50
+FACET_AGGREGATIONS: Dict[str, Dict[str, Any]] = {
+	"committee": {"terms": {"field": "committee_id", "size": FACET_SIZE}},
+	"category": {"terms": {"field": "category", "size": FACET_SIZE}},
+	"document_type": {"terms": {"field": "document_type", "size": FACET_SIZE}},
+	"year": {"date_histogram": {
+		"field": "meeting_date", "calendar_interval": "year", "format": "yyyy", "min_doc_count": 1, "order": {"_key": "desc"},
+	}},
+	"month": {"date_histogram": {
+		"field": "meeting_date", "calendar_interval": "month", "format": "yyyy-MM", "min_doc_count": 1, "order": {"_key": "desc"},
+	}},
+}
+
+
+def _int(value: Any) -> Optional[int]:
+	try:
+		return int(value)
+	except (TypeError, ValueError):
+		return None
+
+
+@dataclass
+class SearchQuery:
+	q: str = ""
+	tenant_id: Optional[int] = None
+	committee_id: Optional[int] = None
+	date_from: Optional[date] = None
+	date_to: Optional[date] = None
+	category: str = ""
+	document_type: str = ""
+	offset: int = 0
+	limit: int = 50
+	mode: str = "text"
+	facets: bool = True
+
+	@classmethod
+	def from_params(cls, params: Any) -> "SearchQuery":
+		"""Aus Query-Parametern (?q=&tenant=&committee_id=&category=&document_type=&date_from=&date_to=
+		&offset=&limit=&mode=&facets=)."""
+		mode = params.get("mode") or "text"
+		return cls(
+			mode=mode if mode in SEARCH_MODES else "text",
+			q=(params.get("q") or "").strip(),
+			tenant_id=_int(params.get("tenant")),
+			committee_id=_int(params.get("committee_id")),
+			date_from=parse_date(params.get("date_from") or ""),
+			date_to=parse_date(params.get("date_to") or ""),
+			category=(params.get("category") or "").strip(),
+			document_type=(params.get("document_type") or "").strip().lower(),
+			facets=(params.get("facets") or "1").lower() not in ("0", "false", "no"),
+			offset=max(_int(params.get("offset")) or 0, 0),
+			limit=min(max(_int(params.get("limit")) or 50, 1), 100),
+		)
+
+
+@dataclass
+class SearchResult:
+	ids: List[int] = field(default_factory=list)
+	total: int = 0
+	# Name -> [{"value": ..., "count": n}], absteigend nach Anzahl bzw. Zeit
+	facets: Dict[str, List[Dict[str, Any]]] = field(default_factory=dict)
+	cached: bool = False
+
+
+def mime_types(extension: str) -> List[str]:
+	"""Bekannte MIME-Typen, deren Standard-Endung `extension` ist ("pdf" -> ["application/pdf"])."""
+	return sorted({mime for mime in mimetypes.types_map.values() if mimetypes.guess_extension(mime) == f".{extension}"})
+
+
+def count_facets(docs: Iterable[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
+	"""Facetten aus Such-Payloads zählen (für Backends ohne eigene Aggregationen)."""
+	counters: Dict[str, Counter] = {name: Counter() for name in FACET_AGGREGATIONS}
+	for doc in docs:
+		meeting_date = doc.get("meeting_date") or ""
+		values = {
+			"committee": doc.get("committee_id"),
+			"category": doc.get("category"),
+			"document_type": doc.get("document_type"),
+			"year": meeting_date[:4],
+			"month": meeting_date[:7],
+		}
+		for name, value in values.items():
+			if value:
+				counters[name][value] += 1
+	facets = {}
+	for name, counter in counters.items():
+		if name in ("year", "month"):
+			items = sorted(counter.items(), reverse=True)
+		else:
+			items = counter.most_common(FACET_SIZE)
+		facets[name] = [{"value": value, "count": count} for value, count in items]
+	return facets
+
+
+def fuse(rankings: List[List[int]], k: int = RRF_K) -> List[int]:
+	"""Reciprocal Rank Fusion: Summe von 1/(k + Rang) über alle Ranglisten, absteigend."""
+	scores: Dict[int, float] = {}
+	for ranking in rankings:
+		for rank, pk in enumerate(ranking, start=1):
+			scores[pk] = scores.get(pk, 0.0) + 1.0 / (k + rank)
+	return sorted(scores, key=lambda pk: (-scores[pk], -pk))
+
+
+class SearchBackend:
+	"""Schnittstelle der Dokumentsuche; Auswahl per settings.SEARCH_BACKEND.
+
+	`index` nimmt Payloads aus `search.document_payload` entgegen und liefert Fehler je
+	Dokument-ID; `search` liefert die IDs der Trefferseite in Rangfolge.
+	"""
+
+	def ensure(self) -> Dict[str, Any]:
+		return {}
+
+	def index(self, docs: List[Dict[str, Any]], deleted: Iterable[int] = ()) -> Dict[int, str]:
+		raise NotImplementedError
+
+	def search(self, query: SearchQuery) -> SearchResult:
+		raise NotImplementedError
+
+
+class OpenSearchBackend(SearchBackend):
+	"""BM25 über den Alias aus search.index_name(); Mandant, Gremium und Zeitraum als Filter-Klauseln.
+
+	`mode=semantic` sucht per kNN über das Feld `embedding`, `mode=hybrid` verschmilzt
+	BM25- und kNN-Rangliste per Reciprocal Rank Fusion. Ist kein Query-Embedding
+	verfügbar, wird auf BM25 zurückgefallen.
+	"""
+
+	def ensure(self) -> Dict[str, Any]:
+		from .search import ensure_index
+		return ensure_index()
+
+	def index(self, docs: List[Dict[str, Any]], deleted: Iterable[int] = ()) -> Dict[int, str]:
+		from .search import bulk_index
+		from .search_cache import enabled
+		# Mit Suchcache erst zurückkehren, wenn die Änderungen suchbar sind; sonst könnte eine
+		# Suche nach dem Generationswechsel noch den alten Stand zwischenspeichern
+		return bulk_index(docs, deleted, refresh="wait_for" if enabled() else None)
+
+	def filters(self, query: SearchQuery) -> List[Dict[str, Any]]:
+		filters: List[Dict[str, Any]] = []
+		if query.tenant_id is not None:
+			filters.append({"term": {"tenant_id": str(query.tenant_id)}})
+		if query.committee_id is not None:
+			filters.append({"term": {"committee_id": query.committee_id}})
+		if query.category:
+			filters.append({"term": {"category": query.category}})
+		if query.document_type:
+			filters.append({"term": {"document_type": query.document_type}})
+		created: Dict[str, str] = {}
+		if query.date_from:
+			created["gte"] = query.date_from.isoformat()
+		if query.date_to:
+			created["lte"] = query.date_to.isoformat()
+		if created:
+			filters.append({"range": {"created_at": {**created, "format": "strict_date_optional_time"}}})
+		return filters
+
+	def build_query(self, query: SearchQuery) -> Dict[str, Any]:
+		filters = self.filters(query)
+		if query.q:
+			must: Dict[str, Any] = {
+				"multi_match": {"query": query.q, "fields": ["title^2", "content_text"], "operator": "and"},
+			}
+		else:
+			must = {"match_all": {}}
+		body: Dict[str, Any] = {
+			"query": {"bool": {"must": [must], "filter": filters}},
+			"from": query.offset,
+			"size": query.limit,
+			"_source": False,
+			"track_total_hits": True,
+		}
+		if not query.q:
+			body["sort"] = [{"created_at": "desc"}]
+		if query.facets:
+			body["aggs"] = FACET_AGGREGATIONS
+		return body
+
+	def parse_facets(self, res: Dict[str, Any]) -> Dict[str, List[Dict[str, Any]]]:
+		aggregations = res.get("aggregations") or {}
+		return {
+			name: [
+				{"value": bucket.get("key_as_string", bucket["key"]), "count": bucket["doc_count"]}
+				for bucket in aggregations[name]["buckets"]
+			]
+			for name in FACET_AGGREGATIONS
+			if name in aggregations
+		}
+
+	def build_knn_query(self, query: SearchQuery, vector: List[float], k: int) -> Dict[str, Any]:
+		knn: Dict[str, Any] = {"vector": vector, "k": k}
+		filters = self.filters(query)
+		if filters:
+			knn["filter"] = {"bool": {"filter": filters}}
+		body: Dict[str, Any] = {"query": {"knn": {"embedding": knn}}, "size": k, "_source": False}
+		if query.facets:
+			# Facetten über die kNN-Kandidaten
+			body["aggs"] = FACET_AGGREGATIONS
+		return body
+
+	def query_vector(self, query: SearchQuery) -> Optional[List[float]]:
+		from .embeddings import EmbeddingError, embed_query, enabled
+		if not enabled():
+			return None
+		try:
+			return embed_query(query.q)
+		except EmbeddingError:
+			logger.warning("Query-Embedding nicht verfügbar, suche nur per BM25", exc_info=True)
+			return None
+
+	def search(self, query: SearchQuery) -> SearchResult:
+		from .search import get_client, index_name
+		vector = self.query_vector(query) if query.q and query.mode != "text" else None
+		if vector is None:
+			res = get_client().search(index=index_name(), body=self.build_query(query))
+			hits = res["hits"]
+			return SearchResult(
+				ids=[int(hit["_id"]) for hit in hits["hits"]],
+				total=hits["total"]["value"],
+				facets=self.parse_facets(res),
+			)
+
+		# Jede Rangliste bis zur angefragten Seite tief; Gesamtzahl = Kandidaten nach der Fusion
+		depth = min(query.offset + query.limit, 1000)
+		searches = [{"index": index_name()}, self.build_knn_query(query, vector, depth)]
+		if query.mode == "hybrid":
+			text = SearchQuery(**{**query.__dict__, "offset": 0, "limit": depth})
+			text.facets = False
+			searches += [{"index": index_name()}, {**self.build_query(text), "track_total_hits": False}]
+		responses = get_client().msearch(body=searches)["responses"]
+		rankings = []
+		for res in responses:
+			if "error" in res:
+				logger.warning("Teilsuche fehlgeschlagen: %s", res["error"])
+				continue
+			rankings.append([int(hit["_id"]) for hit in res["hits"]["hits"]])
+		if not rankings:
+			raise RuntimeError("Semantische Suche fehlgeschlagen")
+		ranked = fuse(rankings)
+		return SearchResult(
+			ids=ranked[query.offset:query.offset + query.limit],
+			total=len(ranked),
+			facets=self.parse_facets(responses[0]),
+		)
+
+
+class DatabaseSearchBackend(SearchBackend):
+	"""PostgreSQL-Volltextsuche (Ausweichbetrieb ohne OpenSearch); indexiert nichts selbst.
+
+	Treffer über die GIN-indexierten tsvector-Spalten (german) von Dokument und
+	Textabschnitten sowie trigram-ähnliche Titel; Rang aus ts_rank und Titel-Ähnlichkeit.
+	Ohne pg_trgm (core.trigram) genügt für Titel ein Teilstring, gerankt wird nur per ts_rank.
+	"""
+
+	def index(self, docs: List[Dict[str, Any]], deleted: Iterable[int] = ()) -> Dict[int, str]:
+		return {}
+
+	def queryset(self, query: SearchQuery):
+		from django.contrib.postgres.search import SearchQuery as TextQuery, SearchRank, TrigramSimilarity
+		from django.db.models import F, FloatField, OuterRef, Subquery, Value
+		from django.db.models.functions import Coalesce
+		from . import trigram
+		from .models import Document, DocumentChunk
+
+		qs = Document.objects.all()
+		if query.tenant_id is not None:
+			qs = qs.filter(tenant_id=query.tenant_id)
+		if query.committee_id is not None:
+			qs = qs.filter(agenda_item__meeting__committee_id=query.committee_id)
+		if query.category:
+			qs = qs.filter(agenda_item__category=query.category)
+		if query.document_type:
+			# Dokumente ohne gespeicherten MIME-Typ (nur Dateiname) erfasst der Filter nicht
+			qs = qs.filter(normalized__mime_type__in=mime_types(query.document_type))
+		if query.date_from:
+			qs = qs.filter(created_at__date__gte=query.date_from)
+		if query.date_to:
+			qs = qs.filter(created_at__date__lte=query.date_to)
+		if not query.q:
+			return qs.order_by("-created_at")
+
+		text_query = TextQuery(query.q, config="german", search_type="websearch")
+		chunks = DocumentChunk.objects.filter(search_vector=text_query)
+		fuzzy = trigram.available()
+		titles = Document.objects.filter(**{"title__trigram_similar" if fuzzy else "title__icontains": query.q})
+		bodies = Document.objects.filter(search_vector=text_query)
+		if query.tenant_id is not None:
+			chunks = chunks.filter(tenant_id=query.tenant_id)
+			titles = titles.filter(tenant_id=query.tenant_id)
+			bodies = bodies.filter(tenant_id=query.tenant_id)
+		best_chunk = Subquery(
+			chunks.filter(document=OuterRef("pk"))
+			.annotate(rank=SearchRank(F("search_vector"), text_query))
+			.order_by("-rank")
+			.values("rank")[:1],
+			output_field=FloatField(),
+		)
+		# Je Zweig ein eigener GIN-Scan; ein OR über die Spalten würde Postgres zum Seq-Scan zwingen
+		matches = bodies.values("id").union(chunks.order_by().values("document_id"), titles.values("id"))
+		rank = Coalesce(SearchRank(F("search_vector"), text_query), Value(0.0)) + Coalesce(best_chunk, Value(0.0))
+		if fuzzy:
+			rank = rank + TrigramSimilarity("title", query.q)
+		return qs.filter(id__in=matches).annotate(rank=rank).order_by("-rank", "-created_at")
+
+	def facets(self, qs) -> Dict[str, List[Dict[str, Any]]]:
+		"""Facetten per GROUP BY über die Treffermenge (ohne Rang-Annotation und Sortierung)."""
+		from django.db.models import Count
+		from django.db.models.functions import TruncMonth, TruncYear
+		from .models import Document
+
+		base = Document.objects.filter(id__in=qs.order_by().values("id"))
+		with_meeting = base.filter(agenda_item__meeting__isnull=False)
+
+		def count(rows, key, order="-n", fmt=None):
+			rows = rows.values(key).annotate(n=Count("id")).order_by(order)[:FACET_SIZE]
+			return [{"value": row[key].strftime(fmt) if fmt else row[key], "count": row["n"]} for row in rows]
+
+		types: Counter = Counter()
+		for row in base.values("normalized__mime_type").annotate(n=Count("id")).order_by():
+			extension = mimetypes.guess_extension((row["normalized__mime_type"] or "").split(";")[0].strip().lower())
+			if extension:
+				types[extension.lstrip(".")] += row["n"]
+		return {
+			"committee": count(with_meeting, "agenda_item__meeting__committee_id"),
+			"category": count(base.exclude(agenda_item__category="").filter(agenda_item__isnull=False), "agenda_item__category"),
+			"document_type": [{"value": value, "count": n} for value, n in types.most_common(FACET_SIZE)],
+			"year": count(with_meeting.annotate(bucket=TruncYear("agenda_item__meeting__start")), "bucket", "-bucket", "%Y"),
+			"month": count(with_meeting.annotate(bucket=TruncMonth("agenda_item__meeting__start")), "bucket", "-bucket", "%Y-%m"),
+		}
+
+	def search(self, query: SearchQuery) -> SearchResult:
+		qs = self.queryset(query)
+		ids = list(qs.values_list("id", flat=True)[query.offset:query.offset + query.limit])
+		return SearchResult(ids=ids, total=qs.count(), facets=self.facets(qs) if query.facets else {})
+
+
+class AnnSearchBackend(DatabaseSearchBackend):
+	"""Lokaler Ersatz für OpenSearch: Text über PostgreSQL, Vektoren über core.ann (IVF, mmap).
+
+	`index` holt die Embeddings beim AI-Service und schreibt sie in den Index des
+	Mandanten; `mode=semantic|hybrid` antwortet wie der kNN-Pfad von OpenSearchBackend.
+	Gedacht für Tests, Benchmarks und kleine Mandanten – jede Änderung schreibt den
+	Mandanten-Index neu.
+	"""
+
+	def index(self, docs: List[Dict[str, Any]], deleted: Iterable[int] = ()) -> Dict[int, str]:
+		from .ann import get_store
+		from .embeddings import attach_embeddings
+
+		store = get_store()
+		by_tenant: Dict[int, List[Dict[str, Any]]] = {}
+		for doc in attach_embeddings(docs):
+			if doc.get("embedding"):
+				by_tenant.setdefault(int(doc["tenant_id"]), []).append(doc)
+		deleted = list(deleted)
+		for tenant_id in set(by_tenant) | (set(store.tenants()) if deleted else set()):
+			store.update(tenant_id, by_tenant.get(tenant_id, []), deleted)
+		return {}
+
+	def nearest(self, query: SearchQuery, vector: List[float], k: int) -> List[int]:
+		from .ann import get_store
+
+		store = get_store()
+		tenants = [query.tenant_id] if query.tenant_id is not None else store.tenants()
+		hits = []
+		for tenant_id in tenants:
+			index = store.get(tenant_id)
+			if index is not None:
+				hits += index.search(
+					vector,
+					k,
+					committee_id=query.committee_id,
+					day_from=query.date_from.toordinal() if query.date_from else 0,
+					day_to=query.date_to.toordinal() if query.date_to else 0,
+				)
+		return [pk for pk, _ in sorted(hits, key=lambda hit: -hit[1])[:k]]
+
+	def search(self, query: SearchQuery) -> SearchResult:
+		from .embeddings import EmbeddingError, embed_query
+
+		if not query.q or query.mode == "text":
+			return super().search(query)
+		try:
+			vector = embed_query(query.q)
+		except EmbeddingError:
+			logger.warning("Query-Embedding nicht verfügbar, suche nur im Volltext", exc_info=True)
+			return super().search(query)
+		depth = min(query.offset + query.limit, 1000)
+		rankings = [self.nearest(query, vector, depth)]
+		if query.mode == "hybrid":
+			rankings.append(list(self.queryset(query).values_list("id", flat=True)[:depth]))
+		ranked = fuse(rankings)
+		if query.category or query.document_type:
+			# Kategorie und Dateityp liegen nicht im ANN-Index; nachträglich über die DB filtern
+			allowed = set(self.queryset(SearchQuery(**{**query.__dict__, "q": ""})).filter(id__in=ranked).values_list("id", flat=True))
+			ranked = [pk for pk in ranked if pk in allowed]
+		facets = {}
+		if query.facets:
+			from .models import Document
+			facets = self.facets(Document.objects.filter(id__in=ranked))
+		return SearchResult(ids=ranked[query.offset:query.offset + query.limit], total=len(ranked), facets=facets)
+
+
+class MemorySearchBackend(SearchBackend):
+	"""In-Prozess-Ersatz für Tests: hält Payloads im Speicher, Rang nach Trefferzahl."""
+
+	documents: Dict[int, Dict[str, Any]] = {}
+
+	def index(self, docs: List[Dict[str, Any]], deleted: Iterable[int] = ()) -> Dict[int, str]:
+		for doc in docs:
+			self.documents[int(doc["id"])] = doc
+		for pk in deleted:
+			self.documents.pop(int(pk), None)
+		return {}
+
+	def matches(self, doc: Dict[str, Any], query: SearchQuery) -> bool:
+		if query.tenant_id is not None and int(doc.get("tenant_id") or 0) != query.tenant_id:
+			return False
+		if query.committee_id is not None and doc.get("committee_id") != query.committee_id:
+			return False
+		if query.category and doc.get("category") != query.category:
+			return False
+		if query.document_type and doc.get("document_type") != query.document_type:
+			return False
+		created = (doc.get("created_at") or "")[:10]
+		if query.date_from and created < query.date_from.isoformat():
+			return False
+		if query.date_to and created > query.date_to.isoformat():
+			return False
+		return True
+
+	def score(self, doc: Dict[str, Any], terms: List[str]) -> int:
+		title = (doc.get("title") or "").lower()
+		text = (doc.get("content_text") or "").lower()
+		if not all(term in title or term in text for term in terms):
+			return 0
+		return sum(2 * title.count(term) + text.count(term) for term in terms)
+
+	def search(self, query: SearchQuery) -> SearchResult:
+		terms = query.q.lower().split()
+		candidates = [doc for doc in self.documents.values() if self.matches(doc, query)]
+		if terms:
+			scored = [(self.score(doc, terms), doc) for doc in candidates]
+			ranked = [doc for score, doc in sorted(scored, key=lambda s: (-s[0], -int(s[1]["id"]))) if score > 0]
+		else:
+			ranked = sorted(candidates, key=lambda doc: doc.get("created_at") or "", reverse=True)
+		page = ranked[query.offset:query.offset + query.limit]
+		return SearchResult(
+			ids=[int(doc["id"]) for doc in page],
+			total=len(ranked),
+			facets=count_facets(ranked) if query.facets else {},
+		)
+
+
+def get_backend(path: Optional[str] = None) -> SearchBackend:
+	path = path or settings.SEARCH_BACKEND
+	backend = _backends.get(path)
+	if backend is None:
+		backend = _backends[path] = import_string(path)()
+	return backend
+
+
+def search_documents(query: SearchQuery) -> SearchResult:
+	"""Suche über das konfigurierte Backend; fällt es aus, über SEARCH_FALLBACK_BACKEND.
+
+	Ergebnisse des Haupt-Backends landen im Suchcache (core.search_cache), Ausweich-Ergebnisse nicht.
+	"""
+	from . import search_cache
+
+	key = None
+	if search_cache.enabled():
+		try:
+			key = search_cache.cache_key(query)
+		except Exception:
+			logger.debug("Suchcache nicht erreichbar", exc_info=True)
+	if key is not None:
+		cached = search_cache.lookup(key)
+		if cached is not None:
+			return cached
+	started = time.perf_counter()
+	try:
+		result = get_backend().search(query)
+	except Exception:
+		fallback = getattr(settings, "SEARCH_FALLBACK_BACKEND", "")
+		if not fallback or fallback == settings.SEARCH_BACKEND:
+			raise
+		logger.warning("Suchbackend nicht verfügbar, weiche auf %s aus", fallback, exc_info=True)
+		return get_backend(fallback).search(query)
+	if key is not None:
+		search_cache.store(key, result, time.perf_counter() - started)
+	return result
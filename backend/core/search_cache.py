@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import time
+from dataclasses import asdict
+from typing import Any, Dict, Iterable, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .search_backends import SearchQuery, SearchResult
+
+logger = logging.getLogger(__name__)
+
+# Generationen: je Mandant (bei Indexierung erhöht), "all" für Suchen ohne Mandant und
+# eine Epoche, die Löschungen und Neuaufbauten erhöhen (Mandant dann unbekannt bzw. alle)
+EPOCH_KEY = "search:gen:epoch"
+STATS_KEYS = ("search:stats:hits", "search:stats:misses", "search:stats:saved_ms")
+
+
+def _generation_key(tenant_id: Optional[int]) -> str:
+	return f"search:gen:{tenant_id if tenant_id is not None else 'all'}"
+
+
+def _initial() -> int:
+	# Nach einer Verdrängung nicht bei 0 beginnen, sonst könnten alte Einträge wieder gültig werden
+	return int(time.time() * 1000)
+
+
+def enabled() -> bool:
+	return settings.SEARCH_CACHE_TTL > 0
+
+
+def _bump(keys: Iterable[str]) -> None:
+	for key in keys:
+		try:
+			if cache.add(key, _initial(), timeout=None):
+				continue
+			cache.incr(key)
+		except Exception:
+			# Ein fehlgeschlagener Bump darf nie veraltete Treffer liefern: alles verwerfen
+			logger.warning("Suchcache-Generation %s nicht erhöht, verwerfe Epoche", key, exc_info=True)
+			try:
+				cache.delete(EPOCH_KEY)
+			except Exception:
+				pass
+
+
+def invalidate_tenants(tenant_ids: Iterable[int]) -> None:
+	"""Nach dem Indexieren: Ergebnisse dieser Mandanten (und mandantenübergreifende) verfallen."""
+	tenant_ids = set(tenant_ids)
+	if tenant_ids:
+		_bump([_generation_key(pk) for pk in tenant_ids] + [_generation_key(None)])
+
+
+def invalidate_all() -> None:
+	_bump([EPOCH_KEY])
+
+
+def _generations(tenant_id: Optional[int]) -> Dict[str, int]:
+	keys = [EPOCH_KEY, _generation_key(tenant_id)]
+	found = cache.get_many(keys)
+	for key in keys:
+		if key not in found:
+			cache.add(key, _initial(), timeout=None)
+			found[key] = cache.get(key)
+	return found
+
+
+def generation(tenant_id: Optional[int]) -> str:
+	"""Aktueller Stand (Epoche und Mandanten-Generation) für eigene Cache-Schlüssel."""
+	found = _generations(tenant_id)
+	return f"{found[EPOCH_KEY]}.{found[_generation_key(tenant_id)]}"
+
+
+def cache_key(query: SearchQuery) -> str:
+	"""Mandant, normalisierte Anfrage, Filter, Backend und die aktuellen Generationen."""
+	params = asdict(query)
+	# Analyzer (german, tsvector, Trigramme) ignorieren Groß-/Kleinschreibung und Leerraum
+	params["q"] = " ".join(query.q.lower().split())
+	params["backend"] = settings.SEARCH_BACKEND
+	params["generations"] = _generations(query.tenant_id)
+	digest = hashlib.sha1(json.dumps(params, sort_keys=True, default=str).encode()).hexdigest()
+	return f"search:r:{query.tenant_id if query.tenant_id is not None else 'all'}:{digest}"
+
+
+def _count(key: str, amount: int = 1) -> None:
+	if not cache.add(key, amount, timeout=None):
+		cache.incr(key, amount)
+
+
+def lookup(key: str) -> Optional[SearchResult]:
+	try:
+		entry = cache.get(key)
+		if entry is None:
+			_count(STATS_KEYS[1])
+			return None
+		_count(STATS_KEYS[0])
+		_count(STATS_KEYS[2], entry["ms"])
+	except Exception:
+		logger.debug("Suchcache nicht erreichbar", exc_info=True)
+		return None
+	return SearchResult(ids=entry["ids"], total=entry["total"], facets=entry["facets"], cached=True)
+
+
+def store(key: str, result: SearchResult, elapsed: float) -> None:
+	try:
+		cache.set(
+			key,
+			{"ids": result.ids, "total": result.total, "facets": result.facets, "ms": max(int(elapsed * 1000), 1)},
+			timeout=settings.SEARCH_CACHE_TTL,
+		)
+	except Exception:
+		logger.debug("Suchcache nicht erreichbar", exc_info=True)
+
+
+def stats() -> Dict[str, Any]:
+	"""Treffer, Fehlschläge, Trefferquote und eingesparte Backend-Zeit (Summe der Rechenzeiten der Treffer)."""
+	values = cache.get_many(STATS_KEYS)
+	hits, misses, saved = (int(values.get(key) or 0) for key in STATS_KEYS)
+	lookups = hits + misses
+	return {
+		"hits": hits,
+		"misses": misses,
+		"hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+		"saved_seconds": round(saved / 1000, 1),
+	}
+
+
+def reset_stats() -> None:
+	cache.delete_many(STATS_KEYS)
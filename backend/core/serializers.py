@@ -4,6 +4,8 @@ from .models import (
     AgendaItem,
     Committee,
     Document,
+    DocumentChunk,
+    IngestJob,
     Lead,
     Meeting,
     Motion,
@@ -101,6 +103,18 @@ class DocumentSerializer(serializers.ModelSerializer):
 		]
 
 
+class DocumentListSerializer(DocumentSerializer):
+	"""Listen und Suche: ohne Textkörper; der Volltext steht unter /documents/{id}/chunks/."""
+	class Meta(DocumentSerializer.Meta):
+		fields = [f for f in DocumentSerializer.Meta.fields if f != "content_text"]
+
+
+class DocumentChunkSerializer(serializers.ModelSerializer):
+	class Meta:
+		model = DocumentChunk
+		fields = ["id", "document", "ordinal", "text", "start", "end"]
+
+
 class MotionSerializer(serializers.ModelSerializer):
 	class Meta:
 		model = Motion
@@ -131,6 +145,27 @@ class OParlSourceSerializer(serializers.ModelSerializer):
 		fields = ["id", "tenant", "root_url", "enabled", "last_synced_at", "etag", "last_modified"]
 
 
+class IngestJobSerializer(serializers.ModelSerializer):
+	class Meta:
+		model = IngestJob
+		fields = [
+			"id",
+			"tenant",
+			"source",
+			"status",
+			"params",
+			"cursor",
+			"stats",
+			"result",
+			"error",
+			"attempts",
+			"created_at",
+			"updated_at",
+			"finished_at",
+		]
+		read_only_fields = ["tenant", "source", "params", "attempts", "created_at", "updated_at", "finished_at"]
+
+
 class LeadSerializer(serializers.ModelSerializer):
 	class Meta:
 		model = Lead
@@ -1,22 +1,20 @@
 from __future__ import annotations
 
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 
+from .chunks import sync_chunks
 from .models import Document
-from .search import index_document
+from .outbox import enqueue_documents
 
 
 @receiver(post_save, sender=Document)
 def on_document_saved(sender, instance: Document, created, **kwargs):
-	try:
-		index_document({
-			"id": instance.id,
-			"tenant_id": instance.tenant_id,
-			"title": instance.title,
-			"content_text": instance.content_text,
-		})
-	except Exception:
-		# Swallow indexing errors to not block writes
-		pass
+	sync_chunks(instance)
+	# Indexierung übernimmt drain_search_outbox; der Eintrag teilt die Transaktion des Speicherns
+	enqueue_documents([instance.pk])
 
+
+@receiver(post_delete, sender=Document)
+def on_document_deleted(sender, instance: Document, **kwargs):
+	enqueue_documents([instance.pk], action="delete")
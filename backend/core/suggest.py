@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+import hashlib
+import logging
+import re
+from typing import Any, Dict, List
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Case, F, IntegerField, Value, When
+from django.db.models.functions import Length
+
+from .models import Committee, Document, Person
+
+logger = logging.getLogger(__name__)
+
+# Kürzere Eingaben kann der Trigramm-Index nicht einschränken
+MIN_CHARS = 3
+MAX_LIMIT = 20
+
+SOURCES = (
+	("document", Document, "title"),
+	("committee", Committee, "name"),
+	("person", Person, "name"),
+)
+
+
+def normalize(prefix: str) -> str:
+	return " ".join(prefix.split())
+
+
+def candidates(kind: str, model, field: str, tenant_id: int, prefix: str, limit: int):
+	"""Einträge, bei denen ein Wort mit `prefix` beginnt; Anfang des ganzen Textes und kurze Texte zuerst.
+
+	`\\m` (Wortanfang) übernimmt die Rolle eines Edge-n-Gramms; der Trigramm-GIN-Index bedient den Regex.
+	"""
+	return (
+		model.objects.filter(tenant_id=tenant_id, **{f"{field}__iregex": r"\m" + re.escape(prefix)})
+		.annotate(
+			kind=Value(kind),
+			text=F(field),
+			starts=Case(When(**{f"{field}__istartswith": prefix}, then=Value(0)), default=Value(1), output_field=IntegerField()),
+			size=Length(field),
+		)
+		.order_by("starts", "size")
+		.values("kind", "id", "text", "starts", "size")[:limit]
+	)
+
+
+def query(tenant_id: int, prefix: str, limit: int) -> List[Dict[str, Any]]:
+	"""Ein Round-Trip: UNION ALL der drei Quellen, danach gleiche Texte zusammenfassen."""
+	parts = [candidates(kind, model, field, tenant_id, prefix, limit * 2) for kind, model, field in SOURCES]
+	rows = parts[0].union(*parts[1:], all=True).order_by("starts", "size")
+	suggestions: List[Dict[str, Any]] = []
+	seen = set()
+	for row in rows:
+		key = (row["kind"], row["text"].lower())
+		if key in seen:
+			continue
+		seen.add(key)
+		suggestions.append({"type": row["kind"], "id": row["id"], "text": row["text"]})
+		if len(suggestions) >= limit:
+			break
+	return suggestions
+
+
+def suggest(tenant_id: int, prefix: str, limit: int = 10) -> List[Dict[str, Any]]:
+	"""Vorschläge aus Dokumenttiteln, Gremien- und Personennamen eines Mandanten.
+
+	Läuft gegen PostgreSQL statt gegen OpenSearch und wird je Mandant, Präfix und
+	Index-Generation in memcached gehalten (SUGGEST_CACHE_TTL).
+	"""
+	from .search_cache import generation
+
+	prefix = normalize(prefix)
+	if len(prefix) < MIN_CHARS:
+		return []
+	limit = min(max(limit, 1), MAX_LIMIT)
+	key = None
+	if settings.SUGGEST_CACHE_TTL > 0:
+		try:
+			digest = hashlib.sha1(f"{prefix.lower()}|{limit}".encode()).hexdigest()
+			key = f"suggest:{tenant_id}:{generation(tenant_id)}:{digest}"
+			cached = cache.get(key)
+			if cached is not None:
+				return cached
+		except Exception:
+			logger.debug("Suchcache nicht erreichbar", exc_info=True)
+			key = None
+	suggestions = query(tenant_id, prefix, limit)
+	if key is not None:
+		try:
+			cache.set(key, suggestions, timeout=settings.SUGGEST_CACHE_TTL)
+		except Exception:
+			logger.debug("Suchcache nicht erreichbar", exc_info=True)
+	return suggestions
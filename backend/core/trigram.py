@@ -0,0 +1,47 @@
+"""pg_trgm ist optional: ohne die Extension fehlen nur Trigramm-Indizes und Titel-Ähnlichkeit.
+
+Die Migrationen legen Extension und Indizes nur an, wenn der Server sie bereitstellt;
+die Datenbanksuche fragt `available()` und weicht sonst auf icontains aus.
+"""
+from __future__ import annotations
+
+from functools import lru_cache
+
+from django.db import connection
+
+CREATE_EXTENSION = """
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm') THEN
+        CREATE EXTENSION IF NOT EXISTS pg_trgm;
+    END IF;
+END
+$$;
+"""
+
+DROP_EXTENSION = "DROP EXTENSION IF EXISTS pg_trgm;"
+
+
+def index_sql(name: str, table: str, column: str) -> str:
+	"""GIN-Trigramm-Index, sofern gin_trgm_ops vorhanden ist (für Migrationen)."""
+	return f"""
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_opclass WHERE opcname = 'gin_trgm_ops') THEN
+        CREATE INDEX IF NOT EXISTS {name} ON {table} USING gin ({column} gin_trgm_ops);
+    END IF;
+END
+$$;
+"""
+
+
+def available() -> bool:
+	"""pg_trgm in der aktuellen Datenbank installiert; einmal je Prozess und Datenbank geprüft."""
+	return _installed(connection.alias, connection.settings_dict["NAME"])
+
+
+@lru_cache(maxsize=None)
+def _installed(alias: str, name: str) -> bool:
+	with connection.cursor() as cursor:
+		cursor.execute("SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm')")
+		return bool(cursor.fetchone()[0])
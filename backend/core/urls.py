@@ -7,6 +7,8 @@ from .views import (
 	AuthViewSet,
 	CommitteeViewSet,
 	DocumentViewSet,
+	IngestJobViewSet,
+	IngestViewSet,
 	ApiKeyViewSet,
 	LeadViewSet,
 	MeetingViewSet,
@@ -60,12 +62,14 @@ router.register(r"organizations", OrganizationViewSet)
 router.register(r"meetings", MeetingViewSet)
 router.register(r"agenda-items", AgendaItemViewSet)
 router.register(r"documents", DocumentViewSet)
+router.register(r"ingest", IngestViewSet, basename="ingest")
 router.register(r"leads", LeadViewSet, basename="lead")
 router.register(r"motions", MotionViewSet)
 router.register(r"share-links", ShareLinkViewSet)
 router.register(r"teams", TeamViewSet)
 router.register(r"team-memberships", TeamMembershipViewSet)
 router.register(r"oparl-sources", OParlSourceViewSet)
+router.register(r"ingest-jobs", IngestJobViewSet)
 router.register(r"role-assignments", RoleAssignmentViewSet)
 router.register(r"users", UserViewSet)
 router.register(r"memberships", MembershipViewSet, basename="memberships")
@@ -1,13 +1,18 @@
 import os
 from rest_framework import permissions, status, viewsets, serializers
 from django.contrib.auth import authenticate, login, logout, get_user_model
+from django.db import transaction
 from rest_framework.response import Response
 
 from rest_framework.decorators import action
+from rest_framework.parsers import JSONParser
+from .auth import IsIngestService
+from .ingest import NDJSONParser, bulk_upsert
 from .models import (
     AgendaItem,
     Committee,
     Document,
+    IngestJob,
     Lead,
     Meeting,
     Motion,
@@ -40,7 +45,10 @@ from .models import (
 from .serializers import (
 	AgendaItemSerializer,
 	CommitteeSerializer,
+	DocumentChunkSerializer,
+	DocumentListSerializer,
 	DocumentSerializer,
+	IngestJobSerializer,
 	LeadSerializer,
 	MeetingSerializer,
 	MotionSerializer,
@@ -136,6 +144,8 @@ class TenantViewSet(viewsets.ModelViewSet):
 class CommitteeViewSet(BaseTenantViewSet):
 	queryset = Committee.objects.all()
 	serializer_class = CommitteeSerializer
+	# Der Ingest-Service legt Gremien beim Auflösen einer Sitzung an (Service-Token)
+	permission_classes = [permissions.IsAuthenticatedOrReadOnly | IsIngestService]
 
 
 class AdminMfaRequired(permissions.BasePermission):
@@ -186,6 +196,32 @@ class AgendaItemViewSet(BaseTenantViewSet):
 class DocumentViewSet(BaseTenantViewSet):
 	queryset = Document.objects.all().select_related("agenda_item")
 	serializer_class = DocumentSerializer
+	# Listenartige Aktionen laden den Textkörper nie
+	list_actions = ("list", "search")
+
+	def get_queryset(self):
+		qs = super().get_queryset()
+		if self.action in self.list_actions:
+			qs = qs.defer("content_text")
+		return qs
+
+	def get_serializer_class(self):
+		if self.action in self.list_actions:
+			return DocumentListSerializer
+		return super().get_serializer_class()
+
+	def perform_create(self, serializer):
+		# Dokument, Abschnitte und Outbox-Eintrag (post_save) in einer Transaktion
+		with transaction.atomic():
+			serializer.save()
+
+	def perform_update(self, serializer):
+		with transaction.atomic():
+			serializer.save()
+
+	def perform_destroy(self, instance):
+		with transaction.atomic():
+			instance.delete()
 
 	def create(self, request, *args, **kwargs):
 		content_hash = request.data.get("content_hash")
@@ -197,31 +233,125 @@ class DocumentViewSet(BaseTenantViewSet):
 				return Response(ser.data, status=status.HTTP_200_OK)
 		return super().create(request, *args, **kwargs)
 
+	@action(detail=False, methods=["post"], url_path="known", permission_classes=[IsIngestService])
+	def known(self, request):
+		"""Abgleich vor dem Download: welche Dateien (OParl-ID) bzw. Inhalte (content_hash) gibt es schon?
+
+		Body: {"tenant": id, "oparl_ids": [...], "content_hashes": [...]}. Nur für den Ingest-Service,
+		da der Mandant aus dem Body kommt.
+		Liefert je bekannter OParl-ID die gespeicherten Validatoren (ETag/Last-Modified) für
+		Conditional Requests sowie die Teilmenge der bereits vorhandenen Hashes.
+		"""
+		from django.db.models.fields.json import KT
+		tenant_id = request.data.get("tenant")
+		oparl_ids = [str(x) for x in (request.data.get("oparl_ids") or [])][:5000]
+		hashes = [str(x) for x in (request.data.get("content_hashes") or [])][:5000]
+		if not tenant_id:
+			return Response({"detail": "tenant erforderlich"}, status=400)
+		qs = Document.objects.filter(tenant_id=tenant_id)
+		files = {}
+		if oparl_ids:
+			rows = (
+				qs.filter(oparl_id__in=oparl_ids)
+				.order_by("id")
+				.values("id", "oparl_id", "content_hash", etag=KT("raw__etag"), last_modified=KT("raw__last_modified"))
+			)
+			for row in rows:
+				files.setdefault(row["oparl_id"], {
+					"id": row["id"],
+					"content_hash": row["content_hash"],
+					"etag": row["etag"] or "",
+					"last_modified": row["last_modified"] or "",
+				})
+		known_hashes = []
+		if hashes:
+			known_hashes = list(qs.filter(content_hash__in=hashes).values_list("content_hash", flat=True).distinct())
+		return Response({"files": files, "content_hashes": known_hashes})
+
+	@action(detail=True, methods=["get"], url_path="chunks")
+	def chunks(self, request, pk=None):
+		"""Volltext in Abschnitten (für KI-Funktionen und Volltextanzeige); ?ordinal_from=&limit= zum Blättern."""
+		document = self.get_object()
+		qs = document.chunks.all()
+		ordinal_from = request.query_params.get("ordinal_from")
+		if ordinal_from:
+			qs = qs.filter(ordinal__gte=int(ordinal_from))
+		limit = min(int(request.query_params.get("limit", "50")), 500)
+		ser = DocumentChunkSerializer(qs[:limit], many=True)
+		return Response(ser.data)
+
 	@action(detail=False, methods=["get"], url_path="search")
 	def search(self, request):
-		"""Einfache Volltextsuche in content_text/title, mandantenscope via ?tenant=.
-		q: Query, optional: committee_id, date_from, date_to
+		"""Volltextsuche über das Suchbackend (settings.SEARCH_BACKEND), mandantenscope via ?tenant=.
+		q: Query, optional: committee_id, date_from, date_to, offset, limit,
+		mode=text (BM25, Standard) | semantic (kNN über Embeddings) | hybrid (beides, RRF),
+		category, document_type; facets=0 spart die Facetten (committee, category, document_type, year, month)
 		"""
-		q = request.query_params.get("q", "").strip()
-		qs = self.get_queryset()
-		committee_id = request.query_params.get("committee_id")
-		if committee_id:
-			qs = qs.filter(agenda_item__meeting__committee_id=committee_id)
-		date_from = request.query_params.get("date_from")
-		date_to = request.query_params.get("date_to")
-		if date_from:
-			qs = qs.filter(created_at__date__gte=date_from)
-		if date_to:
-			qs = qs.filter(created_at__date__lte=date_to)
-		if q:
-			from django.db.models import Q
-			qs = qs.filter(Q(title__icontains=q) | Q(content_text__icontains=q))
-		page = self.paginate_queryset(qs.order_by("-created_at"))
-		if page is not None:
-			ser = self.get_serializer(page, many=True)
-			return self.get_paginated_response(ser.data)
-		ser = self.get_serializer(qs[:50], many=True)
-		return Response(ser.data)
+		from .search_backends import SearchQuery, search_documents
+		result = search_documents(SearchQuery.from_params(request.query_params))
+		# Treffer in Rangfolge aus der DB laden; der Index kann Gelöschtes noch kurz enthalten
+		docs = {doc.pk: doc for doc in self.get_queryset().filter(pk__in=result.ids)}
+		rows = [docs[pk] for pk in result.ids if pk in docs]
+		ser = self.get_serializer(rows, many=True)
+		facets = result.facets
+		if facets.get("committee"):
+			# Namen gleich mitliefern, damit die Filterleiste keine Gremienliste nachladen muss
+			from .models import Committee
+			names = dict(Committee.objects.filter(pk__in=[b["value"] for b in facets["committee"]]).values_list("id", "name"))
+			facets = {**facets, "committee": [{**b, "label": names.get(b["value"], "")} for b in facets["committee"]]}
+		response = Response({"count": result.total, "results": ser.data, "facets": facets})
+		response["X-Search-Cache"] = "hit" if result.cached else "miss"
+		return response
+
+	@action(detail=False, methods=["get"], url_path="suggest")
+	def suggest(self, request):
+		"""Vorschläge beim Tippen: Dokumenttitel, Gremien, Personen eines Mandanten.
+		tenant (Pflicht), q (ab 3 Zeichen), optional: limit (max. 20)
+		"""
+		from .suggest import suggest
+		try:
+			tenant_id = int(request.query_params.get("tenant"))
+		except (TypeError, ValueError):
+			return Response({"detail": "tenant erforderlich"}, status=400)
+		try:
+			limit = int(request.query_params.get("limit") or 10)
+		except ValueError:
+			limit = 10
+		response = Response({"suggestions": suggest(tenant_id, request.query_params.get("q") or "", limit)})
+		# Wiederholte Präfixe (Löschen und erneut Tippen) beantwortet der Browser selbst
+		response["Cache-Control"] = "private, max-age=30"
+		return response
+
+
+class IngestViewSet(viewsets.ViewSet):
+	"""Bulk-Schreibschnittstelle für den Ingest-Service."""
+	# Schreibt in beliebige Mandanten (tenant aus dem Body): nur mit Service-Token
+	permission_classes = [IsIngestService]
+	parser_classes = [JSONParser, NDJSONParser]
+
+	@action(detail=False, methods=["post"], url_path="bulk")
+	def bulk(self, request):
+		"""Upsert gemischter OParl-Entitäten, keyed by (tenant, oparl_id).
+
+		Body: {"tenant": id, "items": [...]} oder JSON-Array/NDJSON mit ?tenant=.
+		Jedes Item: {"type": organization|committee|person|meeting|agenda_item|document, "oparl_id": ..., ...}
+		"""
+		data = request.data
+		tenant_id = request.query_params.get("tenant")
+		items = data
+		if isinstance(data, dict):
+			tenant_id = data.get("tenant", tenant_id)
+			items = data.get("items")
+		try:
+			tenant_id = int(tenant_id)
+		except (TypeError, ValueError):
+			return Response({"detail": "tenant erforderlich"}, status=400)
+		if not isinstance(items, list):
+			return Response({"detail": "items erforderlich"}, status=400)
+		if not Tenant.objects.filter(pk=tenant_id).exists():
+			return Response({"detail": "Tenant nicht gefunden"}, status=400)
+		result = bulk_upsert(tenant_id, items)
+		return Response(result)
 
 
 class MotionViewSet(BaseTenantViewSet):
@@ -251,16 +381,95 @@ class OParlSourceViewSet(BaseTenantViewSet):
 
 	@action(detail=True, methods=["post"], url_path="trigger")
 	def trigger(self, request, pk=None):
-		# call ingest service
-		try:
-			import httpx
-			source = self.get_object()
-			base = os.getenv("INGEST_BASE_URL", "http://ingest:8001")
-			with httpx.Client(timeout=30.0) as client:
-				r = client.post(f"{base}/oparl/ingest", params={"root": source.root_url, "tenant_id": source.tenant_id})
-				return Response(r.json(), status=r.status_code)
-		except Exception as e:
-			return Response({"error": str(e)}, status=500)
+		"""Startet einen Import-Job und liefert sofort dessen ID; Fortschritt unter /api/ingest-jobs/<id>/.
+
+		Ohne ?full=1 als Delta-Sync mit den gespeicherten Validatoren. Ein abgebrochener
+		(fehlgeschlagener oder verwaister) letzter Job wird ab seinem Checkpoint fortgesetzt.
+		"""
+		source = self.get_object()
+		full = request.query_params.get("full") in ("1", "true", "True")
+		job = source.jobs.first()
+		if job and job.is_active and not _is_stale(job):
+			return Response(IngestJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+		if not job or full or not (job.status == "failed" or job.is_active):
+			params = {}
+			if not full:
+				if source.etag:
+					params["etag"] = source.etag
+				if source.last_modified:
+					params["last_modified"] = source.last_modified
+				if source.last_synced_at:
+					params["modified_since"] = source.last_synced_at.isoformat()
+			job = IngestJob.objects.create(tenant=source.tenant, source=source, params=params)
+		job = _dispatch_ingest_job(job)
+		code = status.HTTP_202_ACCEPTED if job.status == "running" else status.HTTP_502_BAD_GATEWAY
+		return Response(IngestJobSerializer(job).data, status=code)
+
+
+def _is_stale(job):
+	"""Läuft ein Job angeblich noch, meldet aber keinen Fortschritt mehr (Crash des Ingest-Service)?"""
+	from django.utils import timezone
+	stale_after = int(os.getenv("INGEST_JOB_STALE_SECONDS", "600"))
+	return (timezone.now() - job.updated_at).total_seconds() > stale_after
+
+
+def _dispatch_ingest_job(job):
+	"""Übergibt einen Job (inkl. Checkpoint) an den Ingest-Service, der ihn im Hintergrund abarbeitet."""
+	import httpx
+	base = os.getenv("INGEST_BASE_URL", "http://ingest:8001")
+	payload = {
+		"job_id": job.id,
+		"root": job.source.root_url,
+		"tenant_id": job.tenant_id,
+		"cursor": job.cursor,
+		**job.params,
+	}
+	job.status = "running"
+	job.attempts += 1
+	job.error = ""
+	try:
+		with httpx.Client(timeout=10.0) as client:
+			r = client.post(f"{base}/oparl/jobs", json=payload)
+			r.raise_for_status()
+	except Exception as e:
+		job.status = "failed"
+		job.error = str(e)
+	job.save(update_fields=["status", "attempts", "error", "updated_at"])
+	return job
+
+
+class IngestJobViewSet(BaseTenantViewSet):
+	"""Status der Import-Jobs; der Ingest-Service meldet Fortschritt/Checkpoint per PATCH."""
+	queryset = IngestJob.objects.all().select_related("source")
+	serializer_class = IngestJobSerializer
+	http_method_names = ["get", "patch", "post", "head", "options"]
+
+	def get_permissions(self):
+		# Status und Checkpoint schreibt nur der Ingest-Service
+		if self.action in ("update", "partial_update"):
+			return [IsIngestService()]
+		return super().get_permissions()
+
+	def create(self, request, *args, **kwargs):
+		return Response({"detail": "Jobs entstehen über /api/oparl-sources/<id>/trigger/"}, status=405)
+
+	def perform_update(self, serializer):
+		from django.utils import timezone
+		job = serializer.save()
+		if job.status in ("succeeded", "failed") and job.finished_at is None:
+			job.finished_at = timezone.now()
+			job.save(update_fields=["finished_at"])
+			if job.status == "succeeded":
+				job.apply_result_to_source()
+
+	@action(detail=True, methods=["post"], url_path="resume")
+	def resume(self, request, pk=None):
+		job = self.get_object()
+		if job.status == "succeeded" or (job.is_active and not _is_stale(job)):
+			return Response({"detail": "Job läuft bereits oder ist abgeschlossen"}, status=409)
+		job = _dispatch_ingest_job(job)
+		code = status.HTTP_202_ACCEPTED if job.status == "running" else status.HTTP_502_BAD_GATEWAY
+		return Response(IngestJobSerializer(job).data, status=code)
 
 
 class LeadViewSet(viewsets.ModelViewSet):
@@ -18,6 +18,7 @@ INSTALLED_APPS = [
 	"django.contrib.sessions",
 	"django.contrib.messages",
 	"django.contrib.staticfiles",
+	"django.contrib.postgres",
 	"rest_framework",
 	"drf_spectacular",
 	"django_filters",
@@ -123,6 +124,28 @@ if os.getenv("S3_ENDPOINT_URL"):
 OPENSEARCH_HOST = os.getenv("OPENSEARCH_HOST", "opensearch")
 OPENSEARCH_PORT = int(os.getenv("OPENSEARCH_PORT", "9200"))
 
+# Suche: Backend der Dokumentsuche und Ausweich-Backend, falls es nicht erreichbar ist
+SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "core.search_backends.OpenSearchBackend")
+SEARCH_FALLBACK_BACKEND = os.getenv("SEARCH_FALLBACK_BACKEND", "core.search_backends.DatabaseSearchBackend")
+# Ergebniscache in memcached (Sekunden; 0 = aus); Frische über Index-Generationen je Mandant
+SEARCH_CACHE_TTL = int(os.getenv("SEARCH_CACHE_TTL", "300"))
+# Vorschläge (/documents/suggest/); Gremien und Personen erhöhen keine Generation, daher kurz
+SUGGEST_CACHE_TTL = int(os.getenv("SUGGEST_CACHE_TTL", "60"))
+
+# Embeddings für die semantische Suche (AI-Service, POST /embed); leer = nur BM25
+EMBEDDING_SERVICE_URL = os.getenv("EMBEDDING_SERVICE_URL", "http://ai:8002")
+EMBEDDING_DIMENSION = int(os.getenv("EMBEDDING_DIMENSION", "384"))
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+EMBEDDING_MAX_CHUNKS = int(os.getenv("EMBEDDING_MAX_CHUNKS", "16"))
+EMBEDDING_TIMEOUT = float(os.getenv("EMBEDDING_TIMEOUT", "60"))
+
+# Lokaler ANN-Index (core.ann) für Umgebungen ohne OpenSearch; ein Verzeichnis je Mandant
+ANN_INDEX_DIR = os.getenv("ANN_INDEX_DIR", str(BASE_DIR / "var" / "ann"))
+ANN_NPROBE = int(os.getenv("ANN_NPROBE", "8"))
+
+# Zugang des Ingest-Service (Authorization: Bearer …) für seine internen Endpunkte; leer = gesperrt
+INGEST_SERVICE_TOKEN = os.getenv("INGEST_SERVICE_TOKEN", "")
+
 # E-Mail
 EMAIL_BACKEND = os.getenv("EMAIL_BACKEND", "django.core.mail.backends.console.EmailBackend")
 DEFAULT_FROM_EMAIL = os.getenv("DEFAULT_FROM_EMAIL", "noreply@mandari.local")
@@ -0,0 +1,120 @@
+import pytest
+from django.test import override_settings
+from rest_framework.test import APIClient
+
+
+@pytest.fixture
+def client(settings):
+	settings.INGEST_SERVICE_TOKEN = "secret"
+	client = APIClient()
+	client.credentials(HTTP_AUTHORIZATION="Bearer secret")
+	return client
+
+
+@pytest.mark.django_db
+def test_bulk_ingest_requires_service_token(client, admin_user):
+	from core.models import Committee, Tenant
+	tenant = Tenant.objects.create(name="t", slug="t")
+	body = {"tenant": tenant.id, "items": [{"type": "committee", "oparl_id": "c1", "name": "Rat"}]}
+
+	anonymous = APIClient()
+	assert anonymous.post("/api/ingest/bulk/", body, format="json").status_code in (401, 403)
+	# Angemeldete Benutzer schreiben nicht in beliebige Mandanten
+	user = APIClient()
+	user.force_authenticate(user=admin_user)
+	assert user.post("/api/ingest/bulk/", body, format="json").status_code == 403
+	assert not Committee.objects.exists()
+
+	assert client.post("/api/ingest/bulk/", body, format="json").status_code == 200
+	assert Committee.objects.filter(tenant=tenant, oparl_id="c1").exists()
+
+
+@pytest.mark.django_db
+def test_bulk_ingest_upserts_by_oparl_id(client):
+	from core.models import Committee, Document, Meeting, Tenant
+	tenant = Tenant.objects.create(name="t", slug="t")
+
+	items = [
+		{"type": "meeting", "oparl_id": "m1", "committee": "c1", "start": "2025-01-01T18:00:00+01:00"},
+		{"type": "committee", "oparl_id": "c1", "name": "Rat"},
+		{"type": "document", "oparl_id": "f1", "title": "Vorlage", "content_hash": "h1"},
+		{"type": "meeting", "oparl_id": "m2", "committee": "unbekannt", "start": "2025-01-02T18:00:00+01:00"},
+	]
+	res = client.post("/api/ingest/bulk/", {"tenant": tenant.id, "items": items}, format="json")
+	assert res.status_code == 200
+	body = res.json()
+	assert [r["index"] for r in body["results"]] == [0, 1, 2]
+	assert [e["index"] for e in body["errors"]] == [3]
+	meeting = Meeting.objects.get(tenant=tenant, oparl_id="m1")
+	assert meeting.committee == Committee.objects.get(tenant=tenant, oparl_id="c1")
+
+	items[1]["name"] = "Stadtrat"
+	res = client.post("/api/ingest/bulk/", {"tenant": tenant.id, "items": items[:3]}, format="json")
+	assert res.status_code == 200
+	assert all(not r["created"] for r in res.json()["results"])
+	assert Committee.objects.get(tenant=tenant, oparl_id="c1").name == "Stadtrat"
+	assert Meeting.objects.filter(tenant=tenant).count() == 1
+	assert Document.objects.filter(tenant=tenant).count() == 1
+
+
+@pytest.mark.django_db
+@override_settings(SEARCH_BACKEND="core.search_backends.MemorySearchBackend")
+def test_bulk_ingest_stores_full_text_in_chunks(client):
+	from core.chunks import PREVIEW_CHARS, document_text
+	from core.outbox import drain
+	from core.search_backends import MemorySearchBackend
+	from core.models import Document, SearchOutbox, Tenant
+	MemorySearchBackend.documents.clear()
+	tenant = Tenant.objects.create(name="t", slug="t")
+
+	text = " ".join(f"wort{i}" for i in range(5000)) + " haushaltsende"
+	items = [{"type": "document", "oparl_id": "f1", "title": "Haushalt", "content_hash": "h1", "content_text": text}]
+	res = client.post("/api/ingest/bulk/", {"tenant": tenant.id, "items": items}, format="json")
+	assert res.status_code == 200
+	doc = Document.objects.get(tenant=tenant, oparl_id="f1")
+	assert len(doc.content_text) == PREVIEW_CHARS
+	assert doc.chunks.count() > 1
+	assert document_text(doc) == text
+	# Indexierung läuft asynchron über die Outbox
+	assert SearchOutbox.objects.filter(document_id=doc.id, action="index").exists()
+	assert drain()["indexed"] == 1
+	assert not SearchOutbox.objects.exists()
+
+	res = client.get(f"/api/documents/search/?tenant={tenant.id}&q=haushaltsende")
+	data = res.json()
+	assert data["count"] == 1
+	assert data["facets"]["committee"] == []
+	rows = data["results"]
+	assert [r["id"] for r in rows] == [doc.id]
+	assert "content_text" not in rows[0]
+
+
+@pytest.mark.django_db
+def test_bulk_ingest_reorders_agenda_items(client):
+	from core.models import AgendaItem, Tenant
+	tenant = Tenant.objects.create(name="t", slug="t")
+
+	def post(*items):
+		meeting = [
+			{"type": "committee", "oparl_id": "c1", "name": "Rat"},
+			{"type": "meeting", "oparl_id": "m1", "committee": "c1", "start": "2025-01-01T18:00:00+01:00"},
+		]
+		agenda = [{"type": "agenda_item", "oparl_id": oparl_id, "meeting": "m1", "position": pos, "title": oparl_id} for oparl_id, pos in items]
+		res = client.post("/api/ingest/bulk/", {"tenant": tenant.id, "items": meeting + agenda}, format="json")
+		assert res.status_code == 200
+		return res.json()
+
+	def positions():
+		return dict(AgendaItem.objects.filter(tenant=tenant).values_list("oparl_id", "position"))
+
+	post(("t1", 1), ("t2", 2), ("t3", 3))
+	# Tausch
+	post(("t1", 2), ("t2", 1))
+	assert positions() == {"t1": 2, "t2": 1, "t3": 3}
+	# Umnummeriert, mit neuem TOP auf einer belegten Position; t3 fehlt im Batch und rückt ans Ende
+	post(("t4", 1), ("t2", 2), ("t1", 3))
+	assert positions() == {"t4": 1, "t2": 2, "t1": 3, "t3": 4}
+	# Doppelte Position im Batch: nur der spätere TOP wird abgelehnt
+	body = post(("t5", 5), ("t6", 5))
+	assert [(e["oparl_id"], e["index"]) for e in body["errors"]] == [("t6", 3)]
+	assert positions()["t5"] == 5 and "t6" not in positions()
@@ -5,13 +5,13 @@ import pytest
 
 
 @pytest.mark.django_db
-def test_document_create_idempotent(admin_client, django_user_model):
+def test_document_create_idempotent(admin_user):
 	# create tenant
 	from core.models import Tenant
 	tenant = Tenant.objects.create(name="t", slug="t")
 
 	client = APIClient()
-	client.force_authenticate(user=admin_client.handler._force_user)
+	client.force_authenticate(user=admin_user)
 	data = {
 		"tenant": tenant.id,
 		"title": "Doc",
@@ -0,0 +1,150 @@
+import pytest
+from rest_framework.test import APIClient
+
+
+@pytest.fixture
+def tenant(db):
+	from core.models import Tenant
+	return Tenant.objects.create(name="t", slug="t")
+
+
+@pytest.fixture
+def service_client(settings):
+	settings.INGEST_SERVICE_TOKEN = "secret"
+	client = APIClient()
+	client.credentials(HTTP_AUTHORIZATION="Bearer secret")
+	return client
+
+
+@pytest.mark.django_db
+def test_known_requires_service_token(tenant, admin_user, service_client):
+	from core.models import Document
+	Document.objects.create(tenant=tenant, title="A", content_hash="h1", oparl_id="f1")
+	body = {"tenant": tenant.id, "oparl_ids": ["f1"], "content_hashes": ["h1"]}
+
+	anonymous = APIClient()
+	assert anonymous.post("/api/documents/known/", body, format="json").status_code in (401, 403)
+	wrong = APIClient()
+	wrong.credentials(HTTP_AUTHORIZATION="Bearer nope")
+	assert wrong.post("/api/documents/known/", body, format="json").status_code in (401, 403)
+	# Auch angemeldete Benutzer fragen keine fremden Mandanten ab
+	user = APIClient()
+	user.force_authenticate(user=admin_user)
+	assert user.post("/api/documents/known/", body, format="json").status_code == 403
+
+	res = service_client.post("/api/documents/known/", body, format="json")
+	assert res.status_code == 200
+	assert res.json()["content_hashes"] == ["h1"]
+	assert res.json()["files"]["f1"]["content_hash"] == "h1"
+
+
+@pytest.mark.django_db
+def test_ingest_service_creates_committees(tenant, service_client):
+	from core.models import Committee
+	body = {"tenant": tenant.id, "name": "Rat", "oparl_id": "https://oparl.example/organization/1"}
+	assert APIClient().post("/api/committees/", body, format="json").status_code in (401, 403)
+
+	res = service_client.post("/api/committees/", body, format="json")
+	assert res.status_code == 201
+	assert Committee.objects.get(pk=res.json()["id"]).oparl_id == body["oparl_id"]
+
+
+@pytest.fixture
+def source(tenant):
+	from core.models import OParlSource
+	return OParlSource.objects.create(tenant=tenant, root_url="https://oparl.example/system", etag='"v1"')
+
+
+class FakeIngestService:
+	"""Fängt die Übergabe an den Ingest-Service ab; `fail` simuliert einen nicht erreichbaren Service."""
+
+	def __init__(self):
+		self.calls = []
+		self.fail = False
+
+	def post(self, url, json=None, **kwargs):
+		import httpx
+		self.calls.append(json)
+		if self.fail:
+			raise httpx.ConnectError("down")
+		return httpx.Response(202, request=httpx.Request("POST", url))
+
+
+@pytest.fixture
+def dispatched(monkeypatch):
+	import httpx
+	fake = FakeIngestService()
+	monkeypatch.setattr(httpx.Client, "post", lambda client, url, **kwargs: fake.post(url, **kwargs))
+	return fake
+
+
+@pytest.mark.django_db
+def test_trigger_starts_and_reuses_job(tenant, source, admin_user, dispatched):
+	client = APIClient()
+	client.force_authenticate(user=admin_user)
+	res = client.post(f"/api/oparl-sources/{source.id}/trigger/")
+	assert res.status_code == 202
+	job = res.json()
+	assert job["status"] == "running"
+	assert dispatched.calls[0]["job_id"] == job["id"]
+	assert dispatched.calls[0]["etag"] == '"v1"'
+
+	# Läuft noch und meldet Fortschritt: kein zweiter Job, keine zweite Übergabe
+	again = client.post(f"/api/oparl-sources/{source.id}/trigger/")
+	assert again.status_code == 202
+	assert again.json()["id"] == job["id"]
+	assert len(dispatched.calls) == 1
+
+
+@pytest.mark.django_db
+def test_trigger_resumes_stale_job_from_checkpoint(tenant, source, admin_user, dispatched):
+	from datetime import timedelta
+	from django.utils import timezone
+	from core.models import IngestJob
+	from core.views import _is_stale
+
+	job = IngestJob.objects.create(tenant=tenant, source=source, status="running", cursor={"meetings": "page-3"}, attempts=1)
+	assert not _is_stale(job)
+	IngestJob.objects.filter(pk=job.pk).update(updated_at=timezone.now() - timedelta(hours=1))
+	job.refresh_from_db()
+	assert _is_stale(job)
+
+	client = APIClient()
+	client.force_authenticate(user=admin_user)
+	res = client.post(f"/api/oparl-sources/{source.id}/trigger/")
+	assert res.status_code == 202
+	assert res.json()["id"] == job.id
+	assert res.json()["attempts"] == 2
+	assert dispatched.calls[0]["cursor"] == {"meetings": "page-3"}
+
+
+@pytest.mark.django_db
+def test_trigger_reports_unreachable_service(source, admin_user, dispatched):
+	dispatched.fail = True
+	client = APIClient()
+	client.force_authenticate(user=admin_user)
+	res = client.post(f"/api/oparl-sources/{source.id}/trigger/")
+	assert res.status_code == 502
+	assert res.json()["status"] == "failed"
+	assert "down" in res.json()["error"]
+
+
+@pytest.mark.django_db
+def test_job_progress_only_from_ingest_service(tenant, source, admin_user, service_client):
+	from core.models import IngestJob
+	job = IngestJob.objects.create(tenant=tenant, source=source, status="running")
+	url = f"/api/ingest-jobs/{job.id}/"
+	done = {"status": "succeeded", "result": {"validators": {"etag": '"v2"', "last_modified": "Mon"}}}
+
+	user = APIClient()
+	user.force_authenticate(user=admin_user)
+	assert user.patch(url, done, format="json").status_code == 403
+	assert user.get(url).status_code == 200
+
+	res = service_client.patch(url, done, format="json")
+	assert res.status_code == 200
+	job.refresh_from_db()
+	source.refresh_from_db()
+	assert job.finished_at is not None
+	assert source.etag == '"v2"'
+	assert source.last_synced_at == job.created_at
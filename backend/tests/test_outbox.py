@@ -0,0 +1,60 @@
+from datetime import timedelta
+
+import pytest
+from django.test import override_settings
+from django.utils import timezone
+
+
+@pytest.fixture
+def document(db):
+	from core.models import Document, SearchOutbox, Tenant
+	tenant = Tenant.objects.create(name="t", slug="t")
+	doc = Document.objects.create(tenant=tenant, title="Haushalt", content_hash="h1")
+	SearchOutbox.objects.all().delete()
+	return doc
+
+
+@pytest.mark.django_db
+@override_settings(SEARCH_BACKEND="core.search_backends.MemorySearchBackend")
+def test_drain_reschedules_when_backend_fails(document, monkeypatch):
+	from core.outbox import drain, enqueue_documents
+	from core.models import SearchOutbox
+	from core.search_backends import MemorySearchBackend
+	enqueue_documents([document.pk])
+	leased = []
+
+	def index(self, docs, deleted=()):
+		# Während des Indexierens ist der Eintrag per Lease beansprucht, nicht fällig
+		leased.append(SearchOutbox.objects.get().available_at > timezone.now())
+		raise ConnectionError("Index nicht erreichbar")
+
+	monkeypatch.setattr(MemorySearchBackend, "index", index)
+	before = timezone.now()
+	assert drain() == {"indexed": 0, "deleted": 0, "failed": 1}
+	assert leased == [True]
+	row = SearchOutbox.objects.get()
+	assert row.attempts == 1
+	assert "nicht erreichbar" in row.last_error
+	assert before + timedelta(seconds=2) <= row.available_at <= timezone.now() + timedelta(seconds=2)
+	# Vor Ablauf des Backoffs nicht erneut
+	assert drain()["failed"] == 0
+
+
+@pytest.mark.django_db
+@override_settings(SEARCH_BACKEND="core.search_backends.MemorySearchBackend")
+def test_drain_keeps_changes_made_while_indexing(document, monkeypatch):
+	from core.outbox import drain, enqueue_documents
+	from core.models import SearchOutbox
+	from core.search_backends import MemorySearchBackend
+	enqueue_documents([document.pk])
+	original = MemorySearchBackend.index
+
+	def index(self, docs, deleted=()):
+		enqueue_documents([document.pk])
+		return original(self, docs, deleted)
+
+	monkeypatch.setattr(MemorySearchBackend, "index", index)
+	assert drain()["indexed"] == 1
+	# Die während des Indexierens entstandene Änderung bleibt für den nächsten Lauf
+	assert SearchOutbox.objects.count() == 1
+	assert SearchOutbox.objects.get().attempts == 0
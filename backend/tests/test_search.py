@@ -0,0 +1,322 @@
+import pytest
+from django.test import override_settings
+
+
+def test_fuse_prefers_documents_ranked_by_both_lists():
+	from core.search_backends import fuse
+	bm25 = [1, 2, 3]
+	knn = [4, 2, 5]
+	ranked = fuse([bm25, knn])
+	assert ranked[0] == 2
+	assert set(ranked) == {1, 2, 3, 4, 5}
+
+
+def test_search_query_mode_defaults_to_text():
+	from core.search_backends import SearchQuery
+	assert SearchQuery.from_params({"q": "x", "mode": "hybrid"}).mode == "hybrid"
+	assert SearchQuery.from_params({"q": "x", "mode": "unknown"}).mode == "text"
+
+
+def test_ann_index_updates_and_finds_nearest(settings, tmp_path):
+	from core.ann import AnnStore
+	settings.ANN_NPROBE = 2
+	store = AnnStore(tmp_path)
+	rows = [
+		{"id": i, "committee_id": i % 2, "created_at": "2024-05-01T10:00:00", "embedding": [float(i == j) for j in range(4)]}
+		for i in range(4)
+	]
+	assert store.update(1, rows) == 4
+	assert store.update(1, [], deleted=[3]) == 3
+	index = store.get(1)
+	assert [pk for pk, _ in index.search([0.0, 1.0, 0.1, 0.0], 1)] == [1]
+	assert [pk for pk, _ in index.search([0.0, 1.0, 0.1, 0.0], 1, committee_id=0)] == [2]
+	assert index.search([0.0, 0.0, 0.0, 1.0], 3, committee_id=1) == [(1, 0.0)]
+
+
+def test_ann_store_keeps_the_previous_build_for_readers(tmp_path, monkeypatch):
+	import os
+	from core.ann import AnnIndex, AnnStore
+	store = AnnStore(tmp_path)
+	row = {"id": 1, "committee_id": None, "created_at": None, "embedding": [1.0, 0.0]}
+	store.update(1, [row])
+	first = os.readlink(tmp_path / "1" / "current")
+	store.update(1, [{**row, "id": 2}])
+	second = os.readlink(tmp_path / "1" / "current")
+	# Ein Leser, der den Link vor dem Umbiegen aufgelöst hat, lädt den alten Stand noch
+	assert len(AnnIndex.load(tmp_path / "1" / first)) == 1
+	store.update(1, [{**row, "id": 3}])
+	assert not (tmp_path / "1" / first).exists()
+	assert (tmp_path / "1" / second).exists()
+
+	# Ist der aufgelöste Stand doch schon weg, liest `get` den Link erneut
+	links = iter([first])
+	readlink = os.readlink
+	monkeypatch.setattr(os, "readlink", lambda path: next(links, None) or readlink(path))
+	assert len(AnnStore(tmp_path).get(1)) == 3
+
+
+def test_count_facets_groups_payloads():
+	from core.search_backends import count_facets
+	docs = [
+		{"committee_id": 1, "category": "Antrag", "document_type": "pdf", "meeting_date": "2024-03-05T17:00:00+01:00"},
+		{"committee_id": 1, "category": "", "document_type": "pdf", "meeting_date": "2023-11-20T17:00:00+01:00"},
+		{"committee_id": 2, "category": "Antrag", "document_type": None, "meeting_date": None},
+	]
+	facets = count_facets(docs)
+	assert facets["committee"] == [{"value": 1, "count": 2}, {"value": 2, "count": 1}]
+	assert facets["category"] == [{"value": "Antrag", "count": 2}]
+	assert facets["document_type"] == [{"value": "pdf", "count": 2}]
+	assert [b["value"] for b in facets["year"]] == ["2024", "2023"]
+	assert facets["month"][0] == {"value": "2024-03", "count": 1}
+
+
+@override_settings(
+	CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}},
+	SEARCH_CACHE_TTL=60,
+)
+def test_search_cache_key_changes_with_tenant_generation():
+	from core import search_cache
+	from core.search_backends import SearchQuery, SearchResult
+	query = SearchQuery(q="Haushalt", tenant_id=1)
+	key = search_cache.cache_key(query)
+	assert search_cache.cache_key(SearchQuery(q="  haushalt ", tenant_id=1)) == key
+	assert search_cache.lookup(key) is None
+	search_cache.store(key, SearchResult(ids=[3], total=1), 0.05)
+	assert search_cache.lookup(key).cached
+	search_cache.invalidate_tenants([2])
+	assert search_cache.cache_key(query) == key
+	search_cache.invalidate_tenants([1])
+	assert search_cache.cache_key(query) != key
+	assert search_cache.stats()["hits"] == 1
+
+
+@pytest.mark.django_db
+@override_settings(SUGGEST_CACHE_TTL=0)
+def test_suggest_matches_word_starts_within_tenant(client):
+	from core.models import Committee, Document, Person, Tenant
+	tenant = Tenant.objects.create(name="t", slug="t")
+	other = Tenant.objects.create(name="o", slug="o")
+	Document.objects.create(tenant=tenant, title="Entwurf Haushaltssatzung 2025", content_hash="a")
+	Committee.objects.create(tenant=tenant, name="Haupt- und Finanzausschuss")
+	Person.objects.create(tenant=tenant, name="Hauke Meyer")
+	Document.objects.create(tenant=other, title="Haushalt anderer Mandant", content_hash="b")
+
+	res = client.get(f"/api/documents/suggest/?tenant={tenant.id}&q=hau")
+	assert res.status_code == 200
+	found = {(s["type"], s["text"]) for s in res.json()["suggestions"]}
+	assert found == {
+		("document", "Entwurf Haushaltssatzung 2025"),
+		("committee", "Haupt- und Finanzausschuss"),
+		("person", "Hauke Meyer"),
+	}
+	assert client.get(f"/api/documents/suggest/?tenant={tenant.id}&q=ha").json()["suggestions"] == []
+	assert client.get("/api/documents/suggest/?q=haus").status_code == 400
+
+
+@pytest.mark.django_db
+def test_database_backend_matches_title_body_and_chunks():
+	from core.models import Document, DocumentChunk, Tenant
+	from core.search_backends import DatabaseSearchBackend, SearchQuery
+	tenant = Tenant.objects.create(name="t", slug="t")
+	other = Tenant.objects.create(name="o", slug="o")
+	title = Document.objects.create(tenant=tenant, title="Radwegekonzept", content_hash="a")
+	body = Document.objects.create(tenant=tenant, title="Vorlage 12", content_text="Das Radwegekonzept wird beschlossen.", content_hash="b")
+	chunked = Document.objects.create(tenant=tenant, title="Protokoll", content_text="Eröffnung", content_hash="c")
+	# Treffer nur im Volltext-Abschnitt, nicht im Dokument selbst
+	DocumentChunk.objects.filter(document=chunked).delete()
+	DocumentChunk.objects.create(tenant=tenant, document=chunked, ordinal=0, text="Beratung zum Radwegekonzept", start=0, end=27)
+	Document.objects.create(tenant=tenant, title="Haushalt", content_text="Steuern", content_hash="d")
+	Document.objects.create(tenant=other, title="Radwegekonzept", content_hash="e")
+
+	backend = DatabaseSearchBackend()
+	result = backend.search(SearchQuery(q="Radwegekonzept", tenant_id=tenant.id, facets=False))
+	assert set(result.ids) == {title.id, body.id, chunked.id}
+	assert result.total == 3
+	# Filter gelten für alle Zweige
+	assert backend.search(SearchQuery(q="Radwegekonzept", tenant_id=other.id, facets=False)).total == 1
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("fuzzy", [True, False])
+def test_database_backend_matches_partial_titles_with_and_without_pg_trgm(fuzzy, monkeypatch):
+	from core import trigram
+	from core.models import Document, Tenant
+	from core.search_backends import DatabaseSearchBackend, SearchQuery
+	if fuzzy and not trigram.available():
+		pytest.skip("pg_trgm nicht installiert")
+	monkeypatch.setattr(trigram, "available", lambda: fuzzy)
+	tenant = Tenant.objects.create(name="t", slug="t")
+	title = Document.objects.create(tenant=tenant, title="Radwegekonzept", content_hash="a")
+	Document.objects.create(tenant=tenant, title="Haushalt", content_text="Steuern", content_hash="b")
+
+	result = DatabaseSearchBackend().search(SearchQuery(q="Radwegekonz", tenant_id=tenant.id, facets=False))
+	assert result.ids == [title.id]
+
+
+@pytest.mark.django_db
+def test_embeddings_are_reused_until_content_changes(settings, monkeypatch):
+	from core import embeddings
+	from core.models import Document, Tenant
+	from core.search import document_payload
+	settings.EMBEDDING_DIMENSION = 2
+	calls = []
+
+	def embed_texts(texts):
+		calls.append(list(texts))
+		return [[1.0, float(len(t))] for t in texts]
+
+	monkeypatch.setattr(embeddings, "embed_texts", embed_texts)
+	tenant = Tenant.objects.create(name="t", slug="t")
+	doc = Document.objects.create(tenant=tenant, title="Haushalt", content_text="Entwurf", content_hash="h")
+
+	first = embeddings.attach_embeddings([document_payload(doc)])[0]["embedding"]
+	assert calls == [["Haushalt", "Entwurf"]]
+	doc.refresh_from_db()
+	assert doc.embedding == first
+
+	# Neuaufbau (reindex_documents, ann_index) ohne Änderung: kein Aufruf des AI-Service
+	assert embeddings.attach_embeddings([document_payload(doc)])[0]["embedding"] == first
+	assert len(calls) == 1
+
+	doc.title = "Haushaltsplan"
+	doc.save()
+	embeddings.attach_embeddings([document_payload(doc)])
+	assert calls[-1] == ["Haushaltsplan", "Entwurf"]
+
+
+@pytest.mark.django_db
+def test_bulk_index_without_ai_service_indexes_for_bm25(settings, monkeypatch):
+	from opensearchpy import helpers
+	from core.models import Document, Tenant
+	from core.search import bulk_index, document_payload
+	# Nichts lauscht auf Port 9: /embed ist nicht erreichbar
+	settings.EMBEDDING_SERVICE_URL = "http://127.0.0.1:9"
+	sent = []
+
+	def bulk(client, actions, **kwargs):
+		sent.extend(actions)
+		return len(actions), []
+
+	monkeypatch.setattr(helpers, "bulk", bulk)
+	tenant = Tenant.objects.create(name="t", slug="t")
+	doc = Document.objects.create(tenant=tenant, title="Haushalt", content_text="Entwurf", content_hash="h")
+
+	assert bulk_index([document_payload(doc)], client=object()) == {}
+	assert [action["_id"] for action in sent] == [doc.id]
+	assert "embedding" not in sent[0]["_source"]
+
+
+class FakeIndices:
+	"""Nur die Index-/Alias-Aufrufe, die reindex_documents braucht."""
+
+	def __init__(self, aliases):
+		self.aliases = dict(aliases)
+		self.created = []
+		self.deleted = []
+		self.calls = []
+
+	def create(self, index, body):
+		self.created.append(index)
+
+	def delete(self, index, ignore=None):
+		self.deleted.append(index)
+
+	def put_settings(self, index, body):
+		self.calls.append(("put_settings", index))
+
+	def refresh(self, index):
+		self.calls.append(("refresh", index))
+
+	def exists_alias(self, name):
+		return name in self.aliases.values()
+
+	def get_alias(self, name):
+		return {index: {} for index, alias in self.aliases.items() if alias == name}
+
+	def exists(self, index):
+		return index in self.aliases
+
+	def update_aliases(self, body):
+		self.calls.append(("update_aliases", body["actions"]))
+
+
+@pytest.mark.django_db(transaction=True)
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+def test_reindex_documents_loads_slices_in_parallel_and_swaps_the_alias(monkeypatch):
+	import threading
+	from django.core.management import call_command
+	from core import search
+	from core.models import Document, Tenant
+	tenant = Tenant.objects.create(name="t", slug="t")
+	ids = [Document.objects.create(tenant=tenant, title=f"Vorlage {n}", content_hash=str(n)).id for n in range(10)]
+	alias = search.index_name()
+	indices = FakeIndices({f"{alias}-alt": alias})
+	loaded = []
+	threads = set()
+
+	def bulk_index(docs, client=None, index=None):
+		threads.add(threading.current_thread().name)
+		loaded.append((index, [doc["id"] for doc in docs]))
+		return {}
+
+	monkeypatch.setattr(search, "get_client", lambda: type("Client", (), {"indices": indices})())
+	monkeypatch.setattr(search, "put_template", lambda client: None)
+	monkeypatch.setattr(search, "bulk_index", bulk_index)
+
+	call_command("reindex_documents", threads=3, batch_size=2)
+
+	target, = indices.created
+	assert target.startswith(search.versioned_index())
+	# Jeder Datensatz genau einmal, in Stapeln von höchstens zwei, aus drei Bereichen
+	first_pass = [batch for index, batch in loaded if index == target]
+	assert sorted(pk for batch in first_pass for pk in batch) == ids
+	assert max(len(batch) for batch in first_pass) == 2
+	assert len(threads) >= 2
+	# Alter Index raus, neuer als Schreibindex rein, danach gelöscht
+	(_, actions), = [call for call in indices.calls if call[0] == "update_aliases"]
+	assert actions == [
+		{"remove": {"index": f"{alias}-alt", "alias": alias}},
+		{"add": {"index": target, "alias": alias, "is_write_index": True}},
+	]
+	assert indices.deleted == [f"{alias}-alt"]
+
+
+@pytest.mark.django_db(transaction=True)
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+def test_reindex_documents_drops_the_partial_index_on_failure(monkeypatch):
+	from django.core.management import call_command
+	from django.core.management.base import CommandError
+	from core import search
+	from core.models import Document, Tenant
+	tenant = Tenant.objects.create(name="t", slug="t")
+	Document.objects.create(tenant=tenant, title="Vorlage", content_hash="a")
+	indices = FakeIndices({})
+
+	def bulk_index(docs, client=None, index=None):
+		raise ConnectionError("OpenSearch weg")
+
+	monkeypatch.setattr(search, "get_client", lambda: type("Client", (), {"indices": indices})())
+	monkeypatch.setattr(search, "put_template", lambda client: None)
+	monkeypatch.setattr(search, "bulk_index", bulk_index)
+
+	with pytest.raises(CommandError):
+		call_command("reindex_documents", threads=2)
+	assert indices.deleted == indices.created
+	assert not [call for call in indices.calls if call[0] == "update_aliases"]
+
+
+@pytest.mark.django_db
+def test_database_backend_ranks_stemmed_matches_and_follows_bulk_updates():
+	from core.models import Document, Tenant
+	from core.search_backends import DatabaseSearchBackend, SearchQuery
+	tenant = Tenant.objects.create(name="t", slug="t")
+	body = Document.objects.create(tenant=tenant, title="Vorlage 7", content_text="Die Haushalte der Ortsteile werden beraten.", content_hash="a")
+	title = Document.objects.create(tenant=tenant, title="Haushalt 2025", content_text="Entwurf", content_hash="b")
+	later = Document.objects.create(tenant=tenant, title="Vorlage 8", content_text="Steuern", content_hash="c")
+
+	backend = DatabaseSearchBackend()
+	# German-Stemming: "Haushalt" findet "Haushalte"; Titel (Gewicht A) vor Text (B)
+	assert backend.search(SearchQuery(q="Haushalt", tenant_id=tenant.id, facets=False)).ids == [title.id, body.id]
+	# Der Trigger pflegt search_vector auch bei queryset.update()
+	Document.objects.filter(id=later.id).update(content_text="Haushalt Nord")
+	assert set(backend.search(SearchQuery(q="Haushalt", tenant_id=tenant.id, facets=False)).ids) == {title.id, body.id, later.id}
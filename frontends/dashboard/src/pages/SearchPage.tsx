@@ -1,30 +1,77 @@
 import React from 'react'
 import { api } from '../lib/api'
+import { useTenantStore } from '../stores/tenant'
 
 type Doc = { id: number; title: string; created_at: string }
+type Suggestion = { type: 'document' | 'committee' | 'person'; id: number; text: string }
+
+const SUGGEST_MIN_CHARS = 3
+const SUGGEST_DELAY_MS = 120
 
 export function SearchPage() {
+  const tenantId = useTenantStore((s: { tenantId: number | null }) => s.tenantId)
   const [q, setQ] = React.useState('')
   const [items, setItems] = React.useState<Doc[]>([])
+  const [suggestions, setSuggestions] = React.useState<Suggestion[]>([])
   const [loading, setLoading] = React.useState(false)
 
-  async function runSearch(e?: React.FormEvent) {
+  // Vorschläge statt Volltextsuche je Tastendruck; veraltete Anfragen werden abgebrochen
+  React.useEffect(() => {
+    if (!tenantId || q.trim().length < SUGGEST_MIN_CHARS) {
+      setSuggestions([])
+      return
+    }
+    const controller = new AbortController()
+    const timer = window.setTimeout(async () => {
+      try {
+        const data = await api(`/documents/suggest/?tenant=${tenantId}&q=${encodeURIComponent(q)}`, { signal: controller.signal })
+        setSuggestions(data.suggestions ?? [])
+      } catch {
+        // abgebrochen oder fehlgeschlagen: keine Vorschläge
+      }
+    }, SUGGEST_DELAY_MS)
+    return () => {
+      window.clearTimeout(timer)
+      controller.abort()
+    }
+  }, [q, tenantId])
+
+  async function runSearch(e?: React.FormEvent, query: string = q) {
     e?.preventDefault()
+    setSuggestions([])
     setLoading(true)
     try {
-      const data = await api(`/documents/search?q=${encodeURIComponent(q)}`)
+      const tenant = tenantId ? `&tenant=${tenantId}` : ''
+      const data = await api(`/documents/search?q=${encodeURIComponent(query)}${tenant}`)
       setItems(data.results ?? data)
     } finally {
       setLoading(false)
     }
   }
 
+  function pick(s: Suggestion) {
+    setQ(s.text)
+    runSearch(undefined, s.text)
+  }
+
   return (
     <div>
       <h1 className="text-xl font-semibold mb-4">Suche</h1>
-      <form onSubmit={runSearch} className="flex items-center gap-2 mb-4">
+      <form onSubmit={runSearch} className="relative flex items-center gap-2 mb-4">
         <input className="flex-1 rounded bg-slate-800 border border-slate-700 px-3 py-2" placeholder="Suchbegriff" value={q} onChange={e => setQ(e.target.value)} />
         <button className="px-4 py-2 rounded bg-brand text-white disabled:opacity-60" disabled={loading}>Suchen</button>
+        {suggestions.length > 0 && (
+          <ul className="absolute left-0 right-24 top-full mt-1 z-10 rounded border border-slate-700 bg-slate-900 shadow">
+            {suggestions.map(s => (
+              <li key={`${s.type}-${s.id}`}>
+                <button type="button" className="w-full text-left px-3 py-2 hover:bg-slate-800" onClick={() => pick(s)}>
+                  <span>{s.text}</span>
+                  <span className="ml-2 text-xs text-slate-400">{s.type === 'document' ? 'Dokument' : s.type === 'committee' ? 'Gremium' : 'Person'}</span>
+                </button>
+              </li>
+            ))}
+          </ul>
+        )}
       </form>
       <ul className="space-y-2">
         {items.map(d => (
@@ -37,5 +84,3 @@ export function SearchPage() {
     </div>
   )
 }
-
-
@@ -1,10 +1,12 @@
 from __future__ import annotations
 
+import os
 import re
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
 
 from fastapi import FastAPI
-from pydantic import BaseModel
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel, Field
 from transformers import pipeline
 
 app = FastAPI(title="Mandari AI Service")
@@ -15,8 +17,40 @@ class SummaryRequest(BaseModel):
 	max_words: int = 120
 
 
+class EmbedRequest(BaseModel):
+	texts: List[str] = Field(default_factory=list, max_length=512)
+
+
 _summarizer = pipeline("summarization", model="facebook/bart-large-cnn")
 
+# Mehrsprachiges Modell (deutsche Ratsdokumente); Dimension muss zum Such-Mapping passen
+EMBEDDING_MODEL = os.getenv("AI_EMBEDDING_MODEL", "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2")
+EMBEDDING_BATCH_SIZE = int(os.getenv("AI_EMBEDDING_BATCH_SIZE", "32"))
+_encoder: Optional[Any] = None
+
+
+def get_encoder() -> Any:
+	global _encoder
+	if _encoder is None:
+		import torch
+		from sentence_transformers import SentenceTransformer
+
+		torch.set_num_threads(int(os.getenv("AI_TORCH_THREADS", str(os.cpu_count() or 1))))
+		_encoder = SentenceTransformer(EMBEDDING_MODEL, device="cpu")
+	return _encoder
+
+
+def encode(texts: List[str]) -> List[List[float]]:
+	"""Batchweise auf der CPU; normalisiert, damit Kosinus- und Skalarprodukt übereinstimmen."""
+	vectors = get_encoder().encode(
+		texts,
+		batch_size=EMBEDDING_BATCH_SIZE,
+		normalize_embeddings=True,
+		convert_to_numpy=True,
+		show_progress_bar=False,
+	)
+	return vectors.astype("float32").round(6).tolist()
+
 
 def anonymize(text: str) -> str:
 	patterns = [
@@ -41,3 +75,15 @@ async def summary(req: SummaryRequest) -> Dict[str, Any]:
 	result = _summarizer(text, max_length=min(512, req.max_words * 3), min_length=30, do_sample=False)
 	return {"summary": result[0]["summary_text"][:max_char]}
 
+
+@app.post("/embed")
+async def embed(req: EmbedRequest) -> Dict[str, Any]:
+	"""Embeddings für eine Liste von Texten (z. B. die Abschnitte eines Dokuments)."""
+	if not req.texts:
+		# Kein Grund, dafür das Modell zu laden
+		dimension = _encoder.get_sentence_embedding_dimension() if _encoder is not None else None
+		return {"model": EMBEDDING_MODEL, "dimension": dimension, "vectors": []}
+	# Rechnen im Threadpool, damit die Event-Loop (Health, Summary) nicht blockiert
+	vectors = await run_in_threadpool(encode, req.texts)
+	dimension = get_encoder().get_sentence_embedding_dimension()
+	return {"model": EMBEDDING_MODEL, "dimension": dimension, "vectors": vectors}
@@ -0,0 +1,218 @@
+from __future__ import annotations
+
+import asyncio
+import os
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+from urllib.parse import urlsplit
+
+from .client import get_client
+from .crawl import Crawler
+
+
+def backend_base_url() -> str:
+	return os.getenv("BACKEND_BASE_URL", "http://backend:8000/api")
+
+
+def backend_headers() -> Dict[str, str]:
+	"""Service-Zugang für die internen Backend-Endpunkte (INGEST_SERVICE_TOKEN)."""
+	token = os.getenv("INGEST_SERVICE_TOKEN", "")
+	return {"Authorization": f"Bearer {token}"} if token else {}
+
+
+# Typ -> Listen-Endpunkt im Backend
+LIST_ENDPOINTS = {
+	"organization": "organizations",
+	"committee": "committees",
+	"person": "persons",
+}
+
+
+def backend_rates() -> Dict[str, float]:
+	"""Host-Raten für den Crawler: das eigene Backend wird nicht per Token-Bucket gedrosselt."""
+	return {urlsplit(backend_base_url()).netloc: 0}
+
+
+class IdMap:
+	"""Backend-IDs je Typ für einen Lauf, nach OParl-ID und ersatzweise nach Name.
+
+	Wird einmal pro Lauf aus dem Backend befüllt (`prime`) und bei jedem Anlegen
+	aktualisiert, sodass Auflösungen danach reine Dictionary-Zugriffe sind.
+	"""
+
+	def __init__(self) -> None:
+		self._by_oparl_id: Dict[Tuple[str, str], int] = {}
+		self._by_name: Dict[Tuple[str, str], int] = {}
+		self._locks: Dict[Tuple[str, str], asyncio.Lock] = {}
+
+	def get(self, entity: str, oparl_id: str = "", name: str = "") -> Optional[int]:
+		if oparl_id and (entity, oparl_id) in self._by_oparl_id:
+			return self._by_oparl_id[(entity, oparl_id)]
+		if name:
+			return self._by_name.get((entity, name))
+		return None
+
+	def put(self, entity: str, pk: int, oparl_id: str = "", name: str = "") -> None:
+		if oparl_id:
+			self._by_oparl_id[(entity, oparl_id)] = pk
+		if name:
+			self._by_name.setdefault((entity, name), pk)
+
+	async def prime(self, tenant_id: int, crawler: Crawler, base: Optional[str] = None, entities: Optional[List[str]] = None) -> None:
+		base = base or backend_base_url()
+		for entity in entities or list(LIST_ENDPOINTS):
+			url = f"{base}/{LIST_ENDPOINTS[entity]}/"
+			async with crawler.slot(url):
+				r = await get_client().get(url, params={"tenant": tenant_id})
+				r.raise_for_status()
+			data = r.json()
+			for row in data.get("results", []) if isinstance(data, dict) else data:
+				self.put(entity, row["id"], row.get("oparl_id", ""), row.get("name", ""))
+
+	async def resolve(self, entity: str, oparl_id: str, name: str, create: Callable[[], Awaitable[int]]) -> int:
+		"""ID aus dem Cache oder per `create` anlegen; parallele Aufrufe für denselben Schlüssel legen nur einmal an."""
+		pk = self.get(entity, oparl_id, name)
+		if pk is not None:
+			return pk
+		lock = self._locks.setdefault((entity, oparl_id or name), asyncio.Lock())
+		async with lock:
+			pk = self.get(entity, oparl_id, name)
+			if pk is None:
+				pk = await create()
+				self.put(entity, pk, oparl_id, name)
+			return pk
+
+
+class BackendWriter:
+	"""Sammelt Entitäten und schreibt sie gebündelt über /api/ingest/bulk/.
+
+	`add` puffert, ab `batch_size` Elementen wird automatisch geschrieben; am Ende
+	des Laufs muss `flush` aufgerufen werden. Die Backend-Antwort wird in `changes`
+	(je Typ angelegt/aktualisiert) und `errors` gesammelt. Batches werden in der
+	Reihenfolge geschrieben, in der sie entstanden sind, damit Eltern (Sitzung) immer
+	vor ihren Kindern (TOP, Dokument) im Backend liegen.
+	"""
+
+	def __init__(
+		self,
+		tenant_id: int,
+		crawler: Crawler,
+		base: Optional[str] = None,
+		batch_size: Optional[int] = None,
+		ids: Optional[IdMap] = None,
+	):
+		self.tenant_id = tenant_id
+		self.crawler = crawler
+		self.ids = ids
+		self.base = base or backend_base_url()
+		self.batch_size = batch_size or int(os.getenv("INGEST_BULK_BATCH_SIZE", "200"))
+		self.changes: Dict[str, int] = {}
+		self.errors: List[Dict[str, Any]] = []
+		self._buffer: List[Dict[str, Any]] = []
+		self._lock = asyncio.Lock()
+
+	async def add(self, entity: str, item: Dict[str, Any]) -> None:
+		self._buffer.append({"type": entity, **item})
+		if len(self._buffer) >= self.batch_size:
+			await self.flush()
+
+	async def flush(self) -> List[Dict[str, Any]]:
+		"""Schreibt den Puffer; schlägt das fehl, kommen die Items zurück in den Puffer.
+
+		Kehrt `flush` ohne Fehler zurück, ist alles, was vor dem Aufruf gepuffert war,
+		im Backend – auch Items aus zuvor gescheiterten Batches.
+		"""
+		# asyncio.Lock ist FIFO: Batches gehen in Entstehungsreihenfolge raus. Getauscht wird
+		# erst mit dem Lock, damit ein laufender, gescheiterter Batch schon zurückgelegt ist.
+		async with self._lock:
+			items, self._buffer = self._buffer, []
+			try:
+				return await self._post(items)
+			except BaseException:
+				# Vor die inzwischen gepufferten Items, damit Eltern vor Kindern bleiben
+				self._buffer[:0] = items
+				raise
+
+	async def write(self, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+		"""Schreibt die übergebenen Items (mit `type`) als einen Bulk-Request."""
+		async with self._lock:
+			return await self._post(items)
+
+	async def _post(self, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+		if not items:
+			return []
+		url = f"{self.base}/ingest/bulk/"
+		async with self.crawler.slot(url):
+			r = await get_client().post(url, json={"tenant": self.tenant_id, "items": items}, headers=backend_headers())
+			r.raise_for_status()
+		data = r.json()
+		for entity, counts in data.get("counts", {}).items():
+			self.changes[entity] = self.changes.get(entity, 0) + counts.get("created", 0) + counts.get("updated", 0)
+		self.errors.extend(data.get("errors", []))
+		results = data.get("results", [])
+		if self.ids is not None:
+			for res in results:
+				item = items[res["index"]]
+				self.ids.put(res["type"], res["id"], res.get("oparl_id", ""), item.get("name", ""))
+		return results
+
+	async def create(self, entity: str, item: Dict[str, Any]) -> int:
+		"""Legt ein einzelnes Objekt sofort an (z. B. Eltern, deren ID direkt gebraucht wird)."""
+		url = f"{self.base}/{LIST_ENDPOINTS[entity]}/"
+		async with self.crawler.slot(url):
+			r = await get_client().post(url, json={"tenant": self.tenant_id, **item}, headers=backend_headers())
+			r.raise_for_status()
+		self.changes[entity] = self.changes.get(entity, 0) + 1
+		return r.json()["id"]
+
+
+class KnownFiles:
+	"""Bereits bekannte Dateien eines Mandanten, um Downloads und Parsing zu sparen.
+
+	`lookup` fragt das Backend gebündelt (z. B. je Sitzung) nach OParl-IDs und
+	Prüfsummen; Ergebnisse und alle in diesem Lauf verarbeiteten Hashes bleiben
+	lokal, sodass jede Datei höchstens einmal nachgefragt wird.
+	"""
+
+	def __init__(self, tenant_id: int, crawler: Crawler, base: Optional[str] = None):
+		self.tenant_id = tenant_id
+		self.crawler = crawler
+		self.base = base or backend_base_url()
+		self.hashes: Set[str] = set()
+		self.files: Dict[str, Dict[str, Any]] = {}
+		self._asked: Set[str] = set()
+
+	async def lookup(self, oparl_ids: Iterable[str], hashes: Iterable[str] = ()) -> None:
+		oparl_ids = [o for o in oparl_ids if o and o not in self._asked]
+		hashes = [h for h in hashes if h and h not in self.hashes and h not in self._asked]
+		if not oparl_ids and not hashes:
+			return
+		url = f"{self.base}/documents/known/"
+		async with self.crawler.slot(url):
+			r = await get_client().post(
+				url,
+				json={"tenant": self.tenant_id, "oparl_ids": oparl_ids, "content_hashes": hashes},
+				headers=backend_headers(),
+			)
+			r.raise_for_status()
+		data = r.json()
+		self._asked.update(oparl_ids)
+		self._asked.update(hashes)
+		self.files.update(data.get("files", {}))
+		self.hashes.update(data.get("content_hashes", []))
+		self.hashes.update(f["content_hash"] for f in data.get("files", {}).values() if f.get("content_hash"))
+
+	def is_known(self, oparl_id: str, checksum: str = "") -> bool:
+		"""Unveränderte Datei laut Prüfsumme aus dem OParl-File-Objekt (sha256Checksum)."""
+		if not checksum:
+			return False
+		known = self.files.get(oparl_id)
+		return checksum in self.hashes or (known is not None and known.get("content_hash") == checksum)
+
+	def conditional_headers(self, oparl_id: str) -> Dict[str, str]:
+		known = self.files.get(oparl_id) or {}
+		headers = {}
+		if known.get("etag"):
+			headers["If-None-Match"] = known["etag"]
+		if known.get("last_modified"):
+			headers["If-Modified-Since"] = known["last_modified"]
+		return headers
@@ -0,0 +1,40 @@
+from __future__ import annotations
+
+import os
+from typing import Optional
+
+import httpx
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+def create_client() -> httpx.AsyncClient:
+	"""Langlebiger Client mit Keep-Alive-Pool; HTTP/2 wird per ALPN ausgehandelt, wo die Quelle es kann."""
+	timeout = float(os.getenv("INGEST_HTTP_TIMEOUT", "30"))
+	return httpx.AsyncClient(
+		http2=os.getenv("INGEST_HTTP2", "True") == "True",
+		limits=httpx.Limits(
+			max_connections=int(os.getenv("INGEST_HTTP_MAX_CONNECTIONS", "64")),
+			max_keepalive_connections=int(os.getenv("INGEST_HTTP_MAX_KEEPALIVE", "32")),
+			keepalive_expiry=float(os.getenv("INGEST_HTTP_KEEPALIVE_EXPIRY", "30")),
+		),
+		timeout=httpx.Timeout(
+			timeout,
+			connect=float(os.getenv("INGEST_HTTP_CONNECT_TIMEOUT", "10")),
+		),
+	)
+
+
+async def close_client() -> None:
+	global _client
+	if _client is not None:
+		await _client.aclose()
+		_client = None
+
+
+def get_client() -> httpx.AsyncClient:
+	"""Gemeinsamer Client der App; außerhalb des Lifespans (z. B. in Skripten) wird er lazy erzeugt."""
+	global _client
+	if _client is None:
+		_client = create_client()
+	return _client
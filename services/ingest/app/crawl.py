@@ -0,0 +1,292 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import random
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple, TypeVar
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+import httpx
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+def default_concurrency() -> int:
+	return int(os.getenv("INGEST_CONCURRENCY", "16"))
+
+
+def default_per_host_concurrency() -> int:
+	return int(os.getenv("INGEST_PER_HOST_CONCURRENCY", "4"))
+
+
+def default_host_rate() -> float:
+	return float(os.getenv("INGEST_HOST_RATE", "10"))
+
+
+def default_max_retries() -> int:
+	return int(os.getenv("INGEST_MAX_RETRIES", "5"))
+
+
+# Antworten, nach denen ein erneuter Versuch sinnvoll ist (Drosselung, Überlast)
+RETRY_STATUS = {429, 502, 503, 504}
+
+
+class RetryableStatus(Exception):
+	def __init__(self, status: int, retry_after: Optional[float] = None):
+		super().__init__(f"HTTP {status}")
+		self.status = status
+		self.retry_after = retry_after
+
+
+def retry_after_seconds(value: Optional[str]) -> Optional[float]:
+	"""Retry-After als Sekunden; der Header darf Sekunden oder ein HTTP-Datum enthalten."""
+	if not value:
+		return None
+	try:
+		return max(float(value), 0.0)
+	except ValueError:
+		pass
+	try:
+		return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+	except (TypeError, ValueError):
+		return None
+
+
+def check_status(response: httpx.Response) -> httpx.Response:
+	"""Wirft RetryableStatus für 429/5xx, sonst wie `raise_for_status` (304 gilt als Erfolg)."""
+	if response.status_code in RETRY_STATUS:
+		raise RetryableStatus(response.status_code, retry_after_seconds(response.headers.get("Retry-After")))
+	if response.status_code != 304:
+		response.raise_for_status()
+	return response
+
+
+def backoff_delay(attempt: int, base: float = 0.5, cap: float = 60.0) -> float:
+	"""Exponentielles Backoff mit Full Jitter."""
+	return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class HostLimiter:
+	"""Token-Bucket plus adaptives Nebenläufigkeitslimit (AIMD) für einen Host.
+
+	Das Limit wächst pro erfolgreicher Antwort um 1/limit (≈ +1 je Runde) und halbiert
+	sich bei Fehlern, Drosselung oder Latenz über `target_latency` – höchstens einmal
+	je Latenzfenster, damit parallel scheiternde Anfragen es nicht auf 1 drücken.
+	Retry-After pausiert den Host insgesamt.
+	"""
+
+	def __init__(self, rate: float, max_concurrency: int, target_latency: Optional[float] = None):
+		self.rate = rate
+		self.burst = max(rate, 1.0)
+		self.tokens = self.burst
+		self.max_concurrency = max_concurrency
+		self.limit = float(min(2, max_concurrency))
+		self.target_latency = target_latency or float(os.getenv("INGEST_TARGET_LATENCY", "2.0"))
+		self.latency = 0.0
+		self.in_flight = 0
+		self.paused_until = 0.0
+		self._updated = time.monotonic()
+		self._last_decrease = 0.0
+		self._cond = asyncio.Condition()
+
+	async def acquire(self) -> None:
+		async with self._cond:
+			await self._cond.wait_for(lambda: self.in_flight < int(self.limit))
+			self.in_flight += 1
+		await self._take_token()
+
+	async def _take_token(self) -> None:
+		while True:
+			now = time.monotonic()
+			if now < self.paused_until:
+				await asyncio.sleep(self.paused_until - now)
+				continue
+			if self.rate <= 0:
+				return
+			self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+			self._updated = now
+			if self.tokens >= 1:
+				self.tokens -= 1
+				return
+			await asyncio.sleep((1 - self.tokens) / self.rate)
+
+	async def release(self, latency: float, ok: bool, retry_after: Optional[float] = None) -> None:
+		async with self._cond:
+			self.in_flight -= 1
+			self.latency = latency if not self.latency else 0.8 * self.latency + 0.2 * latency
+			now = time.monotonic()
+			if retry_after:
+				self.paused_until = max(self.paused_until, now + retry_after)
+			if not ok or self.latency > self.target_latency:
+				if now - self._last_decrease >= max(self.latency, 0.1):
+					self.limit = max(1.0, self.limit / 2)
+					self._last_decrease = now
+			else:
+				self.limit = min(float(self.max_concurrency), self.limit + 1 / self.limit)
+			self._cond.notify_all()
+
+	def as_dict(self) -> Dict[str, Any]:
+		return {"limit": round(self.limit, 2), "latency": round(self.latency, 3), "in_flight": self.in_flight}
+
+
+@dataclass
+class CrawlStats:
+	requests: int = 0
+	errors: int = 0
+	retries: int = 0
+	bytes: int = 0
+	started_at: float = field(default_factory=time.monotonic)
+
+	def as_dict(self) -> Dict[str, Any]:
+		seconds = max(time.monotonic() - self.started_at, 1e-6)
+		return {
+			"requests": self.requests,
+			"errors": self.errors,
+			"retries": self.retries,
+			"bytes": self.bytes,
+			"seconds": round(seconds, 3),
+			"requests_per_second": round(self.requests / seconds, 2),
+		}
+
+
+class Crawler:
+	"""Begrenzt parallele Abrufe global und pro Host.
+
+	Jeder HTTP-Aufruf läuft in einem Slot (`async with crawler.slot(url)`), die
+	Verteilung auf Tasks übernimmt `map`. Pro Host regelt ein `HostLimiter` Rate
+	(INGEST_HOST_RATE Anfragen/s) und Nebenläufigkeit (adaptiv bis `per_host`);
+	`call` wiederholt gedrosselte oder fehlgeschlagene Anfragen mit Backoff.
+	Eltern-/Kind-Reihenfolge stellt der Aufrufer sicher, indem er Kinder erst nach
+	dem Schreiben des Elternobjekts startet.
+	"""
+
+	def __init__(
+		self,
+		concurrency: int | None = None,
+		per_host: int | None = None,
+		rate: float | None = None,
+		max_retries: int | None = None,
+		rates: Optional[Dict[str, float]] = None,
+	):
+		self.concurrency = concurrency or default_concurrency()
+		self.per_host = per_host or default_per_host_concurrency()
+		self.rate = rate if rate is not None else default_host_rate()
+		self.max_retries = max_retries if max_retries is not None else default_max_retries()
+		# Abweichende Raten je Host (netloc); 0 = ungedrosselt
+		self.rates = rates or {}
+		self._global = asyncio.Semaphore(self.concurrency)
+		self._hosts: Dict[str, HostLimiter] = {}
+		self.stats = CrawlStats()
+
+	def host(self, url: str) -> HostLimiter:
+		host = urlsplit(url).netloc
+		limiter = self._hosts.get(host)
+		if limiter is None:
+			limiter = self._hosts[host] = HostLimiter(self.rates.get(host, self.rate), self.per_host)
+		return limiter
+
+	@asynccontextmanager
+	async def slot(self, url: str) -> AsyncIterator[None]:
+		limiter = self.host(url)
+		await limiter.acquire()
+		started = time.monotonic()
+		ok, retry_after = True, None
+		try:
+			async with self._global:
+				self.stats.requests += 1
+				try:
+					yield
+				except RetryableStatus as e:
+					ok, retry_after = False, e.retry_after
+					raise
+				except (httpx.TransportError, httpx.HTTPStatusError):
+					ok = False
+					raise
+				except Exception:
+					self.stats.errors += 1
+					raise
+		finally:
+			await limiter.release(time.monotonic() - started, ok, retry_after)
+			if not ok:
+				self.stats.errors += 1
+
+	async def call(self, url: str, send: Callable[[], Awaitable[R]]) -> R:
+		"""Führt `send` in einem Slot aus und wiederholt bei 429/5xx und Netzwerkfehlern.
+
+		`send` muss den Status per `check_status` prüfen. Wartezeit ist Retry-After,
+		sonst exponentielles Backoff mit Jitter; nach `max_retries` geht der Fehler hoch.
+		"""
+		attempt = 0
+		while True:
+			try:
+				async with self.slot(url):
+					return await send()
+			except (RetryableStatus, httpx.TransportError) as e:
+				if attempt >= self.max_retries:
+					raise
+				delay = getattr(e, "retry_after", None)
+				await asyncio.sleep(delay if delay is not None else backoff_delay(attempt))
+				attempt += 1
+				self.stats.retries += 1
+
+	async def map(self, fn: Callable[[T], Awaitable[R]], items: Iterable[T]) -> List[R]:
+		"""Führt `fn` für alle Elemente nebenläufig aus, Ergebnisse in Eingabereihenfolge."""
+		async with asyncio.TaskGroup() as tg:
+			tasks = [tg.create_task(fn(item)) for item in items]
+		return [t.result() for t in tasks]
+
+	def hosts(self) -> Dict[str, Dict[str, Any]]:
+		return {host: limiter.as_dict() for host, limiter in self._hosts.items()}
+
+
+class Checkpoint:
+	"""Fortschritt je Liste als Wasserstand: alle Einträge vor `done[name]` sind erledigt.
+
+	Einträge werden parallel fertig; der Wasserstand rückt nur über lückenlos
+	erledigte Indizes vor, damit ein Neustart nichts auslässt. Fehlgeschlagene
+	Einträge halten ihn nicht auf: sie landen per URL in `retry` und werden beim
+	Fortsetzen zuerst erneut versucht. `saved` ist der letzte Stand, dessen Einträge
+	nachweislich im Backend liegen; nur er darf als Cursor gemeldet werden.
+	"""
+
+	def __init__(self, cursor: Optional[Dict[str, Any]] = None):
+		self.done: Dict[str, int] = dict((cursor or {}).get("done", {}))
+		self.retry: Dict[str, List[str]] = {name: list(urls) for name, urls in (cursor or {}).get("retry", {}).items()}
+		self._finished: Dict[str, Set[int]] = {}
+		self.saved: Dict[str, Any] = self.as_dict()
+
+	def pending(self, name: str, items: List[Any], offset: int = 0) -> List[Tuple[int, Any]]:
+		"""Noch offene Einträge; `offset` ist der Index des ersten Eintrags (paginierte Listen)."""
+		start = self.done.get(name, 0)
+		return [(index, item) for index, item in enumerate(items, offset) if index >= start]
+
+	def mark(self, name: str, index: int) -> None:
+		finished = self._finished.setdefault(name, set())
+		finished.add(index)
+		mark = self.done.get(name, 0)
+		while mark in finished:
+			finished.discard(mark)
+			mark += 1
+		self.done[name] = mark
+
+	def fail(self, name: str, url: str) -> None:
+		urls = self.retry.setdefault(name, [])
+		if url not in urls:
+			urls.append(url)
+
+	def succeed(self, name: str, url: str) -> None:
+		urls = self.retry.get(name, [])
+		if url in urls:
+			urls.remove(url)
+
+	def as_dict(self) -> Dict[str, Any]:
+		cursor: Dict[str, Any] = {"done": dict(self.done)}
+		retry = {name: list(urls) for name, urls in self.retry.items() if urls}
+		if retry:
+			cursor["retry"] = retry
+		return cursor
@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import tempfile
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from .client import get_client
+from .crawl import Crawler, check_status
+
+
+class FileTooLarge(Exception):
+	pass
+
+
+def max_file_bytes() -> int:
+	return int(os.getenv("INGEST_MAX_FILE_MB", "500")) * 1024 * 1024
+
+
+@dataclass
+class Download:
+	path: str
+	sha256: str
+	size: int
+	content_type: str
+	etag: str = ""
+	last_modified: str = ""
+
+	def cleanup(self) -> None:
+		try:
+			os.unlink(self.path)
+		except FileNotFoundError:
+			pass
+
+
+async def download_file(
+	url: str,
+	crawler: Crawler,
+	max_bytes: Optional[int] = None,
+	headers: Optional[Dict[str, str]] = None,
+) -> Optional[Download]:
+	"""Lädt eine Datei gestreamt in eine Temp-Datei und hasht dabei inkrementell.
+
+	Der Speicherbedarf bleibt unabhängig von der Dateigröße konstant; Dateien über
+	`max_bytes` (INGEST_MAX_FILE_MB) werden abgebrochen. Mit Conditional-`headers`
+	liefert eine 304-Antwort `None`. Der Aufrufer räumt per `Download.cleanup()` auf.
+	"""
+	limit = max_bytes or max_file_bytes()
+	fd, path = tempfile.mkstemp(prefix="mandari-", suffix=".part", dir=os.getenv("INGEST_SPOOL_DIR") or None)
+	os.close(fd)
+
+	async def attempt() -> Optional[Download]:
+		# Jeder Versuch beginnt von vorn: Datei leeren, Hash neu aufsetzen
+		hasher = hashlib.sha256()
+		size = 0
+		with open(path, "wb") as fh:
+			async with get_client().stream("GET", url, headers=headers) as r:
+				if check_status(r).status_code == 304:
+					return None
+				declared = int(r.headers.get("Content-Length") or 0)
+				if declared > limit:
+					raise FileTooLarge(f"{url}: {declared} Bytes > {limit}")
+				async for chunk in r.aiter_bytes(64 * 1024):
+					size += len(chunk)
+					if size > limit:
+						raise FileTooLarge(f"{url}: mehr als {limit} Bytes")
+					hasher.update(chunk)
+					fh.write(chunk)
+		return Download(
+			path=path,
+			sha256=hasher.hexdigest(),
+			size=size,
+			content_type=r.headers.get("Content-Type", ""),
+			etag=r.headers.get("ETag", ""),
+			last_modified=r.headers.get("Last-Modified", ""),
+		)
+
+	try:
+		download = await crawler.call(url, attempt)
+	except BaseException:
+		os.unlink(path)
+		raise
+	if download is None:
+		os.unlink(path)
+		return None
+	crawler.stats.bytes += download.size
+	return download
@@ -0,0 +1,262 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import signal
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+_stage: Optional["ExtractionStage"] = None
+
+
+def _init_worker(max_memory_mb: int) -> None:
+	# Speicherobergrenze je Worker-Prozess; große/defekte PDFs enden als MemoryError statt OOM-Kill
+	if max_memory_mb > 0:
+		import resource
+		limit = max_memory_mb * 1024 * 1024
+		resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def _on_alarm(signum: int, frame: Any) -> None:
+	raise TimeoutError("Textextraktion abgebrochen")
+
+
+def _extract_pdf(path: str, timeout: int) -> str:
+	"""Läuft im Worker-Prozess. Der Alarm bricht die Arbeit dort ab, nicht nur das Warten darauf."""
+	from pdfminer.high_level import extract_text
+
+	signal.signal(signal.SIGALRM, _on_alarm)
+	signal.alarm(timeout)
+	try:
+		return extract_text(path)
+	except Exception:
+		return ""
+	finally:
+		signal.alarm(0)
+
+
+def _page_count(path: str) -> int:
+	from pdf2image import pdfinfo_from_path
+
+	return int(pdfinfo_from_path(path).get("Pages", 0))
+
+
+def _ocr_page(path: str, page: int, dpi: int, lang: str, timeout: int) -> Tuple[str, float]:
+	"""Rastert eine Seite (poppler) und erkennt den Text (tesseract); liefert Text und Dauer."""
+	from pdf2image import convert_from_path
+	import pytesseract
+
+	started = time.monotonic()
+	signal.signal(signal.SIGALRM, _on_alarm)
+	signal.alarm(timeout)
+	try:
+		images = convert_from_path(path, dpi=dpi, first_page=page, last_page=page)
+		text = "".join(pytesseract.image_to_string(image, lang=lang) for image in images)
+	except Exception:
+		text = ""
+	finally:
+		signal.alarm(0)
+	return text, time.monotonic() - started
+
+
+@dataclass
+class Extraction:
+	text: str
+	ocr: bool = False
+	cached: bool = False
+	# Je OCR-Seite: page, seconds, chars
+	pages: List[Dict[str, Any]] = field(default_factory=list)
+
+	def meta(self) -> Dict[str, Any]:
+		"""Angaben für `Document.normalized`; leer, wenn kein OCR nötig war."""
+		if not self.ocr:
+			return {}
+		return {"ocr": {"cached": self.cached, "pages": self.pages}}
+
+
+class OcrCache:
+	"""OCR-Ergebnisse je Inhalts-Hash auf der Platte (INGEST_OCR_CACHE_DIR), damit keine Datei zweimal läuft."""
+
+	def __init__(self, directory: Optional[str] = None):
+		self.directory = directory or os.getenv("INGEST_OCR_CACHE_DIR") or os.path.join(tempfile.gettempdir(), "mandari-ocr")
+		os.makedirs(self.directory, exist_ok=True)
+
+	def _path(self, content_hash: str) -> str:
+		return os.path.join(self.directory, f"{content_hash}.json")
+
+	def get(self, content_hash: str) -> Optional[Extraction]:
+		try:
+			with open(self._path(content_hash), encoding="utf-8") as fh:
+				data = json.load(fh)
+		except (FileNotFoundError, ValueError):
+			return None
+		return Extraction(text=data["text"], ocr=True, cached=True, pages=data.get("pages", []))
+
+	def put(self, content_hash: str, result: Extraction) -> None:
+		# Atomar ersetzen, damit parallele Worker keine halben Dateien lesen
+		fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+		with os.fdopen(fd, "w", encoding="utf-8") as fh:
+			json.dump({"text": result.text, "pages": result.pages}, fh)
+		os.replace(tmp, self._path(content_hash))
+
+
+class ExtractionStage:
+	"""PDF-Textextraktion in einem ProcessPool, gespeist über eine begrenzte Queue.
+
+	`extract` stellt ein Dokument (Pfad der gespoolten Datei) ein und wartet auf den
+	Text. Ist die Queue voll, blockiert der Aufrufer (Download) – so überlappen
+	Download und Parsing, ohne dass beliebig viele Dateien auf einen Worker warten.
+
+	Liefert pdfminer weniger als INGEST_OCR_MIN_CHARS Zeichen (Scan), werden die
+	Seiten einzeln gerastert und parallel im selben Pool per OCR erkannt. Ergebnisse
+	werden je Inhalts-Hash gecacht; `stats` zählt Seiten und OCR-Zeit.
+	"""
+
+	def __init__(
+		self,
+		workers: Optional[int] = None,
+		timeout: Optional[int] = None,
+		max_memory_mb: Optional[int] = None,
+		queue_size: Optional[int] = None,
+	):
+		self.workers = workers or int(os.getenv("INGEST_EXTRACT_WORKERS", "0")) or os.cpu_count() or 1
+		self.timeout = timeout or int(os.getenv("INGEST_EXTRACT_TIMEOUT", "60"))
+		self.max_memory_mb = max_memory_mb if max_memory_mb is not None else int(os.getenv("INGEST_EXTRACT_MAX_MEMORY_MB", "1024"))
+		self.queue: asyncio.Queue[Tuple[str, asyncio.Future]] = asyncio.Queue(
+			maxsize=queue_size or int(os.getenv("INGEST_EXTRACT_QUEUE", "0")) or self.workers * 2
+		)
+		self.ocr_enabled = os.getenv("INGEST_OCR", "True") == "True"
+		self.ocr_min_chars = int(os.getenv("INGEST_OCR_MIN_CHARS", "200"))
+		self.ocr_dpi = int(os.getenv("INGEST_OCR_DPI", "300"))
+		self.ocr_lang = os.getenv("INGEST_OCR_LANG", "deu")
+		self.ocr_max_pages = int(os.getenv("INGEST_OCR_MAX_PAGES", "200"))
+		self.ocr_page_timeout = int(os.getenv("INGEST_OCR_PAGE_TIMEOUT", "120"))
+		self.cache = OcrCache() if self.ocr_enabled else None
+		self.stats: Dict[str, float] = {"documents": 0, "ocr_documents": 0, "ocr_pages": 0, "ocr_seconds": 0.0, "ocr_cache_hits": 0}
+		self._ocr_running: Dict[str, asyncio.Future] = {}
+		# Wenige Dokumente gleichzeitig, deren Seiten dafür parallel – hält den Pool-Rückstau klein
+		self._ocr_slots = asyncio.Semaphore(int(os.getenv("INGEST_OCR_CONCURRENCY", "2")))
+		self._pool = self._new_pool()
+		self._consumers: List[asyncio.Task] = []
+
+	def _new_pool(self) -> ProcessPoolExecutor:
+		return ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker, initargs=(self.max_memory_mb,))
+
+	def start(self) -> None:
+		if not self._consumers:
+			self._consumers = [asyncio.create_task(self._consume()) for _ in range(self.workers)]
+
+	async def close(self) -> None:
+		for task in self._consumers:
+			task.cancel()
+		await asyncio.gather(*self._consumers, return_exceptions=True)
+		self._consumers = []
+		self._pool.shutdown(wait=False, cancel_futures=True)
+
+	async def extract(self, path: str, content_hash: str = "") -> Extraction:
+		self.start()
+		future: asyncio.Future = asyncio.get_running_loop().create_future()
+		await self.queue.put((path, future))
+		text = await future
+		self.stats["documents"] += 1
+		if not self.ocr_enabled or len(text.strip()) >= self.ocr_min_chars:
+			return Extraction(text=text)
+		result = await self.ocr(path, content_hash)
+		# OCR findet nichts (leere Seiten, Fehler): den pdfminer-Text behalten
+		return result if result.text.strip() else Extraction(text=text, ocr=True, pages=result.pages)
+
+	async def _consume(self) -> None:
+		loop = asyncio.get_running_loop()
+		while True:
+			path, future = await self.queue.get()
+			try:
+				# Kleiner Puffer über dem Alarm im Worker, falls der Prozess nicht reagiert
+				text = await asyncio.wait_for(
+					loop.run_in_executor(self._pool, _extract_pdf, path, self.timeout),
+					timeout=self.timeout + 5,
+				)
+			except BrokenProcessPool:
+				# Ein Worker ist hart gestorben (z. B. Speicherlimit) – Pool neu aufsetzen
+				self._pool = self._new_pool()
+				text = ""
+			except Exception:
+				text = ""
+			finally:
+				self.queue.task_done()
+			if not future.done():
+				future.set_result(text)
+
+	async def ocr(self, path: str, content_hash: str = "") -> Extraction:
+		"""OCR aller Seiten, parallel; gleicher Hash wird nur einmal erkannt (auch gleichzeitig)."""
+		if content_hash:
+			cached = self.cache.get(content_hash)
+			if cached is not None:
+				self.stats["ocr_cache_hits"] += 1
+				return cached
+			running = self._ocr_running.get(content_hash)
+			if running is not None:
+				return await asyncio.shield(running)
+		task = asyncio.ensure_future(self._ocr(path))
+		if content_hash:
+			self._ocr_running[content_hash] = task
+		try:
+			result = await task
+		finally:
+			self._ocr_running.pop(content_hash, None)
+		if content_hash and result.text.strip():
+			self.cache.put(content_hash, result)
+		return result
+
+	async def _ocr(self, path: str) -> Extraction:
+		async with self._ocr_slots:
+			return await self._ocr_pages(path)
+
+	async def _ocr_pages(self, path: str) -> Extraction:
+		loop = asyncio.get_running_loop()
+		try:
+			count = await loop.run_in_executor(self._pool, _page_count, path)
+		except Exception:
+			return Extraction(text="", ocr=True)
+		pages = list(range(1, min(count, self.ocr_max_pages) + 1))
+
+		async def run(page: int) -> Tuple[str, float]:
+			try:
+				return await asyncio.wait_for(
+					loop.run_in_executor(self._pool, _ocr_page, path, page, self.ocr_dpi, self.ocr_lang, self.ocr_page_timeout),
+					timeout=self.ocr_page_timeout + 5,
+				)
+			except BrokenProcessPool:
+				self._pool = self._new_pool()
+				return "", 0.0
+			except Exception:
+				return "", 0.0
+
+		results = await asyncio.gather(*(run(page) for page in pages))
+		timings = [
+			{"page": page, "seconds": round(seconds, 3), "chars": len(text)}
+			for page, (text, seconds) in zip(pages, results)
+		]
+		self.stats["ocr_documents"] += 1
+		self.stats["ocr_pages"] += len(pages)
+		self.stats["ocr_seconds"] += sum(seconds for _, seconds in results)
+		# Seitenumbruch als Formfeed, wie pdfminer
+		return Extraction(text="\f".join(text for text, _ in results), ocr=True, pages=timings)
+
+
+def get_extractor() -> ExtractionStage:
+	global _stage
+	if _stage is None:
+		_stage = ExtractionStage()
+	return _stage
+
+
+async def close_extractor() -> None:
+	global _stage
+	if _stage is not None:
+		await _stage.close()
+		_stage = None
@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import Any, Dict
+
+from .backend import backend_base_url, backend_headers
+from .client import get_client
+from .crawl import Checkpoint
+from .pipeline import run_ingest
+
+logger = logging.getLogger(__name__)
+
+_jobs: Dict[int, asyncio.Task] = {}
+
+
+async def report(job_id: int, data: Dict[str, Any]) -> None:
+	r = await get_client().patch(f"{backend_base_url()}/ingest-jobs/{job_id}/", json=data, headers=backend_headers())
+	r.raise_for_status()
+
+
+async def run_job(job_id: int, params: Dict[str, Any]) -> None:
+	"""Arbeitet einen Job ab und hält Status/Checkpoint im Backend aktuell.
+
+	Bei Fehler oder Abbruch (Shutdown) wird der letzte vollständig geschriebene Checkpoint
+	(`Checkpoint.saved`) mit Status `failed` gemeldet; das Backend kann den Job dann ab
+	dort erneut anstoßen. Ebenso, wenn einzelne Einträge fehlschlugen: der Checkpoint
+	führt sie unter `retry`, das Fortsetzen holt nur sie nach.
+	"""
+	checkpoint = Checkpoint(params.get("cursor"))
+
+	async def on_progress(progress: Dict[str, Any]) -> None:
+		await report(job_id, {"status": "running", **progress})
+
+	try:
+		result = await run_ingest(
+			params["root"],
+			params["tenant_id"],
+			etag=params.get("etag"),
+			last_modified=params.get("last_modified"),
+			modified_since=params.get("modified_since"),
+			checkpoint=checkpoint,
+			on_progress=on_progress,
+		)
+	except asyncio.CancelledError:
+		await asyncio.shield(report(job_id, {"status": "failed", "error": "abgebrochen", "cursor": checkpoint.saved}))
+		raise
+	except Exception as e:
+		logger.exception("Ingest-Job %s fehlgeschlagen", job_id)
+		await report(job_id, {"status": "failed", "error": str(e), "cursor": checkpoint.saved})
+		return
+	retry = sum(len(urls) for urls in checkpoint.retry.values())
+	if retry:
+		await report(job_id, {
+			"status": "failed",
+			"error": f"{retry} Einträge fehlgeschlagen",
+			"result": result,
+			"cursor": checkpoint.as_dict(),
+			"stats": result.get("stats", {}),
+		})
+		return
+	await report(job_id, {
+		"status": "succeeded",
+		"result": result,
+		"cursor": checkpoint.as_dict(),
+		"stats": result.get("stats", {}),
+	})
+
+
+def start_job(job_id: int, params: Dict[str, Any]) -> bool:
+	"""Startet den Job im Hintergrund; False, wenn er in diesem Prozess bereits läuft."""
+	task = _jobs.get(job_id)
+	if task is not None and not task.done():
+		return False
+	task = asyncio.create_task(run_job(job_id, params))
+	_jobs[job_id] = task
+	task.add_done_callback(lambda t: _jobs.pop(job_id, None) if _jobs.get(job_id) is t else None)
+	return True
+
+
+async def cancel_jobs() -> None:
+	tasks = list(_jobs.values())
+	for task in tasks:
+		task.cancel()
+	await asyncio.gather(*tasks, return_exceptions=True)
@@ -1,26 +1,53 @@
 from __future__ import annotations
 
-import hashlib
-import io
-import json
-from typing import Any, Dict, Optional
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional
 
-import httpx
 from fastapi import FastAPI, HTTPException
-from pdfminer.high_level import extract_text
+from pydantic import BaseModel
 
-app = FastAPI(title="Mandari Ingest Service")
+from .client import close_client, get_client
+from .extract import close_extractor, get_extractor
+from .jobs import cancel_jobs, start_job
+from .pipeline import CatalogError, run_ingest
+from .queue import Broker, create_broker
+from .stages import enqueue_source
 
+_broker: Optional[Broker] = None
 
-def sha256_bytes(data: bytes) -> str:
-	return hashlib.sha256(data).hexdigest()
 
+async def get_broker() -> Broker:
+	global _broker
+	if _broker is None:
+		broker = create_broker()
+		await broker.connect()
+		_broker = broker
+	return _broker
 
-async def fetch_json(url: str) -> Dict[str, Any]:
-	async with httpx.AsyncClient(timeout=30.0) as client:
-		r = await client.get(url)
-		r.raise_for_status()
-		return r.json()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+	get_client()
+	get_extractor().start()
+	yield
+	await cancel_jobs()
+	if _broker is not None:
+		await _broker.close()
+	await close_extractor()
+	await close_client()
+
+
+app = FastAPI(title="Mandari Ingest Service", lifespan=lifespan)
+
+
+class JobRequest(BaseModel):
+	job_id: int
+	root: str
+	tenant_id: int
+	cursor: Dict[str, Any] = {}
+	etag: Optional[str] = None
+	last_modified: Optional[str] = None
+	modified_since: Optional[str] = None
 
 
 @app.get("/health")
@@ -29,80 +56,39 @@ async def health() -> Dict[str, str]:
 
 
 @app.post("/oparl/ingest")
-async def ingest_oparl(root: str, tenant_id: int) -> Dict[str, Any]:
+async def ingest_oparl(
+	root: str,
+	tenant_id: int,
+	concurrency: Optional[int] = None,
+	per_host: Optional[int] = None,
+	etag: Optional[str] = None,
+	last_modified: Optional[str] = None,
+	modified_since: Optional[str] = None,
+) -> Dict[str, Any]:
+	"""Synchroner Import (kleine Quellen, Tests); große Quellen laufen als Job über /oparl/jobs."""
 	try:
-		catalog = await fetch_json(root)
-	except Exception as e:
-		raise HTTPException(status_code=400, detail=f"Katalog fehlerhaft: {e}")
-
-	# Minimaler Proof: lade bodies und meetings, schreibe über Backend-API
-	changes = {"organizations": 0, "meetings": 0, "documents": 0}
-	backend = "http://backend:8000/api"
-	async with httpx.AsyncClient(timeout=30.0) as client:
-		for body_url in catalog.get("body", []):
-			body = await fetch_json(body_url)
-			org = {
-				"tenant": tenant_id,
-				"name": body.get("name") or body.get("shortName", "Körperschaft"),
-				"oparl_id": body.get("id", body_url),
-			}
-			await client.post(f"{backend}/organizations/", json=org)
-			changes["organizations"] += 1
-
-		meetings_list = catalog.get("meeting", [])
-		for m_url in meetings_list:
-			meeting = await fetch_json(m_url)
-			committee_name = (meeting.get("committee") or {}).get("name", "Ausschuss") if isinstance(meeting.get("committee"), dict) else "Ausschuss"
-			# Upsert Committee by name (idempotent Demo)
-			r = await client.get(f"{backend}/committees/?tenant={tenant_id}")
-			committee_id: Optional[int] = None
-			for c in r.json():
-				if c["name"] == committee_name:
-					committee_id = c["id"]
-					break
-			if committee_id is None:
-				cr = await client.post(f"{backend}/committees/", json={"tenant": tenant_id, "name": committee_name})
-				committee_id = cr.json()["id"]
-
-			start = meeting.get("start") or meeting.get("startDate") or meeting.get("date")
-			mr = await client.post(
-				f"{backend}/meetings/",
-				json={
-					"tenant": tenant_id,
-					"committee": committee_id,
-					"start": start,
-					"oparl_id": meeting.get("id", m_url),
-				},
-			)
-			meeting_id = mr.json()["id"]
-			changes["meetings"] += 1
-
-			# Documents: fetch files if linked as URL in meeting
-			for f_url in meeting.get("auxiliaryFile", []):
-				try:
-					fr = await client.get(f_url)
-					fr.raise_for_status()
-					content = fr.content
-					content_hash = sha256_bytes(content)
-					try:
-						text = extract_text(io.BytesIO(content))
-					except Exception:
-						text = ""
-					await client.post(
-						f"{backend}/documents/",
-						json={
-							"tenant": tenant_id,
-							"title": f"Dokument {content_hash[:8]}",
-							"raw": {"source": f_url},
-							"normalized": {},
-							"content_text": text[:10000],
-							"content_hash": content_hash,
-							"oparl_id": f_url,
-						},
-					)
-					changes["documents"] += 1
-				except Exception:
-					continue
-
-	return {"status": "ok", "changes": changes}
-
+		return await run_ingest(
+			root,
+			tenant_id,
+			concurrency=concurrency,
+			per_host=per_host,
+			etag=etag,
+			last_modified=last_modified,
+			modified_since=modified_since,
+		)
+	except CatalogError as e:
+		raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.post("/oparl/jobs", status_code=202)
+async def submit_job(req: JobRequest) -> Dict[str, Any]:
+	"""Nimmt einen Job vom Backend an und arbeitet ihn im Hintergrund ab (Fortschritt per PATCH ans Backend)."""
+	started = start_job(req.job_id, req.model_dump())
+	return {"job": req.job_id, "status": "running", "already_running": not started}
+
+
+@app.post("/oparl/enqueue", status_code=202)
+async def enqueue_oparl(root: str, tenant_id: int, modified_since: Optional[str] = None) -> Dict[str, Any]:
+	"""Stellt eine Quelle in die Queue; die Stufen arbeiten die Worker (`python -m app.worker`) ab."""
+	await enqueue_source(await get_broker(), root, tenant_id, modified_since)
+	return {"status": "queued", "root": root}
@@ -0,0 +1,474 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+import httpx
+
+from .backend import BackendWriter, IdMap, KnownFiles, backend_base_url, backend_rates
+from .client import get_client
+from .crawl import Checkpoint, Crawler, check_status
+from .download import Download, download_file
+from .extract import Extraction, get_extractor
+
+logger = logging.getLogger(__name__)
+
+
+class CatalogError(Exception):
+	pass
+
+
+def progress_interval() -> float:
+	return float(os.getenv("INGEST_CHECKPOINT_INTERVAL", "15"))
+
+
+async def fetch(
+	url: str,
+	crawler: Optional[Crawler] = None,
+	params: Optional[Dict[str, str]] = None,
+	headers: Optional[Dict[str, str]] = None,
+) -> httpx.Response:
+	"""GET über den gemeinsamen Client; 304 gilt als Erfolg (Conditional Request).
+
+	Mit `crawler` gelten dessen Host-Limits, und Drosselung (429/5xx) wird wiederholt.
+	"""
+	client = get_client()
+
+	async def send() -> httpx.Response:
+		return check_status(await client.get(url, params=params, headers=headers))
+
+	if crawler is None:
+		return await send()
+	return await crawler.call(url, send)
+
+
+async def fetch_json(url: str, crawler: Optional[Crawler] = None, params: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+	r = await fetch(url, crawler, params=params)
+	return r.json()
+
+
+def parse_timestamp(value: Any) -> Optional[datetime]:
+	if not isinstance(value, str) or not value:
+		return None
+	try:
+		ts = datetime.fromisoformat(value.replace("Z", "+00:00"))
+	except ValueError:
+		return None
+	return ts if ts.tzinfo else ts.replace(tzinfo=timezone.utc)
+
+
+def is_unchanged(obj: Any, modified_since: Optional[datetime]) -> bool:
+	"""True, wenn ein (eingebettetes) OParl-Objekt laut `modified` seit dem letzten Lauf unverändert ist."""
+	if modified_since is None or not isinstance(obj, dict):
+		return False
+	modified = parse_timestamp(obj.get("modified"))
+	return modified is not None and modified <= modified_since
+
+
+def lists_embedded(catalog: Dict[str, Any]) -> bool:
+	"""True, wenn Körperschaften und Sitzungen im Katalog selbst stehen statt hinter Listen-URLs.
+
+	Nur dann ändert jede neue Sitzung auch den Katalog und damit seine Validatoren.
+	"""
+	bodies = catalog.get("body", [])
+	if not isinstance(bodies, list) or isinstance(catalog.get("meeting"), str):
+		return False
+	return all(isinstance(body, dict) and not isinstance(body.get("meeting"), str) for body in bodies)
+
+
+def file_url(ref: Any) -> str:
+	"""Download-URL eines File-Verweises; dient zugleich als oparl_id des Dokuments."""
+	if isinstance(ref, dict):
+		return ref.get("accessUrl") or ref.get("id", "")
+	return ref
+
+
+async def iter_pages(ref: Any, crawler: Crawler, modified_since: Optional[datetime]) -> AsyncIterator[List[Any]]:
+	"""Seiten einer Katalogliste: flache Liste (eine Seite) oder paginierte OParl-Liste.
+
+	Der Abruf der nächsten Seite (`links.next`) läuft bereits, während der Aufrufer die
+	aktuelle verarbeitet. Einträge kommen unverändert zurück – eingebettete Objekte
+	werden direkt verwendet, nur reine URLs muss der Aufrufer noch abrufen.
+	"""
+	if isinstance(ref, list):
+		yield ref
+		return
+	if not isinstance(ref, str) or not ref:
+		return
+	params = {"modified_since": modified_since.isoformat()} if modified_since else None
+	pending: Optional[asyncio.Task] = asyncio.create_task(fetch_json(ref, crawler, params=params))
+	try:
+		while pending is not None:
+			page = await pending
+			# modified_since steckt bereits in der next-URL
+			next_url = (page.get("links") or {}).get("next")
+			pending = asyncio.create_task(fetch_json(next_url, crawler)) if next_url else None
+			yield page.get("data", [])
+	finally:
+		if pending is not None:
+			pending.cancel()
+
+
+def organization_item(body: Dict[str, Any], url: str) -> Dict[str, Any]:
+	return {
+		"name": body.get("name") or body.get("shortName", "Körperschaft"),
+		"oparl_id": body.get("id", url),
+	}
+
+
+def meeting_item(meeting: Dict[str, Any], url: str, committee_id: int) -> Dict[str, Any]:
+	return {
+		"committee": committee_id,
+		"start": meeting.get("start") or meeting.get("startDate") or meeting.get("date"),
+		"end": meeting.get("end"),
+		"oparl_id": meeting.get("id", url),
+	}
+
+
+def agenda_item(item: Dict[str, Any], meeting_oparl_id: str, position: int) -> Dict[str, Any]:
+	public = item.get("public")
+	return {
+		"meeting": meeting_oparl_id,
+		"position": item.get("order", position),
+		"title": item.get("name") or item.get("number") or "Tagesordnungspunkt",
+		"category": "" if public is None else ("öffentlich" if public else "nichtöffentlich"),
+		"oparl_id": item.get("id", ""),
+	}
+
+
+def person_item(person: Dict[str, Any]) -> Dict[str, Any]:
+	name = person.get("name") or " ".join(p for p in (person.get("givenName"), person.get("familyName")) if p)
+	return {"name": name or "Unbekannt", "oparl_id": person.get("id", "")}
+
+
+def document_item(
+	url: str,
+	download: Download,
+	extraction: Extraction,
+	ref: Any = None,
+	agenda_item_id: str = "",
+) -> Dict[str, Any]:
+	meta = ref if isinstance(ref, dict) else {}
+	item = {
+		"title": meta.get("name") or meta.get("fileName") or f"Dokument {download.sha256[:8]}",
+		"raw": {"source": url, "etag": download.etag, "last_modified": download.last_modified},
+		"normalized": {**extraction.meta(), "mime_type": meta.get("mimeType") or download.content_type},
+		"content_text": extraction.text,
+		"content_hash": download.sha256,
+		"oparl_id": url,
+	}
+	if agenda_item_id:
+		item["agenda_item"] = agenda_item_id
+	return item
+
+
+def meeting_committee(meeting: Dict[str, Any]) -> Any:
+	"""Gremium einer Sitzung: OParl `organization[0]` (Objekt oder URL), ältere Quellen liefern `committee`."""
+	if isinstance(meeting.get("committee"), dict):
+		return meeting["committee"]
+	organizations = meeting.get("organization") or []
+	return organizations[0] if organizations else {}
+
+
+async def resolve_committee(ids: IdMap, writer: BackendWriter, committee: Dict[str, Any]) -> int:
+	committee_name = committee.get("name", "Ausschuss")
+	oparl_id = committee.get("id", "")
+	item: Dict[str, Any] = {"name": committee_name, "oparl_id": oparl_id}
+	# Körperschaft des Gremiums; Bodies werden vor den Sitzungen geschrieben
+	organization_id = ids.get("organization", committee.get("body", "")) if committee.get("body") else None
+	if organization_id is not None:
+		item["organization"] = organization_id
+	return await ids.resolve("committee", oparl_id, committee_name, lambda: writer.create("committee", item))
+
+
+# Felder mit Datei-Verweisen je OParl-Typ
+MEETING_FILE_FIELDS = ("invitation", "resultsProtocol", "verbatimProtocol", "auxiliaryFile")
+AGENDA_ITEM_FILE_FIELDS = ("resolutionFile", "auxiliaryFile")
+PAPER_FILE_FIELDS = ("mainFile", "auxiliaryFile")
+
+
+def file_refs(obj: Dict[str, Any], fields: Tuple[str, ...]) -> List[Any]:
+	refs: List[Any] = []
+	for name in fields:
+		value = obj.get(name)
+		if isinstance(value, list):
+			refs.extend(value)
+		elif value:
+			refs.append(value)
+	return refs
+
+
+class ObjectCache:
+	"""Ruft OParl-Objekte je URL höchstens einmal ab; eine Vorlage hängt oft an vielen Beratungen."""
+
+	def __init__(self, crawler: Crawler):
+		self.crawler = crawler
+		self._tasks: Dict[str, asyncio.Future] = {}
+
+	async def get(self, ref: Any) -> Dict[str, Any]:
+		if isinstance(ref, dict):
+			return ref
+		if not isinstance(ref, str) or not ref:
+			return {}
+		task = self._tasks.get(ref)
+		if task is None:
+			task = self._tasks[ref] = asyncio.ensure_future(fetch_json(ref, self.crawler))
+		return await task
+
+
+@dataclass
+class MeetingGraph:
+	"""Kinder einer Sitzung als Bulk-Items; `files` verweist je Datei auf ihren TOP (oder "")."""
+
+	agenda_items: List[Dict[str, Any]] = field(default_factory=list)
+	persons: List[Dict[str, Any]] = field(default_factory=list)
+	files: List[Tuple[Any, str]] = field(default_factory=list)
+
+
+async def walk_meeting(meeting: Dict[str, Any], url: str, objects: ObjectCache) -> MeetingGraph:
+	"""Folgt Sitzung → TOP → Beratung → Vorlage → Datei sowie den Teilnehmenden."""
+	meeting_id = meeting.get("id", url)
+	graph = MeetingGraph(files=[(f, "") for f in file_refs(meeting, MEETING_FILE_FIELDS)])
+
+	async def walk_item(position: int, ref: Any) -> Tuple[Dict[str, Any], List[Tuple[Any, str]]]:
+		item = await objects.get(ref)
+		item_id = item.get("id", "")
+		files = [(f, item_id) for f in file_refs(item, AGENDA_ITEM_FILE_FIELDS)]
+		try:
+			consultation = await objects.get(item.get("consultation"))
+			paper = await objects.get(consultation.get("paper"))
+			files += [(f, item_id) for f in file_refs(paper, PAPER_FILE_FIELDS)]
+		except Exception as e:
+			# Fehlende Vorlage kostet nur deren Dateien, nicht den TOP
+			logger.warning("Vorlage zu %s nicht abrufbar: %s", item_id, e)
+		return agenda_item(item, meeting_id, position), files
+
+	walked = await asyncio.gather(*(walk_item(i, ref) for i, ref in enumerate(meeting.get("agendaItem", []))))
+	for item, files in walked:
+		if item["oparl_id"]:
+			graph.agenda_items.append(item)
+			graph.files.extend(files)
+		else:
+			graph.files.extend((f, "") for f, _ in files)
+	persons = await asyncio.gather(*(objects.get(ref) for ref in meeting.get("participant", [])), return_exceptions=True)
+	for person in persons:
+		if isinstance(person, dict) and person.get("id"):
+			graph.persons.append(person_item(person))
+	return graph
+
+
+async def run_ingest(
+	root: str,
+	tenant_id: int,
+	concurrency: Optional[int] = None,
+	per_host: Optional[int] = None,
+	etag: Optional[str] = None,
+	last_modified: Optional[str] = None,
+	modified_since: Optional[str] = None,
+	checkpoint: Optional[Checkpoint] = None,
+	on_progress: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None,
+) -> Dict[str, Any]:
+	"""Importiert eine OParl-Quelle.
+
+	Mit `etag`/`last_modified` wird der Katalog bedingt abgerufen; ein 304 beendet den Lauf
+	nur, wenn alle Listen im Katalog eingebettet sind (siehe `lists_embedded`) und keine
+	Wiederholungen anstehen. Mit `modified_since` werden nur seitdem geänderte Objekte
+	verarbeitet (Delta-Sync).
+	Die neuen Validatoren kommen unter `validators` zurück und werden vom Backend gespeichert.
+	Ein `checkpoint` überspringt bereits erledigte Listeneinträge; `on_progress` erhält
+	regelmäßig Cursor und Statistik (INGEST_CHECKPOINT_INTERVAL Sekunden).
+	"""
+	crawler = Crawler(concurrency=concurrency, per_host=per_host, rates=backend_rates())
+	since = parse_timestamp(modified_since)
+	conditional: Dict[str, str] = {}
+	if etag:
+		conditional["If-None-Match"] = etag
+	if last_modified:
+		conditional["If-Modified-Since"] = last_modified
+	checkpoint = checkpoint or Checkpoint()
+	try:
+		cr = await fetch(root, crawler, headers=conditional)
+		validators = {
+			"etag": cr.headers.get("ETag", etag or ""),
+			"last_modified": cr.headers.get("Last-Modified", last_modified or ""),
+		}
+		not_modified = cr.status_code == 304
+		if not_modified:
+			# Die Validatoren decken nur das System-Objekt ab; für die Listen-URLs braucht es den Inhalt
+			cr = await fetch(root, crawler)
+		catalog = cr.json()
+	except Exception as e:
+		raise CatalogError(f"Katalog fehlerhaft: {e}") from e
+	if not_modified and lists_embedded(catalog) and not any(checkpoint.retry.values()):
+		changes = {"organizations": 0, "meetings": 0, "documents": 0}
+		return {"status": "not_modified", "changes": changes, "validators": validators, "stats": crawler.stats.as_dict()}
+
+	# Lade bodies und meetings, schreibe gebündelt über die Bulk-API des Backends
+	backend = backend_base_url()
+	ids = IdMap()
+	writer = BackendWriter(tenant_id, crawler, base=backend, ids=ids)
+	known = KnownFiles(tenant_id, crawler, base=backend)
+	objects = ObjectCache(crawler)
+	skipped = {"documents": 0}
+	failed: List[Dict[str, str]] = []
+	# Dateien und Personen hängen an mehreren TOPs/Sitzungen: je Lauf nur einmal verarbeiten
+	seen_files: Set[str] = set()
+	seen_persons: Set[str] = set()
+	# Einmal pro Lauf laden statt je Sitzung die komplette Gremienliste
+	await ids.prime(tenant_id, crawler, base=backend)
+
+	async def ingest_body(ref: Any) -> None:
+		body_url = ref.get("id", "") if isinstance(ref, dict) else ref
+		body = await objects.get(ref)
+		await writer.add("organization", organization_item(body, body_url))
+
+	async def meeting_lists() -> List[Tuple[str, Any]]:
+		"""Sitzungslisten: OParl 1.1 führt sie je Körperschaft (`body.meeting`), ältere Quellen am System.
+
+		Die Körperschaften werden dafür ohne Delta-Filter gelesen – auch eine unveränderte
+		Körperschaft kann neue Sitzungen haben. Jede Liste hat ihren eigenen Checkpoint.
+		"""
+		lists: List[Tuple[str, Any]] = []
+		if catalog.get("meeting"):
+			lists.append(("meeting", catalog["meeting"]))
+		async for page in iter_pages(catalog.get("body", []), crawler, None):
+			for ref, body in zip(page, await crawler.map(objects.get, page)):
+				if body.get("meeting"):
+					body_url = body.get("id") or (ref if isinstance(ref, str) else "")
+					lists.append((f"meeting@{body_url}", body["meeting"]))
+		return lists
+
+	async def ingest_file(entry: Tuple[Any, str]) -> None:
+		ref, agenda_item_id = entry
+		f_url = file_url(ref)
+		checksum = ref.get("sha256Checksum", "") if isinstance(ref, dict) else ""
+		if known.is_known(f_url, checksum):
+			skipped["documents"] += 1
+			return
+		try:
+			download = await download_file(f_url, crawler, headers=known.conditional_headers(f_url))
+			if download is None:
+				skipped["documents"] += 1
+				return
+			try:
+				content_hash = download.sha256
+				# Gleicher Inhalt schon im Backend oder in diesem Lauf: nicht erneut parsen
+				if content_hash in known.hashes:
+					skipped["documents"] += 1
+					return
+				known.hashes.add(content_hash)
+				extraction = await get_extractor().extract(download.path, content_hash)
+			finally:
+				download.cleanup()
+			await writer.add("document", document_item(f_url, download, extraction, ref, agenda_item_id))
+		except Exception as e:
+			# Nach ausgeschöpften Wiederholungen: im Ergebnis melden statt still zu verwerfen
+			logger.warning("Datei %s nicht importiert: %s", f_url, e)
+			failed.append({"url": f_url, "error": str(e) or type(e).__name__})
+
+	async def ingest_meeting(ref: Any) -> None:
+		m_url = ref.get("id", "") if isinstance(ref, dict) else ref
+		meeting = ref if isinstance(ref, dict) else await fetch_json(m_url, crawler)
+		if is_unchanged(meeting, since):
+			return
+		committee = await objects.get(meeting_committee(meeting))
+		committee_id = await resolve_committee(ids, writer, committee)
+		await writer.add("meeting", meeting_item(meeting, m_url, committee_id))
+
+		# Eltern vor Kindern in den Puffer: Sitzung, dann TOPs; der Writer hält die Reihenfolge
+		graph = await walk_meeting(meeting, m_url, objects)
+		for person in graph.persons:
+			if person["oparl_id"] not in seen_persons:
+				seen_persons.add(person["oparl_id"])
+				await writer.add("person", person)
+		for item in graph.agenda_items:
+			await writer.add("agenda_item", item)
+
+		# Documents: erst nach den TOPs, parallel untereinander; vorher ein Abgleich je Sitzung
+		files = []
+		for ref, agenda_item_id in graph.files:
+			if is_unchanged(ref, since) or file_url(ref) in seen_files:
+				continue
+			seen_files.add(file_url(ref))
+			files.append((ref, agenda_item_id))
+		await known.lookup(
+			[file_url(f) for f, _ in files],
+			[f.get("sha256Checksum", "") for f, _ in files if isinstance(f, dict)],
+		)
+		await crawler.map(ingest_file, files)
+
+	async def attempt(name: str, fn: Callable[[Any], Awaitable[None]], ref: Any) -> None:
+		# Ein Fehler (z. B. Sitzung nicht abrufbar) darf die übrigen Einträge nicht abbrechen
+		url = ref.get("id", "") if isinstance(ref, dict) else ref
+		try:
+			await fn(ref)
+		except Exception as e:
+			logger.warning("%s %s nicht importiert, wird erneut versucht: %s", name, url, e)
+			failed.append({"url": url, "error": str(e) or type(e).__name__})
+			checkpoint.fail(name, url)
+			return
+		checkpoint.succeed(name, url)
+
+	def tracked(name: str, fn: Callable[[Any], Awaitable[None]]) -> Callable[[Tuple[int, Any]], Awaitable[None]]:
+		async def run(entry: Tuple[int, Any]) -> None:
+			index, ref = entry
+			if not is_unchanged(ref, since):
+				await attempt(name, fn, ref)
+			checkpoint.mark(name, index)
+		return run
+
+	async def ingest_list(name: str, fn: Callable[[Any], Awaitable[None]], ref: Any) -> None:
+		# Im letzten Lauf fehlgeschlagene Einträge zuerst (per URL, daher ohne Delta-Filter)
+		await crawler.map(lambda url: attempt(name, fn, url), list(checkpoint.retry.get(name, [])))
+		# Seitenweise, damit nie die ganze Liste im Speicher liegt; Indizes laufen über Seiten weiter
+		offset = 0
+		async for page in iter_pages(ref, crawler, since):
+			await crawler.map(tracked(name, fn), checkpoint.pending(name, page, offset))
+			offset += len(page)
+
+	async def report_progress() -> None:
+		while True:
+			await asyncio.sleep(progress_interval())
+			# Stand vor dem Flush festhalten: alles bis dahin Erledigte ist danach im Backend.
+			# Scheitert der Flush, bleiben die Items gepuffert und `saved` auf dem alten Stand.
+			snapshot = checkpoint.as_dict()
+			try:
+				await writer.flush()
+				checkpoint.saved = snapshot
+				await on_progress({"cursor": snapshot, "stats": crawler.stats.as_dict()})
+			except Exception:
+				logger.exception("Fortschritt konnte nicht gemeldet werden")
+
+	# Körperschaften zuerst (wenige), damit Gremien beim Anlegen schon verknüpft werden können
+	reporter = asyncio.create_task(report_progress()) if on_progress else None
+	try:
+		await ingest_list("body", ingest_body, catalog.get("body", []))
+		await writer.flush()
+		for name, ref in await meeting_lists():
+			await ingest_list(name, ingest_meeting, ref)
+	finally:
+		if reporter is not None:
+			reporter.cancel()
+	await writer.flush()
+	checkpoint.saved = checkpoint.as_dict()
+
+	changes = {
+		"organizations": writer.changes.get("organization", 0),
+		"meetings": writer.changes.get("meeting", 0),
+		"agenda_items": writer.changes.get("agenda_item", 0),
+		"persons": writer.changes.get("person", 0),
+		"documents": writer.changes.get("document", 0),
+	}
+	return {
+		"status": "ok",
+		"changes": changes,
+		"skipped": skipped,
+		"errors": writer.errors,
+		"failed": failed,
+		"validators": validators,
+		"stats": {**crawler.stats.as_dict(), "hosts": crawler.hosts(), "extract": dict(get_extractor().stats)},
+	}
@@ -0,0 +1,182 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Pipeline-Stufen in Reihenfolge; jede Stufe ist eine eigene Queue
+STAGES = ["list", "fetch", "download", "extract", "upsert"]
+
+Handler = Callable[[Dict[str, Any]], Awaitable[None]]
+
+
+def max_retries() -> int:
+	return int(os.getenv("INGEST_QUEUE_MAX_RETRIES", "3"))
+
+
+class Broker:
+	"""Schnittstelle der Ingest-Queue: publish je Stufe, consume mit Prefetch-Limit.
+
+	Schlägt ein Handler fehl, wird die Nachricht bis zu INGEST_QUEUE_MAX_RETRIES mal
+	erneut eingestellt und danach in die Dead-Letter-Queue der Stufe verschoben; vorher
+	läuft `on_dead` (z. B. um gespoolte Dateien zu löschen).
+	"""
+
+	async def connect(self) -> None:
+		pass
+
+	async def close(self) -> None:
+		pass
+
+	async def publish(self, stage: str, message: Dict[str, Any]) -> None:
+		raise NotImplementedError
+
+	async def consume(self, stage: str, handler: Handler, prefetch: int, on_dead: Optional[Handler] = None) -> None:
+		raise NotImplementedError
+
+
+class MemoryBroker(Broker):
+	"""In-Prozess-Ersatz für Tests und lokale Läufe ohne RabbitMQ."""
+
+	def __init__(self, maxsize: int = 0):
+		self.queues: Dict[str, asyncio.Queue] = {stage: asyncio.Queue(maxsize) for stage in STAGES}
+		self.dead: Dict[str, List[Dict[str, Any]]] = {stage: [] for stage in STAGES}
+
+	async def publish(self, stage: str, message: Dict[str, Any]) -> None:
+		await self.queues[stage].put((message, 0))
+
+	async def consume(self, stage: str, handler: Handler, prefetch: int, on_dead: Optional[Handler] = None) -> None:
+		queue = self.queues[stage]
+		slots = asyncio.Semaphore(prefetch)
+
+		async def handle(message: Dict[str, Any], retries: int) -> None:
+			try:
+				await handler(message)
+			except Exception:
+				logger.exception("Stufe %s: Nachricht fehlgeschlagen", stage)
+				if retries < max_retries():
+					await queue.put((message, retries + 1))
+				else:
+					await dead_letter(stage, message, on_dead)
+					self.dead[stage].append(message)
+			finally:
+				queue.task_done()
+				slots.release()
+
+		while True:
+			await slots.acquire()
+			message, retries = await queue.get()
+			asyncio.create_task(handle(message, retries))
+
+	async def join(self) -> None:
+		"""Wartet, bis alle Stufen leer sind.
+
+		Eine Nachricht erzeugt nur Folgenachrichten ihrer eigenen oder späterer Stufen und
+		wird erst danach bestätigt – ein Durchlauf in Stufenreihenfolge genügt daher.
+		"""
+		for stage in STAGES:
+			await self.queues[stage].join()
+
+
+class RabbitBroker(Broker):
+	"""RabbitMQ via aio-pika: dauerhafte Queues je Stufe mit Dead-Letter-Exchange."""
+
+	exchange_name = "mandari.ingest"
+	dlx_name = "mandari.ingest.dlx"
+
+	def __init__(self, url: Optional[str] = None):
+		self.url = url or rabbitmq_url()
+		self._connection = None
+		self._channel = None
+		self._exchange = None
+
+	async def connect(self) -> None:
+		import aio_pika
+
+		self._connection = await aio_pika.connect_robust(self.url)
+		self._channel = await self._connection.channel(publisher_confirms=True)
+		self._exchange = await self._channel.declare_exchange(self.exchange_name, aio_pika.ExchangeType.DIRECT, durable=True)
+		dlx = await self._channel.declare_exchange(self.dlx_name, aio_pika.ExchangeType.DIRECT, durable=True)
+		for stage in STAGES:
+			queue = await self._channel.declare_queue(
+				f"{self.exchange_name}.{stage}",
+				durable=True,
+				arguments={"x-dead-letter-exchange": self.dlx_name, "x-dead-letter-routing-key": stage},
+			)
+			await queue.bind(self._exchange, routing_key=stage)
+			dead = await self._channel.declare_queue(f"{self.exchange_name}.{stage}.dead", durable=True)
+			await dead.bind(dlx, routing_key=stage)
+
+	async def close(self) -> None:
+		if self._connection is not None:
+			await self._connection.close()
+			self._connection = None
+
+	async def publish(self, stage: str, message: Dict[str, Any], retries: int = 0) -> None:
+		import aio_pika
+
+		await self._exchange.publish(
+			aio_pika.Message(
+				json.dumps(message).encode("utf-8"),
+				content_type="application/json",
+				delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
+				headers={"x-retries": retries},
+			),
+			routing_key=stage,
+		)
+
+	async def consume(self, stage: str, handler: Handler, prefetch: int, on_dead: Optional[Handler] = None) -> None:
+		# Eigener Channel je Stufe, damit das Prefetch-Limit (Backpressure) pro Stufe gilt
+		channel = await self._connection.channel()
+		await channel.set_qos(prefetch_count=prefetch)
+		queue = await channel.get_queue(f"{self.exchange_name}.{stage}", ensure=False)
+
+		async def handle(message) -> None:
+			retries = int((message.headers or {}).get("x-retries", 0))
+			try:
+				await handler(json.loads(message.body))
+			except Exception:
+				logger.exception("Stufe %s: Nachricht fehlgeschlagen", stage)
+				if retries < max_retries():
+					await self.publish(stage, json.loads(message.body), retries=retries + 1)
+					await message.ack()
+				else:
+					await dead_letter(stage, json.loads(message.body), on_dead)
+					# reject ohne requeue -> Dead-Letter-Exchange
+					await message.reject(requeue=False)
+				return
+			await message.ack()
+
+		tasks = set()
+		async with queue.iterator() as it:
+			async for message in it:
+				task = asyncio.create_task(handle(message))
+				tasks.add(task)
+				task.add_done_callback(tasks.discard)
+
+
+async def dead_letter(stage: str, message: Dict[str, Any], on_dead: Optional[Handler]) -> None:
+	if on_dead is None:
+		return
+	try:
+		await on_dead(message)
+	except Exception:
+		logger.exception("Stufe %s: Aufräumen vor Dead-Letter fehlgeschlagen", stage)
+
+
+def rabbitmq_url() -> str:
+	user = os.getenv("RABBITMQ_USER", "guest")
+	password = os.getenv("RABBITMQ_PASSWORD", "guest")
+	host = os.getenv("RABBITMQ_HOST", "rabbitmq")
+	port = os.getenv("RABBITMQ_PORT", "5672")
+	return os.getenv("RABBITMQ_URL", f"amqp://{user}:{password}@{host}:{port}/")
+
+
+def create_broker() -> Broker:
+	if os.getenv("INGEST_BROKER", "rabbitmq") == "memory":
+		return MemoryBroker()
+	return RabbitBroker()
@@ -0,0 +1,224 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from .backend import BackendWriter, IdMap, KnownFiles, backend_rates
+from .crawl import Crawler
+from .download import Download, download_file
+from .extract import get_extractor
+from .pipeline import (
+	ObjectCache,
+	document_item,
+	fetch_json,
+	file_url,
+	is_unchanged,
+	meeting_committee,
+	meeting_item,
+	organization_item,
+	parse_timestamp,
+	resolve_committee,
+	walk_meeting,
+)
+from .queue import Broker
+
+logger = logging.getLogger(__name__)
+
+
+class TenantState:
+	def __init__(self, tenant_id: int, crawler: Crawler):
+		self.ids = IdMap()
+		self.writer = BackendWriter(tenant_id, crawler, ids=self.ids)
+		self.known = KnownFiles(tenant_id, crawler)
+		self.primed = False
+		self.lock = asyncio.Lock()
+
+
+class UpsertBatcher:
+	"""Sammelt Upsert-Nachrichten je Mandant zu Bulk-Requests.
+
+	Jeder Handler wartet, bis sein Item geschrieben ist – erst dann wird die Nachricht
+	bestätigt. Ein Batch geht raus, wenn er voll ist oder nach `linger` Sekunden.
+	`add` liefert False, wenn das Backend das Item abgelehnt hat.
+	"""
+
+	def __init__(self, stage: "StageContext", batch_size: int, linger: float):
+		self.stage = stage
+		self.batch_size = batch_size
+		self.linger = linger
+		self._pending: Dict[int, List[Tuple[Dict[str, Any], asyncio.Future]]] = {}
+		self._timers: Dict[int, asyncio.TimerHandle] = {}
+
+	async def add(self, tenant_id: int, entity: str, item: Dict[str, Any]) -> bool:
+		future: asyncio.Future = asyncio.get_running_loop().create_future()
+		pending = self._pending.setdefault(tenant_id, [])
+		pending.append(({"type": entity, **item}, future))
+		if len(pending) >= self.batch_size:
+			asyncio.create_task(self.flush(tenant_id))
+		elif tenant_id not in self._timers:
+			self._timers[tenant_id] = asyncio.get_running_loop().call_later(
+				self.linger, lambda: asyncio.create_task(self.flush(tenant_id))
+			)
+		return await future
+
+	async def flush(self, tenant_id: int) -> None:
+		timer = self._timers.pop(tenant_id, None)
+		if timer is not None:
+			timer.cancel()
+		batch = self._pending.pop(tenant_id, [])
+		if not batch:
+			return
+		state = await self.stage.tenant(tenant_id)
+		try:
+			results = await state.writer.write([item for item, _ in batch])
+		except Exception as e:
+			for _, future in batch:
+				if not future.done():
+					future.set_exception(e)
+			return
+		# Validierungsfehler sind endgültig; erneutes Zustellen würde nicht helfen
+		for err in state.writer.errors:
+			logger.warning("Upsert abgelehnt (Mandant %s): %s", tenant_id, err)
+		state.writer.errors.clear()
+		written = {res["index"] for res in results}
+		for index, (_, future) in enumerate(batch):
+			if not future.done():
+				future.set_result(index in written)
+
+
+class StageContext:
+	"""Zustand eines Worker-Prozesses: Crawler-Limits, Broker und je Mandant Caches."""
+
+	def __init__(self, broker: Broker, crawler: Optional[Crawler] = None):
+		self.broker = broker
+		self.crawler = crawler or Crawler(rates=backend_rates())
+		self._tenants: Dict[int, TenantState] = {}
+		self.batcher = UpsertBatcher(
+			self,
+			batch_size=int(os.getenv("INGEST_BULK_BATCH_SIZE", "200")),
+			linger=float(os.getenv("INGEST_QUEUE_LINGER", "1.0")),
+		)
+
+	async def tenant(self, tenant_id: int) -> TenantState:
+		state = self._tenants.get(tenant_id)
+		if state is None:
+			state = self._tenants[tenant_id] = TenantState(tenant_id, self.crawler)
+		if not state.primed:
+			async with state.lock:
+				if not state.primed:
+					await state.ids.prime(tenant_id, self.crawler)
+					state.primed = True
+		return state
+
+	async def publish_list(self, tenant_id: int, kind: str, ref: Any, since: Optional[str]) -> None:
+		"""Paginierte Liste (URL) als List-Nachricht, eingebettete Einträge direkt als Fetch-Nachrichten."""
+		if isinstance(ref, str):
+			await self.broker.publish("list", {"tenant_id": tenant_id, "kind": kind, "url": ref, "since": since})
+			return
+		for item in ref or []:
+			await self.broker.publish("fetch", {"tenant_id": tenant_id, "kind": kind, "ref": item, "since": since})
+
+	async def handle_list(self, msg: Dict[str, Any]) -> None:
+		"""Katalog oder Liste lesen und die Einträge als Fetch-Nachrichten einstellen."""
+		tenant_id, since = msg["tenant_id"], msg.get("since")
+		if msg.get("kind") == "catalog":
+			catalog = await fetch_json(msg["url"], self.crawler)
+			for kind in ("body", "meeting"):
+				await self.publish_list(tenant_id, kind, catalog.get(kind, []), since)
+			return
+		# Folgeseiten: modified_since steckt bereits in der next-URL. Körperschaften ungefiltert,
+		# weil auch eine unveränderte Körperschaft neue Sitzungen haben kann (handle_fetch).
+		delta = since and not msg.get("next") and msg["kind"] != "body"
+		params = {"modified_since": since} if delta else None
+		page = await fetch_json(msg["url"], self.crawler, params=params)
+		for item in page.get("data", []):
+			await self.broker.publish("fetch", {"tenant_id": tenant_id, "kind": msg["kind"], "ref": item, "since": since})
+		next_url = (page.get("links") or {}).get("next")
+		if next_url:
+			# `since` weiterreichen, sonst filtert is_unchanged ab Seite 2 nichts mehr
+			await self.broker.publish("list", {**msg, "url": next_url, "next": True})
+
+	async def handle_fetch(self, msg: Dict[str, Any]) -> None:
+		tenant_id, ref = msg["tenant_id"], msg["ref"]
+		since = parse_timestamp(msg.get("since"))
+		url = ref.get("id", "") if isinstance(ref, dict) else ref
+		obj = ref if isinstance(ref, dict) else await fetch_json(url, self.crawler)
+		if msg["kind"] == "body":
+			# OParl 1.1: Sitzungen hängen an der Körperschaft; ihre Liste filtert selbst nach `since`
+			await self.publish_list(tenant_id, "meeting", obj.get("meeting"), msg.get("since"))
+			if not is_unchanged(obj, since):
+				await self.broker.publish("upsert", {"tenant_id": tenant_id, "type": "organization", "item": organization_item(obj, url)})
+			return
+		if is_unchanged(obj, since):
+			return
+		state = await self.tenant(tenant_id)
+		objects = ObjectCache(self.crawler)
+		committee_id = await resolve_committee(state.ids, state.writer, await objects.get(meeting_committee(obj)))
+		graph = await walk_meeting(obj, url, objects)
+		# Eltern vor Kindern einstellen; der Batcher schreibt in Eingangsreihenfolge
+		upserts = [("meeting", meeting_item(obj, url, committee_id))]
+		upserts += [("person", item) for item in graph.persons]
+		upserts += [("agenda_item", item) for item in graph.agenda_items]
+		for entity, item in upserts:
+			await self.broker.publish("upsert", {"tenant_id": tenant_id, "type": entity, "item": item})
+		files = [(f, agenda_item_id) for f, agenda_item_id in graph.files if not is_unchanged(f, since)]
+		await state.known.lookup(
+			[file_url(f) for f, _ in files],
+			[f.get("sha256Checksum", "") for f, _ in files if isinstance(f, dict)],
+		)
+		for f, agenda_item_id in files:
+			checksum = f.get("sha256Checksum", "") if isinstance(f, dict) else ""
+			if not state.known.is_known(file_url(f), checksum):
+				await self.broker.publish(
+					"download",
+					{"tenant_id": tenant_id, "url": file_url(f), "file": f, "agenda_item": agenda_item_id},
+				)
+
+	async def handle_download(self, msg: Dict[str, Any]) -> None:
+		"""Datei in den Spool laden; bei Skalierung über Knoten muss INGEST_SPOOL_DIR geteilt sein."""
+		tenant_id, url = msg["tenant_id"], msg["url"]
+		state = await self.tenant(tenant_id)
+		download = await download_file(url, self.crawler, headers=state.known.conditional_headers(url))
+		if download is None:
+			return
+		# Als bekannt gilt ein Hash erst nach dem Upsert (handle_upsert); bis dahin kann er erneut kommen
+		if download.sha256 in state.known.hashes:
+			download.cleanup()
+			return
+		await self.broker.publish("extract", {**msg, "download": download.__dict__})
+
+	async def handle_extract(self, msg: Dict[str, Any]) -> None:
+		# Die Spool-Datei bleibt bis zum Erfolg liegen, damit eine erneute Zustellung sie noch findet
+		download = Download(**msg["download"])
+		extraction = await get_extractor().extract(download.path, download.sha256)
+		item = document_item(msg["url"], download, extraction, msg.get("file"), msg.get("agenda_item", ""))
+		await self.broker.publish("upsert", {"tenant_id": msg["tenant_id"], "type": "document", "item": item})
+		download.cleanup()
+
+	async def drop_extract(self, msg: Dict[str, Any]) -> None:
+		"""Dead-Letter der Extract-Stufe: die Spool-Datei wird nicht mehr gebraucht."""
+		Download(**msg["download"]).cleanup()
+
+	async def handle_upsert(self, msg: Dict[str, Any]) -> None:
+		written = await self.batcher.add(msg["tenant_id"], msg["type"], msg["item"])
+		if written and msg["type"] == "document":
+			state = await self.tenant(msg["tenant_id"])
+			state.known.hashes.add(msg["item"]["content_hash"])
+
+	def handlers(self) -> Dict[str, Callable[[Dict[str, Any]], Awaitable[None]]]:
+		return {
+			"list": self.handle_list,
+			"fetch": self.handle_fetch,
+			"download": self.handle_download,
+			"extract": self.handle_extract,
+			"upsert": self.handle_upsert,
+		}
+
+	def dead_letter_handlers(self) -> Dict[str, Callable[[Dict[str, Any]], Awaitable[None]]]:
+		return {"extract": self.drop_extract}
+
+
+async def enqueue_source(broker: Broker, root: str, tenant_id: int, modified_since: Optional[str] = None) -> None:
+	await broker.publish("list", {"tenant_id": tenant_id, "kind": "catalog", "url": root, "since": modified_since})
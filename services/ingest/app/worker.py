@@ -0,0 +1,47 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+from typing import List
+
+from .client import close_client
+from .extract import close_extractor
+from .queue import STAGES, create_broker
+from .stages import StageContext
+
+# Standard-Prefetch je Stufe: Upsert braucht volle Batches, Extract ist CPU-gebunden
+DEFAULT_PREFETCH = {"list": 4, "fetch": 32, "download": 16, "extract": 8, "upsert": 400}
+
+
+async def run(stages: List[str], prefetch: int | None) -> None:
+	broker = create_broker()
+	await broker.connect()
+	context = StageContext(broker)
+	handlers = context.handlers()
+	dead = context.dead_letter_handlers()
+	try:
+		async with asyncio.TaskGroup() as tg:
+			for stage in stages:
+				tg.create_task(broker.consume(stage, handlers[stage], prefetch or DEFAULT_PREFETCH[stage], dead.get(stage)))
+	finally:
+		await broker.close()
+		await close_extractor()
+		await close_client()
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(description="Ingest-Worker für eine oder mehrere Queue-Stufen")
+	parser.add_argument("--stages", default=",".join(STAGES), help="Kommagetrennt, z. B. fetch,download")
+	parser.add_argument("--prefetch", type=int, default=None, help="Unbestätigte Nachrichten je Stufe")
+	args = parser.parse_args()
+	stages = [s.strip() for s in args.stages.split(",") if s.strip()]
+	unknown = set(stages) - set(STAGES)
+	if unknown:
+		parser.error(f"Unbekannte Stufen: {', '.join(sorted(unknown))}")
+	logging.basicConfig(level=logging.INFO)
+	asyncio.run(run(stages, args.prefetch))
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,47 @@
+import asyncio
+
+import httpx
+
+from app import client as client_module
+from app import pipeline
+from app.client import close_client, create_client, get_client
+
+
+def test_client_uses_pool_settings(monkeypatch):
+	monkeypatch.setenv("INGEST_HTTP2", "False")
+	monkeypatch.setenv("INGEST_HTTP_MAX_CONNECTIONS", "5")
+	monkeypatch.setenv("INGEST_HTTP_MAX_KEEPALIVE", "3")
+	monkeypatch.setenv("INGEST_HTTP_TIMEOUT", "12")
+	client = create_client()
+	try:
+		pool = client._transport._pool
+		assert (pool._max_connections, pool._max_keepalive_connections) == (5, 3)
+		assert client.timeout.read == 12
+		assert client.timeout.connect == 10
+	finally:
+		asyncio.run(client.aclose())
+
+
+def test_fetches_share_one_client_until_it_is_closed(monkeypatch):
+	created = []
+
+	def create() -> httpx.AsyncClient:
+		client = httpx.AsyncClient(transport=httpx.MockTransport(lambda r: httpx.Response(200, json={"url": str(r.url)})))
+		created.append(client)
+		return client
+
+	monkeypatch.setattr(client_module, "_client", None)
+	monkeypatch.setattr(client_module, "create_client", create)
+
+	async def main():
+		pages = await asyncio.gather(*(pipeline.fetch_json(f"https://oparl.test/{n}") for n in range(5)))
+		assert [p["url"] for p in pages] == [f"https://oparl.test/{n}" for n in range(5)]
+		assert len(created) == 1 and get_client() is created[0]
+		await close_client()
+		assert created[0].is_closed
+		# Außerhalb des Lifespans entsteht bei Bedarf ein neuer
+		await pipeline.fetch_json("https://oparl.test/again")
+		assert len(created) == 2
+		await close_client()
+
+	asyncio.run(main())
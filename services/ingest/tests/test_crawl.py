@@ -0,0 +1,172 @@
+import asyncio
+from datetime import datetime, timezone
+from email.utils import format_datetime
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+from app import client as client_module
+from app import crawl
+from app.crawl import Crawler, HostLimiter, RetryableStatus, backoff_delay, check_status, retry_after_seconds
+
+
+class FakeClock:
+	"""Ersetzt Uhr und asyncio.sleep im Modul crawl; Schlafen rückt nur die Uhr vor."""
+
+	def __init__(self):
+		self.now = 1000.0
+		self.sleeps = []
+
+	def monotonic(self) -> float:
+		return self.now
+
+	def time(self) -> float:
+		return 1_700_000_000.0 + self.now
+
+	async def sleep(self, seconds: float) -> None:
+		self.sleeps.append(round(seconds, 3))
+		self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+	fake = FakeClock()
+	monkeypatch.setattr(crawl, "time", SimpleNamespace(monotonic=fake.monotonic, time=fake.time))
+	monkeypatch.setattr(crawl, "asyncio", SimpleNamespace(**{**vars(asyncio), "sleep": fake.sleep}))
+	return fake
+
+
+def test_retry_after_accepts_seconds_and_http_dates(clock):
+	assert retry_after_seconds("3") == 3.0
+	assert retry_after_seconds("-5") == 0.0
+	in_ten = datetime.fromtimestamp(clock.time() + 10, tz=timezone.utc)
+	assert retry_after_seconds(format_datetime(in_ten, usegmt=True)) == pytest.approx(10, abs=1)
+	past = datetime.fromtimestamp(clock.time() - 60, tz=timezone.utc)
+	assert retry_after_seconds(format_datetime(past, usegmt=True)) == 0.0
+	assert retry_after_seconds("morgen") is None
+	assert retry_after_seconds(None) is None
+
+
+def test_check_status_marks_throttling_as_retryable():
+	request = httpx.Request("GET", "https://oparl.test/")
+	with pytest.raises(RetryableStatus) as e:
+		check_status(httpx.Response(429, headers={"Retry-After": "7"}, request=request))
+	assert (e.value.status, e.value.retry_after) == (429, 7.0)
+	assert check_status(httpx.Response(304, request=request)).status_code == 304
+	with pytest.raises(httpx.HTTPStatusError):
+		check_status(httpx.Response(404, request=request))
+
+
+def test_backoff_is_exponential_and_capped(monkeypatch):
+	monkeypatch.setattr(crawl.random, "uniform", lambda low, high: high)
+	assert [backoff_delay(n) for n in range(4)] == [0.5, 1.0, 2.0, 4.0]
+	assert backoff_delay(20) == 60.0
+	assert backoff_delay(3, base=1, cap=5) == 5
+
+
+def test_limit_grows_additively_and_halves_once_per_window(clock):
+	limiter = HostLimiter(rate=0, max_concurrency=4, target_latency=1.0)
+	assert limiter.limit == 2
+
+	async def request(latency: float, ok: bool = True) -> None:
+		await limiter.acquire()
+		clock.now += latency
+		await limiter.release(latency, ok)
+
+	async def main():
+		await request(0.1)
+		assert limiter.limit == 2.5
+		for _ in range(10):
+			await request(0.1)
+		assert limiter.limit == 4
+		# Fehler halbiert; ein zweiter im selben Latenzfenster nicht erneut
+		await request(0.1, ok=False)
+		assert limiter.limit == 2
+		await limiter.acquire()
+		await limiter.release(0.1, False)
+		assert limiter.limit == 2
+		clock.now += 1
+		await request(0.1, ok=False)
+		assert limiter.limit == 1
+		clock.now += 1
+		await request(0.1, ok=False)
+		assert limiter.limit == 1
+
+	asyncio.run(main())
+
+
+def test_high_latency_counts_as_overload(clock):
+	limiter = HostLimiter(rate=0, max_concurrency=8, target_latency=0.5)
+
+	async def main():
+		await limiter.acquire()
+		await limiter.release(2.0, True)
+
+	asyncio.run(main())
+	assert limiter.limit == 1
+
+
+def test_token_bucket_paces_requests_and_honours_retry_after(clock):
+	limiter = HostLimiter(rate=2, max_concurrency=8)
+
+	async def main():
+		for _ in range(4):
+			await limiter.acquire()
+			await limiter.release(0.01, True)
+		# Burst von zwei Anfragen, danach eine je halbe Sekunde
+		assert clock.sleeps == [0.5, 0.5]
+		await limiter.acquire()
+		await limiter.release(0.01, False, retry_after=5)
+		clock.sleeps.clear()
+		await limiter.acquire()
+		assert sum(clock.sleeps) >= 5
+
+	asyncio.run(main())
+
+
+def test_call_retries_throttled_requests_then_gives_up(clock, monkeypatch):
+	monkeypatch.setattr(crawl.random, "uniform", lambda low, high: high)
+	answers = iter([
+		httpx.Response(429, headers={"Retry-After": "3"}),
+		httpx.Response(503),
+		httpx.Response(200, json={"ok": True}),
+	])
+	monkeypatch.setattr(client_module, "_client", httpx.AsyncClient(transport=httpx.MockTransport(lambda r: next(answers))))
+	crawler = Crawler(rate=0, max_retries=2)
+
+	async def send() -> httpx.Response:
+		return check_status(await client_module.get_client().get("https://oparl.test/"))
+
+	assert asyncio.run(crawler.call("https://oparl.test/", send)).json() == {"ok": True}
+	# Retry-After hat Vorrang, sonst Backoff (Versuch 1: 0.5 * 2)
+	assert clock.sleeps == [3.0, 1.0]
+	assert crawler.stats.retries == 2
+
+	answers = iter([httpx.Response(503)] * 3)
+	with pytest.raises(RetryableStatus):
+		asyncio.run(crawler.call("https://oparl.test/", send))
+	assert crawler.stats.retries == 4
+
+
+def test_map_bounds_concurrency_globally_and_per_host():
+	crawler = Crawler(concurrency=3, per_host=2, rate=0)
+	running = {"all": 0, "a": 0, "b": 0}
+	peak = {"all": 0, "a": 0, "b": 0}
+
+	async def fetch(n: int) -> int:
+		host = "ab"[n % 2]
+		async with crawler.slot(f"https://{host}.test/{n}"):
+			for key in ("all", host):
+				running[key] += 1
+				peak[key] = max(peak[key], running[key])
+			await asyncio.sleep(0.01)
+			for key in ("all", host):
+				running[key] -= 1
+		return n
+
+	assert asyncio.run(crawler.map(fetch, range(12))) == list(range(12))
+	assert peak["all"] == 3
+	assert peak["a"] <= 2 and peak["b"] <= 2
+	assert crawler.stats.requests == 12
+	assert set(crawler.hosts()) == {"a.test", "b.test"}
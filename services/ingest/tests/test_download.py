@@ -0,0 +1,89 @@
+import asyncio
+import hashlib
+
+import httpx
+import pytest
+
+from app import client as client_module
+from app import crawl
+from app.crawl import Crawler
+from app.download import FileTooLarge, download_file
+
+PAYLOAD = b"%PDF-1.4 " + bytes(range(256)) * 1024
+
+
+class Chunks(httpx.AsyncByteStream):
+	"""Antwort ohne Content-Length; bricht optional nach dem ersten Block ab."""
+
+	def __init__(self, data: bytes, fail: bool = False):
+		self.data = data
+		self.fail = fail
+
+	async def __aiter__(self):
+		yield self.data[:1000]
+		if self.fail:
+			raise httpx.ReadError("Verbindung abgebrochen")
+		yield self.data[1000:]
+
+
+@pytest.fixture
+def spool(tmp_path, monkeypatch):
+	monkeypatch.setenv("INGEST_SPOOL_DIR", str(tmp_path))
+	monkeypatch.setattr(crawl.random, "uniform", lambda low, high: 0)
+	return tmp_path
+
+
+def serve(monkeypatch, handler):
+	monkeypatch.setattr(client_module, "_client", httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+
+
+def test_download_streams_to_spool_and_hashes(spool, monkeypatch):
+	serve(monkeypatch, lambda r: httpx.Response(200, stream=Chunks(PAYLOAD), headers={"Content-Type": "application/pdf", "ETag": '"v1"'}))
+	crawler = Crawler(rate=0)
+	download = asyncio.run(download_file("https://oparl.test/file.pdf", crawler))
+
+	assert download.sha256 == hashlib.sha256(PAYLOAD).hexdigest()
+	assert (download.size, download.content_type, download.etag) == (len(PAYLOAD), "application/pdf", '"v1"')
+	with open(download.path, "rb") as fh:
+		assert fh.read() == PAYLOAD
+	assert crawler.stats.bytes == len(PAYLOAD)
+	download.cleanup()
+	assert list(spool.iterdir()) == []
+
+
+def test_retry_restarts_file_and_hash(spool, monkeypatch):
+	answers = iter([Chunks(PAYLOAD, fail=True), Chunks(PAYLOAD)])
+	serve(monkeypatch, lambda r: httpx.Response(200, stream=next(answers)))
+	crawler = Crawler(rate=0)
+	download = asyncio.run(download_file("https://oparl.test/file.pdf", crawler))
+
+	assert crawler.stats.retries == 1
+	assert download.size == len(PAYLOAD)
+	assert download.sha256 == hashlib.sha256(PAYLOAD).hexdigest()
+	download.cleanup()
+
+
+@pytest.mark.parametrize("declared", [True, False])
+def test_too_large_files_are_aborted_and_removed(spool, monkeypatch, declared):
+	def handler(request):
+		if declared:
+			return httpx.Response(200, content=PAYLOAD)
+		return httpx.Response(200, stream=Chunks(PAYLOAD))
+
+	serve(monkeypatch, handler)
+	with pytest.raises(FileTooLarge):
+		asyncio.run(download_file("https://oparl.test/file.pdf", Crawler(rate=0), max_bytes=len(PAYLOAD) - 1))
+	assert list(spool.iterdir()) == []
+
+
+def test_not_modified_returns_none(spool, monkeypatch):
+	seen = []
+
+	def handler(request):
+		seen.append(request.headers.get("If-None-Match"))
+		return httpx.Response(304)
+
+	serve(monkeypatch, handler)
+	assert asyncio.run(download_file("https://oparl.test/file.pdf", Crawler(rate=0), headers={"If-None-Match": '"v1"'})) is None
+	assert seen == ['"v1"']
+	assert list(spool.iterdir()) == []
@@ -0,0 +1,102 @@
+import asyncio
+import shutil
+
+import pytest
+from PIL import Image, ImageDraw, ImageFont
+
+from app.extract import ExtractionStage
+
+TEXT = "Einladung zur Sitzung des Rates"
+
+
+@pytest.fixture
+def scanned_pdf(tmp_path):
+	"""PDF ohne Textebene: eine Seite, die nur aus einem Bild mit Text besteht."""
+	image = Image.new("RGB", (1700, 400), "white")
+	draw = ImageDraw.Draw(image)
+	try:
+		font = ImageFont.load_default(size=64)
+	except TypeError:
+		font = ImageFont.load_default()
+	draw.text((60, 150), TEXT, fill="black", font=font)
+	path = tmp_path / "scan.pdf"
+	image.save(path, "PDF", resolution=200)
+	return str(path)
+
+
+@pytest.fixture
+def ocr_env(monkeypatch, tmp_path):
+	monkeypatch.setenv("INGEST_OCR_CACHE_DIR", str(tmp_path / "ocr"))
+	monkeypatch.setenv("INGEST_OCR_LANG", "eng")
+	monkeypatch.setenv("INGEST_OCR_DPI", "150")
+
+
+def text_pdf(path, text: str) -> str:
+	"""Minimales PDF mit Textebene (Helvetica), ohne weitere Abhängigkeiten."""
+	stream = f"BT /F1 24 Tf 72 720 Td ({text}) Tj ET".encode("latin-1")
+	objects = [
+		b"<< /Type /Catalog /Pages 2 0 R >>",
+		b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+		b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents 4 0 R /Resources << /Font << /F1 5 0 R >> >> >>",
+		b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream",
+		b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+	]
+	out = bytearray(b"%PDF-1.4\n")
+	offsets = []
+	for number, body in enumerate(objects, start=1):
+		offsets.append(len(out))
+		out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+	xref = len(out)
+	out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+	out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+	out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+	path.write_bytes(bytes(out))
+	return str(path)
+
+
+async def extract(path: str, **kwargs):
+	stage = ExtractionStage(workers=1, timeout=30, max_memory_mb=0)
+	try:
+		return await stage.extract(path, **kwargs), stage.stats
+	finally:
+		await stage.close()
+
+
+def test_scan_without_ocr_yields_empty_text(scanned_pdf, ocr_env, monkeypatch):
+	monkeypatch.setenv("INGEST_OCR", "False")
+	result, stats = asyncio.run(extract(scanned_pdf))
+	assert result.text.strip() == ""
+	assert not result.ocr
+	assert stats["documents"] == 1
+
+
+@pytest.mark.skipif(not (shutil.which("tesseract") and shutil.which("pdftoppm")), reason="tesseract/poppler nicht installiert")
+def test_scan_falls_back_to_ocr(scanned_pdf, ocr_env):
+	result, stats = asyncio.run(extract(scanned_pdf, content_hash="scan"))
+	assert result.ocr
+	assert "Sitzung" in result.text
+	assert stats["ocr_pages"] == 1
+	assert result.meta()["ocr"]["pages"][0]["page"] == 1
+
+
+def test_pool_extracts_documents_in_parallel_and_survives_broken_files(tmp_path, ocr_env, monkeypatch):
+	monkeypatch.setenv("INGEST_OCR", "False")
+	paths = [text_pdf(tmp_path / f"{n}.pdf", f"Tagesordnung Punkt {n}") for n in range(4)]
+	broken = tmp_path / "kaputt.pdf"
+	broken.write_bytes(b"%PDF-1.4 kein PDF")
+
+	async def main():
+		stage = ExtractionStage(workers=2, timeout=30, max_memory_mb=0)
+		try:
+			results = await asyncio.gather(*(stage.extract(p) for p in paths + [str(broken)]))
+			# Nach der defekten Datei arbeitet der Pool weiter
+			again = await stage.extract(paths[0])
+			return results, again, stage.stats
+		finally:
+			await stage.close()
+
+	results, again, stats = asyncio.run(main())
+	assert [r.text.strip() for r in results[:4]] == [f"Tagesordnung Punkt {n}" for n in range(4)]
+	assert results[4].text == ""
+	assert again.text.strip() == "Tagesordnung Punkt 0"
+	assert stats["documents"] == 6
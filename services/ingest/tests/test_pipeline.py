@@ -0,0 +1,189 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from app import client as client_module
+from app import jobs, pipeline
+from app.backend import BackendWriter
+from app.crawl import Checkpoint, Crawler
+from app.pipeline import run_ingest
+
+
+def meeting(n):
+	return {
+		"id": f"https://oparl.test/meeting/{n}",
+		"start": "2026-10-01T18:00:00+02:00",
+		"organization": [{"id": "https://oparl.test/organization/1", "name": "Rat"}],
+	}
+
+
+class FakeServer:
+	"""Katalog mit zwei Sitzungen, `system11` mit Sitzungen je Körperschaft, `embedded` ohne Listen-URLs.
+
+	`broken` antwortet mit 404, `bulk_down` lässt Bulk-Requests scheitern.
+	"""
+
+	def __init__(self):
+		self.broken = {"https://oparl.test/meeting/2"}
+		self.bulk = []
+		self.bulk_down = False
+		self.requests = []
+
+	def __call__(self, request: httpx.Request) -> httpx.Response:
+		self.requests.append(request)
+		url = str(request.url).split("?")[0]
+		# Alle Kataloge tragen das ETag "v1"
+		if url.startswith("https://oparl.test/system") or url == "https://oparl.test/embedded":
+			if request.headers.get("If-None-Match") == '"v1"':
+				return httpx.Response(304, headers={"ETag": '"v1"'})
+		if url == "https://oparl.test/embedded":
+			old = {**meeting(4), "modified": "2020-01-01T00:00:00+00:00"}
+			return httpx.Response(200, json={"body": [], "meeting": [meeting(3), old]}, headers={"ETag": '"v1"'})
+		if url == "https://oparl.test/system":
+			return httpx.Response(200, json={"body": [], "meeting": "https://oparl.test/meetings"})
+		if url == "https://oparl.test/meetings":
+			return httpx.Response(200, json={"data": ["https://oparl.test/meeting/1", "https://oparl.test/meeting/2"]})
+		# OParl 1.1: Sitzungen je Körperschaft, paginiert
+		if url == "https://oparl.test/system11":
+			return httpx.Response(200, json={"body": "https://oparl.test/bodies"})
+		if url == "https://oparl.test/bodies":
+			body = {"id": "https://oparl.test/body/1", "name": "Stadt", "meeting": "https://oparl.test/body/1/meetings"}
+			return httpx.Response(200, json={"data": [body]})
+		if url == "https://oparl.test/body/1/meetings":
+			next_url = "https://oparl.test/body/1/meetings/2"
+			return httpx.Response(200, json={"data": ["https://oparl.test/meeting/1"], "links": {"next": next_url}})
+		if url == "https://oparl.test/body/1/meetings/2":
+			return httpx.Response(200, json={"data": ["https://oparl.test/meeting/3"]})
+		if url.startswith("https://oparl.test/meeting/"):
+			if url in self.broken:
+				return httpx.Response(404)
+			return httpx.Response(200, json=meeting(url.rsplit("/", 1)[1]))
+		if url == "http://backend.test/api/committees/" and request.method == "POST":
+			if request.headers.get("Authorization") != "Bearer secret":
+				return httpx.Response(403)
+			return httpx.Response(201, json={"id": 7})
+		if url.startswith("http://backend.test/api/") and request.method == "GET":
+			return httpx.Response(200, json=[])
+		if url == "http://backend.test/api/documents/known/":
+			return httpx.Response(200, json={"files": {}, "content_hashes": []})
+		if url == "http://backend.test/api/ingest/bulk/":
+			if request.headers.get("Authorization") != "Bearer secret":
+				return httpx.Response(403)
+			if self.bulk_down:
+				return httpx.Response(500)
+			items = json.loads(request.content)["items"]
+			self.bulk.extend(items)
+			results = [{"index": i, "type": item["type"], "id": 100 + i, "oparl_id": item["oparl_id"]} for i, item in enumerate(items)]
+			return httpx.Response(200, json={"results": results, "errors": [], "counts": {}})
+		return httpx.Response(404)
+
+
+class FakeExtractor:
+	stats = {}
+
+
+@pytest.fixture
+def server(monkeypatch):
+	monkeypatch.setenv("BACKEND_BASE_URL", "http://backend.test/api")
+	monkeypatch.setenv("INGEST_SERVICE_TOKEN", "secret")
+	fake = FakeServer()
+	monkeypatch.setattr(client_module, "_client", httpx.AsyncClient(transport=httpx.MockTransport(fake)))
+	monkeypatch.setattr(pipeline, "get_extractor", lambda: FakeExtractor())
+	return fake
+
+
+def test_failed_meeting_does_not_stop_the_run_and_is_retried(server):
+	checkpoint = Checkpoint()
+	result = asyncio.run(run_ingest("https://oparl.test/system", 1, checkpoint=checkpoint))
+
+	# Sitzung 1 ist geschrieben, Sitzung 2 gemeldet und zum Nachholen vorgemerkt
+	assert [item["oparl_id"] for item in server.bulk if item["type"] == "meeting"] == ["https://oparl.test/meeting/1"]
+	assert [f["url"] for f in result["failed"]] == ["https://oparl.test/meeting/2"]
+	cursor = checkpoint.as_dict()
+	assert cursor == {"done": {"meeting": 2}, "retry": {"meeting": ["https://oparl.test/meeting/2"]}}
+
+	# Fortsetzen ab dem Checkpoint: nur die fehlgeschlagene Sitzung wird erneut geholt
+	server.broken.clear()
+	server.bulk.clear()
+	resumed = Checkpoint(cursor)
+	result = asyncio.run(run_ingest("https://oparl.test/system", 1, checkpoint=resumed))
+	assert [item["oparl_id"] for item in server.bulk if item["type"] == "meeting"] == ["https://oparl.test/meeting/2"]
+	assert result["failed"] == []
+	assert resumed.as_dict() == {"done": {"meeting": 2}}
+
+
+def test_not_modified_catalog_still_syncs_its_lists(server):
+	server.broken.clear()
+	since = "2026-01-01T00:00:00+00:00"
+	result = asyncio.run(run_ingest("https://oparl.test/system", 1, etag='"v1"', modified_since=since))
+
+	# Neue Sitzungen ändern die Listen-URL, nicht das System-Objekt: der Lauf geht weiter, als Delta
+	assert result["status"] == "ok"
+	assert result["validators"]["etag"] == '"v1"'
+	lists = [r for r in server.requests if r.url.path == "/meetings"]
+	assert [r.url.params.get("modified_since") for r in lists] == [since]
+	assert len([item for item in server.bulk if item["type"] == "meeting"]) == 2
+
+
+def test_not_modified_embedded_catalog_is_skipped_unless_retries_are_pending(server):
+	result = asyncio.run(run_ingest("https://oparl.test/embedded", 1, etag='"v1"'))
+	assert result["status"] == "not_modified"
+	assert server.bulk == []
+
+	checkpoint = Checkpoint({"done": {"meeting": 2}, "retry": {"meeting": ["https://oparl.test/meeting/1"]}})
+	result = asyncio.run(run_ingest("https://oparl.test/embedded", 1, etag='"v1"', checkpoint=checkpoint))
+	assert result["status"] == "ok"
+	assert [item["oparl_id"] for item in server.bulk if item["type"] == "meeting"] == ["https://oparl.test/meeting/1"]
+	assert checkpoint.as_dict() == {"done": {"meeting": 2}}
+
+
+def test_embedded_meetings_are_filtered_by_modified(server):
+	result = asyncio.run(run_ingest("https://oparl.test/embedded", 1, modified_since="2025-01-01T00:00:00+00:00"))
+	assert result["validators"]["etag"] == '"v1"'
+	# Sitzung 4 ist seit modified_since unverändert
+	assert [item["oparl_id"] for item in server.bulk if item["type"] == "meeting"] == ["https://oparl.test/meeting/3"]
+
+
+def test_meetings_are_read_from_each_body(server):
+	checkpoint = Checkpoint()
+	result = asyncio.run(run_ingest("https://oparl.test/system11", 1, checkpoint=checkpoint))
+
+	assert result["failed"] == []
+	assert [item["oparl_id"] for item in server.bulk if item["type"] == "organization"] == ["https://oparl.test/body/1"]
+	meetings = [item["oparl_id"] for item in server.bulk if item["type"] == "meeting"]
+	assert meetings == ["https://oparl.test/meeting/1", "https://oparl.test/meeting/3"]
+	assert checkpoint.as_dict() == {"done": {"body": 1, "meeting@https://oparl.test/body/1": 2}}
+
+
+def test_failed_flush_keeps_items_buffered(server):
+	async def main():
+		writer = BackendWriter(1, Crawler())
+		await writer.add("meeting", {"oparl_id": "m1"})
+		server.bulk_down = True
+		with pytest.raises(httpx.HTTPStatusError):
+			await writer.flush()
+		await writer.add("agenda_item", {"oparl_id": "t1", "meeting": "m1"})
+		server.bulk_down = False
+		await writer.flush()
+
+	asyncio.run(main())
+	assert [item["oparl_id"] for item in server.bulk] == ["m1", "t1"]
+
+
+def test_failed_job_reports_only_the_written_cursor(server, monkeypatch):
+	reports = []
+
+	async def report(job_id, data):
+		reports.append(data)
+
+	monkeypatch.setattr(jobs, "report", report)
+	server.broken.clear()
+	server.bulk_down = True
+	params = {"root": "https://oparl.test/system", "tenant_id": 1, "cursor": {"done": {"body": 0}}}
+	asyncio.run(jobs.run_job(1, params))
+
+	# Beide Sitzungen sind abgearbeitet, aber nie im Backend angekommen: der alte Stand bleibt
+	assert reports[-1]["status"] == "failed"
+	assert reports[-1]["cursor"] == {"done": {"body": 0}}
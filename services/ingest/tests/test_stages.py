@@ -0,0 +1,188 @@
+import asyncio
+import hashlib
+import json
+import os
+from typing import Any, Dict, Optional
+
+import httpx
+import pytest
+
+from app import client as client_module
+from app import stages
+from app.extract import Extraction
+from app.queue import STAGES, MemoryBroker
+from app.stages import StageContext
+
+GOOD = b"%PDF-1.4 Einladung"
+BROKEN = b"%PDF-1.4 kaputt"
+
+MEETING = {
+	"id": "https://oparl.test/meeting/1",
+	"start": "2026-10-01T18:00:00+02:00",
+	"organization": [{"id": "https://oparl.test/organization/1", "name": "Rat"}],
+	"invitation": {"id": "https://oparl.test/file/1", "accessUrl": "https://oparl.test/files/1.pdf"},
+	"auxiliaryFile": [{"id": "https://oparl.test/file/2", "accessUrl": "https://oparl.test/files/2.pdf"}],
+}
+
+
+def paged_meeting(n, modified):
+	return {
+		"id": f"https://oparl.test/meeting/{n}",
+		"start": "2026-10-01T18:00:00+02:00",
+		"modified": modified,
+		"organization": [{"id": "https://oparl.test/organization/1", "name": "Rat"}],
+	}
+
+
+class FakeServer:
+	"""OParl-Quelle und Backend; der erste Bulk-Request mit einem Dokument schlägt fehl.
+
+	`/paged` ist eine zweiseitige Liste, deren zweite Seite eine unveränderte Sitzung enthält;
+	`/bodies` führt sie als Sitzungsliste einer Körperschaft.
+	"""
+
+	def __init__(self):
+		self.bulk = []
+		self.failed_bulk = False
+		self.requests = []
+
+	def __call__(self, request: httpx.Request) -> httpx.Response:
+		self.requests.append(request)
+		url = str(request.url).split("?")[0]
+		if url == "https://oparl.test/meetings":
+			return httpx.Response(200, json={"data": [MEETING], "links": {}})
+		if url == "https://oparl.test/bodies":
+			body = {"id": "https://oparl.test/body/1", "name": "Stadt", "meeting": "https://oparl.test/paged"}
+			return httpx.Response(200, json={"data": [body]})
+		if url == "https://oparl.test/paged":
+			data = [paged_meeting(3, "2026-09-01T00:00:00+00:00")]
+			return httpx.Response(200, json={"data": data, "links": {"next": "https://oparl.test/paged/2?modified_since=x"}})
+		if url == "https://oparl.test/paged/2":
+			return httpx.Response(200, json={"data": [paged_meeting(4, "2020-01-01T00:00:00+00:00")], "links": {}})
+		if url == "https://oparl.test/files/1.pdf":
+			return httpx.Response(200, content=GOOD, headers={"Content-Type": "application/pdf"})
+		if url == "https://oparl.test/files/2.pdf":
+			return httpx.Response(200, content=BROKEN, headers={"Content-Type": "application/pdf"})
+		if url == "http://backend.test/api/committees/" and request.method == "POST":
+			if request.headers.get("Authorization") != "Bearer secret":
+				return httpx.Response(403)
+			return httpx.Response(201, json={"id": 7})
+		if url.startswith("http://backend.test/api/") and request.method == "GET":
+			return httpx.Response(200, json=[])
+		if url == "http://backend.test/api/documents/known/":
+			return httpx.Response(200, json={"files": {}, "content_hashes": []})
+		if url == "http://backend.test/api/ingest/bulk/":
+			if request.headers.get("Authorization") != "Bearer secret":
+				return httpx.Response(403)
+			items = json.loads(request.content)["items"]
+			if not self.failed_bulk and any(item["type"] == "document" for item in items):
+				self.failed_bulk = True
+				return httpx.Response(500)
+			self.bulk.extend(items)
+			results = [{"index": i, "type": item["type"], "id": 100 + i, "oparl_id": item["oparl_id"]} for i, item in enumerate(items)]
+			return httpx.Response(200, json={"results": results, "errors": [], "counts": {}})
+		return httpx.Response(404)
+
+
+class FakeExtractor:
+	"""Merkt sich je Versuch, ob die Spool-Datei noch da war; kaputte PDFs schlagen immer fehl."""
+
+	def __init__(self):
+		self.attempts = []
+
+	async def extract(self, path: str, content_hash: str = "") -> Extraction:
+		self.attempts.append((path, os.path.exists(path)))
+		with open(path, "rb") as fh:
+			if fh.read() == BROKEN:
+				raise RuntimeError("defektes PDF")
+		return Extraction(text="Einladung zur Sitzung")
+
+
+@pytest.fixture
+def env(monkeypatch, tmp_path):
+	monkeypatch.setenv("BACKEND_BASE_URL", "http://backend.test/api")
+	monkeypatch.setenv("INGEST_SERVICE_TOKEN", "secret")
+	monkeypatch.setenv("INGEST_QUEUE_MAX_RETRIES", "2")
+	monkeypatch.setenv("INGEST_QUEUE_LINGER", "0.01")
+	monkeypatch.setenv("INGEST_SPOOL_DIR", str(tmp_path))
+	server = FakeServer()
+	extractor = FakeExtractor()
+	monkeypatch.setattr(client_module, "_client", httpx.AsyncClient(transport=httpx.MockTransport(server)))
+	monkeypatch.setattr(stages, "get_extractor", lambda: extractor)
+	return server, extractor, tmp_path
+
+
+async def run_pipeline(broker: MemoryBroker, context: StageContext, message: Optional[Dict[str, Any]] = None) -> None:
+	handlers = context.handlers()
+	dead = context.dead_letter_handlers()
+	consumers = [asyncio.create_task(broker.consume(stage, handlers[stage], 8, dead.get(stage))) for stage in STAGES]
+	try:
+		await broker.publish("list", message or {"tenant_id": 1, "kind": "meeting", "url": "https://oparl.test/meetings"})
+		await asyncio.wait_for(broker.join(), timeout=10)
+	finally:
+		for task in consumers:
+			task.cancel()
+		await asyncio.gather(*consumers, return_exceptions=True)
+
+
+def test_pipeline_retries_and_dead_letters(env):
+	server, extractor, spool = env
+
+	async def main():
+		broker = MemoryBroker()
+		context = StageContext(broker)
+		await run_pipeline(broker, context)
+		return broker, await context.tenant(1)
+
+	broker, state = asyncio.run(main())
+
+	# Gutes Dokument: nach dem fehlgeschlagenen Bulk-Request erneut zugestellt und geschrieben
+	documents = [item for item in server.bulk if item["type"] == "document"]
+	assert [d["oparl_id"] for d in documents] == ["https://oparl.test/files/1.pdf"]
+	assert documents[0]["content_text"] == "Einladung zur Sitzung"
+	assert server.failed_bulk
+	assert any(item["type"] == "meeting" for item in server.bulk)
+	# Erst nach dem Upsert als bekannt geführt – das defekte PDF nicht
+	assert state.known.hashes == {hashlib.sha256(GOOD).hexdigest()}
+
+	# Defektes PDF: jeder Versuch fand die Spool-Datei, danach Dead-Letter
+	assert len(extractor.attempts) == 1 + 3
+	assert all(exists for _, exists in extractor.attempts)
+	assert [m["url"] for m in broker.dead["extract"]] == ["https://oparl.test/files/2.pdf"]
+	assert not broker.dead["upsert"]
+	# Erfolgreich verarbeitete und aufgegebene Dateien sind aufgeräumt
+	assert os.listdir(spool) == []
+
+
+def test_next_page_keeps_the_delta_filter(env):
+	server, _, _ = env
+	message = {"tenant_id": 1, "kind": "meeting", "url": "https://oparl.test/paged", "since": "2025-01-01T00:00:00+00:00"}
+
+	async def main():
+		broker = MemoryBroker()
+		await run_pipeline(broker, StageContext(broker), message)
+
+	asyncio.run(main())
+	# Seite 2 liefert eine seit `since` unveränderte Sitzung: sie wird nicht geschrieben
+	meetings = [item["oparl_id"] for item in server.bulk if item["type"] == "meeting"]
+	assert meetings == ["https://oparl.test/meeting/3"]
+	pages = [str(r.url) for r in server.requests if r.url.path.startswith("/paged")]
+	assert pages == [
+		"https://oparl.test/paged?modified_since=2025-01-01T00%3A00%3A00%2B00%3A00",
+		"https://oparl.test/paged/2?modified_since=x",
+	]
+
+
+def test_meetings_are_listed_per_body(env):
+	server, _, _ = env
+	message = {"tenant_id": 1, "kind": "body", "url": "https://oparl.test/bodies", "since": "2025-01-01T00:00:00+00:00"}
+
+	async def main():
+		broker = MemoryBroker()
+		await run_pipeline(broker, StageContext(broker), message)
+
+	asyncio.run(main())
+	assert [item["oparl_id"] for item in server.bulk if item["type"] == "organization"] == ["https://oparl.test/body/1"]
+	assert [item["oparl_id"] for item in server.bulk if item["type"] == "meeting"] == ["https://oparl.test/meeting/3"]
+	# Die Körperschaftsliste selbst ohne Delta-Filter
+	assert [str(r.url) for r in server.requests if r.url.path == "/bodies"] == ["https://oparl.test/bodies"]